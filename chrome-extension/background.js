@@ -9,6 +9,7 @@ chrome.runtime.onInstalled.addListener((details) => {
     chrome.storage.local.set({
       isEnabled: true,
       autoProcess: false,
+      prefetch: true,
       theme: 'light'
     });
   }
@@ -69,8 +70,13 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
     return true;
   }
 
+  if (message.type === 'PREFETCH_VIDEO') {
+    prefetchVideo(message.videoId, sendResponse);
+    return true;
+  }
+
   if (message.type === 'ASK_QUESTION') {
-    askQuestion(message.question, sendResponse);
+    askQuestion(message.question, message.handle, sendResponse);
     return true;
   }
 
@@ -97,9 +103,16 @@ async function processVideo(videoId, sendResponse) {
     });
 
     if (response.ok) {
-      const result = await response.json();
+      let result = await response.json();
+      if (result.status === 'error') {
+        throw new Error(result.error || 'Failed to process video');
+      }
+      if (result.job_id) {
+        // Ingestion runs in the background; wait for the job to finish
+        result = await waitForJob(result.job_id, videoId);
+      }
       console.log('Video processed successfully:', result);
-      sendResponse({ success: true, message: 'Video processed successfully' });
+      sendResponse({ success: true, message: 'Video processed successfully', handle: result.handle });
     } else {
       const error = await response.json();
       console.error('Failed to process video:', error);
@@ -111,8 +124,71 @@ async function processVideo(videoId, sendResponse) {
   }
 }
 
+// Ask the server to start ingesting a video before the user opens the chat.
+// Best effort: the server may skip it when busy, and failures are only logged.
+async function prefetchVideo(videoId, sendResponse) {
+  try {
+    const { prefetch } = await chrome.storage.local.get({ prefetch: true });
+    if (!prefetch) {
+      sendResponse({ success: false, status: 'disabled' });
+      return;
+    }
+    const response = await fetch('http://localhost:8000/prefetch', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ video_id: videoId })
+    });
+    const result = await response.json();
+    console.log('Prefetch:', videoId, result.status);
+    sendResponse({ success: response.ok, status: result.status, handle: result.handle });
+  } catch (error) {
+    console.log('Prefetch failed:', error.message);
+    sendResponse({ success: false, error: error.message });
+  }
+}
+
+// Poll an ingestion job until it is done or fails
+async function waitForJob(jobId, videoId, intervalMs = 1000) {
+  while (true) {
+    const response = await fetch(`http://localhost:8000/jobs/${jobId}`);
+    if (!response.ok) {
+      throw new Error('Lost track of processing job');
+    }
+    const job = await response.json();
+    console.log('Processing stage:', job.stage);
+    if (job.stage === 'done') {
+      return job.result;
+    }
+    if (job.stage === 'error') {
+      throw new Error(job.error || 'Failed to process video');
+    }
+    if (job.stage === 'dropped') {
+      // A prefetch the server gave up on: ask again as a user request, which is never dropped
+      const response = await fetch('http://localhost:8000/process', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ video_id: videoId })
+      });
+      const result = await response.json();
+      if (!response.ok || result.status === 'error') {
+        throw new Error(result.detail || result.error || 'Failed to process video');
+      }
+      if (!result.job_id) {
+        return result;
+      }
+      jobId = result.job_id;
+      continue;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 // Function to ask question
-async function askQuestion(question, sendResponse) {
+async function askQuestion(question, handle, sendResponse) {
   try {
     console.log('Asking question:', question);
     const response = await fetch('http://localhost:8000/ask', {
@@ -120,7 +196,7 @@ async function askQuestion(question, sendResponse) {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ question: question })
+      body: JSON.stringify({ question: question, handle: handle })
     });
 
     if (response.ok) {
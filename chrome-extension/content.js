@@ -15,6 +15,7 @@ if (window.aiChatbotInjected) {
   let sidebar = null;
   let isActive = false;
   let isProcessed = false;
+  let videoHandle = null; // Chain handle returned by /process
   let isDragging = false;
   let isResizing = false;
   let isMinimized = false; // Track minimize state
@@ -446,6 +447,7 @@ if (window.aiChatbotInjected) {
       if (response && response.success) {
         console.log('Video processed successfully');
         isProcessed = true;
+        videoHandle = response.handle;
         retryCount = 0; // Reset retry count on success
         setTimeout(() => showChatInterface(), 500);
       } else {
@@ -626,7 +628,8 @@ if (window.aiChatbotInjected) {
       const response = await new Promise((resolve, reject) => {
         chrome.runtime.sendMessage({
           type: 'ASK_QUESTION',
-          question: question
+          question: question,
+          handle: videoHandle
         }, (response) => {
           if (chrome.runtime.lastError) {
             reject(new Error(chrome.runtime.lastError.message));
@@ -783,10 +786,26 @@ if (window.aiChatbotInjected) {
   `;
   document.head.appendChild(style);
 
+  // Let the server start ingesting the video while the user watches, so opening
+  // the chat later is fast. Waits a moment so quickly skipped videos are not fetched.
+  let prefetchedVideoId = null;
+  function schedulePrefetch(videoId, delayMs = 2000) {
+    if (!videoId || videoId === prefetchedVideoId) return;
+    setTimeout(() => {
+      if (extractVideoId(window.location.href) !== videoId || videoId === prefetchedVideoId) return;
+      prefetchedVideoId = videoId;
+      chrome.runtime.sendMessage({ type: 'PREFETCH_VIDEO', videoId: videoId }, () => {
+        // Ignore failures: prefetch is only an optimization
+        void chrome.runtime.lastError;
+      });
+    }, delayMs);
+  }
+
   // Initialize when DOM is ready
   function initialize() {
     if (isYouTubeVideoPage()) {
       console.log('YouTube video page detected');
+      schedulePrefetch(extractVideoId(window.location.href));
     }
   }
 
@@ -815,6 +834,7 @@ if (window.aiChatbotInjected) {
           closeSidebar();
         }
         currentVideoId = newVideoId;
+        schedulePrefetch(newVideoId);
       } else {
         // Not on a video page, close sidebar if open
         if (isActive) {
@@ -1,22 +1,35 @@
 import React, { useState } from 'react';
-import axios from 'axios';
+import { askStream } from '../lib/askStream';
 import { FiSend } from 'react-icons/fi';
 
-const Chatbot = () => {
+const Chatbot = ({ handle }) => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
 
   const handleSend = async () => {
     if (!input.trim()) return;
-    setMessages((prev) => [...prev, { text: input, isUser: true }]);
+    setMessages((prev) => [...prev, { text: input, isUser: true, id: Date.now() }]);
     setInput('');
     setLoading(true);
+    // The streamed answer is one message, updated in place by id
+    const botId = Date.now() + 1;
     try {
-      const response = await axios.post('http://localhost:8000/ask', { question: input });
-      setMessages((prev) => [...prev, { text: response.data.answer, isUser: false }]);
+      await askStream({
+        question: input,
+        handle,
+        onToken: (_, answer) => {
+          setLoading(false);
+          setMessages((prev) => {
+            if (prev.some((msg) => msg.id === botId)) {
+              return prev.map((msg) => (msg.id === botId ? { ...msg, text: answer } : msg));
+            }
+            return [...prev, { text: answer, isUser: false, id: botId }];
+          });
+        }
+      });
     } catch (err) {
-      setMessages((prev) => [...prev, { text: 'Error: ' + (err.response?.data?.detail || 'Failed to get response'), isUser: false }]);
+      setMessages((prev) => [...prev, { text: 'Error: ' + (err.message || 'Failed to get response'), isUser: false, id: botId + 1 }]);
     }
     setLoading(false);
   };
@@ -27,8 +40,8 @@ const Chatbot = () => {
         {messages.length === 0 && (
           <div className="text-center text-gray-500">Ask a question about the video!</div>
         )}
-        {messages.map((msg, i) => (
-          <div key={i} className={`flex ${msg.isUser ? 'justify-end' : 'justify-start'}`}>
+        {messages.map((msg) => (
+          <div key={msg.id} className={`flex ${msg.isUser ? 'justify-end' : 'justify-start'}`}>
             <div className={`max-w-xs p-3 rounded-lg ${msg.isUser ? 'bg-blue-500 text-white' : 'bg-gray-200 dark:bg-gray-700 text-gray-900 dark:text-gray-100'}`}>
               {msg.text}
             </div>
@@ -17,6 +17,7 @@ export const VideoProvider = ({ children }) => {
     title: '',
     thumbnail: '',
     duration: '',
+    handle: null,
     isProcessed: false,
     isProcessing: false,
     error: null
@@ -33,6 +34,7 @@ export const VideoProvider = ({ children }) => {
       title: '',
       thumbnail: '',
       duration: '',
+      handle: null,
       isProcessed: false,
       isProcessing: false,
       error: null
@@ -0,0 +1,56 @@
+const ASK_STREAM_URL = 'http://localhost:8000/ask/stream';
+
+// Parse one server-sent event block into { event, data }
+const parseEvent = (block) => {
+  let event = 'message';
+  const dataLines = [];
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+  });
+  return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+};
+
+// Ask a question and stream the answer, calling onContext once with the
+// retrieved sources and onToken for every piece of text. Resolves with the
+// full answer.
+export const askStream = async ({ question, handle, onContext, onToken }) => {
+  const response = await fetch(ASK_STREAM_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ question, handle })
+  });
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || 'Failed to get response');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let answer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const { event, data } = parseEvent(buffer.slice(0, boundary));
+      buffer = buffer.slice(boundary + 2);
+
+      if (event === 'context') {
+        onContext?.(data.sources);
+      } else if (event === 'token') {
+        answer += data.text;
+        onToken?.(data.text, answer);
+      } else if (event === 'error') {
+        throw new Error(data.detail);
+      }
+    }
+  }
+
+  return answer;
+};
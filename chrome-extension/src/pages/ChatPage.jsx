@@ -21,7 +21,7 @@ import {
   CheckCircle
 } from 'lucide-react';
 import { useVideo } from '../context/VideoContext';
-import axios from 'axios';
+import { askStream } from '../lib/askStream';
 
 const ChatPage = () => {
   const navigate = useNavigate();
@@ -64,20 +64,23 @@ const ChatPage = () => {
     setLoading(true);
     setIsTyping(true);
     
+    const botId = Date.now() + 1;
     try {
-      const response = await axios.post('http://localhost:8000/ask', { question: input });
-      
-      // Simulate typing delay for better UX
-      setTimeout(() => {
-        const botMessage = { 
-          text: response.data.answer, 
-          isUser: false, 
-          timestamp: new Date(),
-          id: Date.now() + 1
-        };
-        setMessages((prev) => [...prev, botMessage]);
-        setIsTyping(false);
-      }, 1000);
+      // Render the answer incrementally as tokens stream in
+      await askStream({
+        question: input,
+        handle: videoData.handle,
+        onToken: (_, answer) => {
+          setIsTyping(false);
+          setMessages((prev) => {
+            if (prev.some((msg) => msg.id === botId)) {
+              return prev.map((msg) => (msg.id === botId ? { ...msg, text: answer } : msg));
+            }
+            return [...prev, { text: answer, isUser: false, timestamp: new Date(), id: botId }];
+          });
+        }
+      });
+      setIsTyping(false);
       
     } catch (err) {
       const errorMessage = { 
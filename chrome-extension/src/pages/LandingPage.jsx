@@ -25,6 +25,7 @@ const LandingPage = () => {
   const [isProcessing, setIsProcessing] = useState(false);
   const [error, setError] = useState(null);
   const [isSuccess, setIsSuccess] = useState(false);
+  const [stage, setStage] = useState(null);
 
   const handleProcess = async () => {
     const match = url.match(/(?:youtube\.com\/watch\?v=|youtu\.be\/)([\w-]+)/);
@@ -47,9 +48,16 @@ const LandingPage = () => {
       });
 
       // Process video
-      await axios.post('http://localhost:8000/process', { video_id: videoId });
+      const response = await axios.post('http://localhost:8000/process', { video_id: videoId });
+      if (response.data.status === 'error') {
+        throw new Error(response.data.error);
+      }
+      if (response.data.job_id) {
+        await waitForJob(response.data.job_id, videoId);
+      }
       
       setVideo({
+        handle: response.data.handle,
         isProcessed: true,
         isProcessing: false
       });
@@ -62,10 +70,30 @@ const LandingPage = () => {
       }, 1500);
 
     } catch (err) {
-      setError(err.response?.data?.detail || 'Error processing video. Please try again.');
+      setError(err.response?.data?.detail || err.message || 'Error processing video. Please try again.');
       setVideo({ isProcessing: false, error: err.message });
     } finally {
       setIsProcessing(false);
+      setStage(null);
+    }
+  };
+
+  // Poll the background ingestion job until it finishes
+  const waitForJob = async (jobId, videoId) => {
+    while (true) {
+      const { data: job } = await axios.get(`http://localhost:8000/jobs/${jobId}`);
+      setStage(job.stage);
+      if (job.stage === 'done') return job.result;
+      if (job.stage === 'error') throw new Error(job.error || 'Error processing video');
+      if (job.stage === 'dropped') {
+        // A prefetch the server gave up on: ask again as a user request, which is never dropped
+        const { data } = await axios.post('http://localhost:8000/process', { video_id: videoId });
+        if (data.status === 'error') throw new Error(data.error);
+        if (!data.job_id) return data;
+        jobId = data.job_id;
+        continue;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000));
     }
   };
 
@@ -235,7 +263,7 @@ const LandingPage = () => {
                   {isProcessing ? (
                     <span className="flex items-center justify-center space-x-3">
                       <Loader2 className="w-6 h-6 animate-spin" />
-                      <span>Processing Video...</span>
+                      <span>{stage && stage !== 'queued' ? `Processing Video (${stage})...` : 'Processing Video...'}</span>
                     </span>
                   ) : (
                     <span className="flex items-center justify-center space-x-3">
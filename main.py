@@ -1,7 +1,14 @@
 import yaml
-from src.data_ingestion import fetch_transcript, split_transcript
-from src.embeddings import get_embeddings_model, create_vector_store
+from src.data_ingestion import fetch_transcript_snippets, split_snippets, YouTubeTranscriptProcessor, TranscriptConfig
+from src.embeddings import get_embeddings_model, create_vector_store, configure_embedding_cache, embedding_cache_stats, describe_index
+from src.embeddings import configure_embeddings_backend, embeddings_model_id
+from src.transcript_store import configure_transcript_store
+from src.llm_gateway import configure_llm_limiter
+from src.index_store import IndexStore, make_index_key, load_or_build_vector_store
+from src.index_manager import sync_corpus
+from src.hybrid_retrieval import HybridRetriever, load_or_build_bm25, save_bm25
 from src.retrieval import get_llm_model, get_prompt_template, build_chain
+from src.summarization import SummaryEngine, build_routed_chain
 
 if __name__ == "__main__":
     # ----------------------------
@@ -11,31 +18,108 @@ if __name__ == "__main__":
         config = yaml.safe_load(f)
 
     # ----------------------------
-    # Fetch & split transcript
+    # Fetch, split & embed (or load the cached index)
     # ----------------------------
-    try:
-        transcript = fetch_transcript(config['video_id'])
-        print(f"Transcript length: {len(transcript)} characters")
-    except Exception as e:
-        print("Error fetching transcript:", e)
-        exit(1)
+    configure_transcript_store(
+        config.get('transcript_cache_dir'),
+        ttl_seconds=float(config.get('transcript_cache_ttl_hours', 168)) * 3600,
+        negative_ttl_seconds=float(config.get('transcript_negative_ttl_hours', 24)) * 3600
+    )
+    configure_embeddings_backend(config.get('embeddings_backend', 'huggingface'), **(config.get('onnx_embeddings') or {}))
+    configure_embedding_cache(config.get('embedding_cache_dir'), config.get('embedding_cache_dtype', 'float32'))
+    configure_llm_limiter(
+        max_concurrency=int(config.get('llm_max_concurrency', 8)),
+        max_retries=int(config.get('llm_max_retries', 4)),
+        base_delay=float(config.get('llm_backoff_seconds', 1.0)),
+        max_delay=float(config.get('llm_max_backoff_seconds', 30.0))
+    )
+    embeddings = get_embeddings_model(config['embeddings_model'])
 
-    chunks = split_transcript(transcript, config['chunk_size'], config['chunk_overlap'])
-    print(f"Created {len(chunks)} chunks")
+    def build_index():
+        try:
+            snippets = fetch_transcript_snippets(config['video_id'])
+            print(f"Transcript length: {len(snippets)} snippets")
+        except Exception as e:
+            print("Error fetching transcript:", e)
+            exit(1)
 
-    # ----------------------------
-    # Embeddings
-    # ----------------------------
-    embeddings = get_embeddings_model(config['embeddings_model'])
-    vector_store = create_vector_store(chunks, embeddings)
+        chunks = split_snippets(snippets, config['chunk_size'], config['chunk_overlap'], {'video_id': config['video_id']})
+        print(f"Created {len(chunks)} chunks")
+        vector_store = create_vector_store(chunks, embeddings, config.get('vector_index'))
+        return vector_store, {'chunks': len(chunks), 'vector_index': describe_index(vector_store.index)}
+
+    def update_corpus_index():
+        # Playlist/channel mode: fetch concurrently and embed in large batches into one index.
+        # The saved corpus is updated in place: only new or revised transcript text is
+        # embedded, and videos no longer listed in video_ids are deleted
+        processor = YouTubeTranscriptProcessor(TranscriptConfig(
+            chunk_size=config['chunk_size'],
+            chunk_overlap=config['chunk_overlap'],
+            max_concurrent_fetches=config.get('max_concurrent_fetches', 4),
+            max_retries=config.get('fetch_max_retries', 3)
+        ))
+        chunks = processor.iter_multiple_videos(config['video_ids'])
+        manager, summary = sync_corpus(
+            store, index_key, embeddings, chunks,
+            keep_video_ids=[processor.extract_video_id(video) for video in config['video_ids']],
+            index_config=config.get('vector_index'),
+            batch_size=config.get('embedding_batch_size', 256),
+            metadata={'corpus': config.get('corpus_name', "default")},
+            sidecars=sidecars
+        )
+        for video_id, counts in summary['videos'].items():
+            print(f"{video_id}: {counts['added']} added, {counts['removed']} removed, {counts['unchanged']} unchanged")
+        return manager.vector_store, summary
+
+    # BM25 postings for the hybrid retriever are built at ingestion and saved with the index
+    sidecars = [save_bm25] if config.get('retriever_type') == 'hybrid' else []
+    store = None
+    if config.get('index_cache_dir'):
+        store = IndexStore(config['index_cache_dir'], max_bytes=int(config.get('index_cache_max_mb', 2048)) * 1024 * 1024)
+    if config.get('video_ids'):
+        index_key = make_index_key(
+            f"corpus:{config.get('corpus_name', 'default')}", config['chunk_size'], config['chunk_overlap'],
+            embeddings_model_id(config['embeddings_model']), config.get('vector_index')
+        )
+        vector_store, summary = update_corpus_index()
+        print(f"Indexed {summary['chunks']} chunks from {len(summary['video_ids'])} videos")
+    else:
+        index_key = make_index_key(
+            config['video_id'], config['chunk_size'], config['chunk_overlap'], embeddings_model_id(config['embeddings_model']),
+            config.get('vector_index')
+        )
+        vector_store, index_meta = load_or_build_vector_store(store, index_key, embeddings, build_index, sidecars)
+        if index_meta['cached']:
+            print(f"Loaded cached index with {index_meta['chunks']} chunks")
+
+    for model_name, stats in embedding_cache_stats().items():
+        print(f"Embedding cache ({model_name}): {stats['hits']} hits, {stats['misses']} misses")
 
     # ----------------------------
     # Retrieval + LLM
     # ----------------------------
-    retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": config['retriever_k']})
+    index_dir = store.entry_path(index_key) if store else None
+    if config.get('retriever_type') == 'hybrid':
+        retriever = HybridRetriever(
+            vectorstore=vector_store,
+            bm25=load_or_build_bm25(vector_store, index_dir),
+            search_kwargs={"k": config['retriever_k']},
+            fetch_k=config.get('hybrid_fetch_k', 20)
+        )
+    else:
+        retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": config['retriever_k']})
     llm = get_llm_model(config['llm_model'], config['temperature'], config['max_tokens'])
     prompt = get_prompt_template()
-    chain = build_chain(retriever, llm, prompt)
+    chain = build_chain(retriever, llm, prompt, config.get('context_max_tokens'))
+    summarizer = SummaryEngine(
+        vector_store,
+        llm,
+        cache_dir=index_dir,
+        window_size=config.get('summary_window_chunks', 8),
+        max_concurrency=config.get('summary_max_concurrency', 4),
+        max_context_tokens=config.get('summary_max_context_tokens', 3000)
+    )
+    chain = build_routed_chain(chain, summarizer)
 
     # ----------------------------
     # Example usage
@@ -0,0 +1,106 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so trivially different phrasings match."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    embedding: np.ndarray
+    answer: str
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Per-video cache of generated answers.
+
+    A question hits if its normalized text matches a cached question exactly, or if
+    the cosine similarity between its embedding and a cached question's embedding is
+    at least ``similarity_threshold``. Entries expire after ``ttl_seconds`` and each
+    video keeps at most ``max_entries`` answers (least recently used are dropped).
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_entries: int = 256, similarity_threshold: float = 0.95):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._videos: Dict[str, "OrderedDict[str, CachedAnswer]"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, cache_key: str, question: str, embedding: Optional[Sequence[float]] = None) -> Optional[str]:
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entries = self._videos.get(cache_key)
+            if not entries:
+                self.misses += 1
+                return None
+            self._expire(entries, now)
+
+            entry = entries.get(normalized)
+            if entry is None and embedding is not None and entries:
+                entry = self._most_similar(entries, _unit(embedding))
+
+            if entry is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(normalize_question(entry.question))
+            self.hits += 1
+            return entry.answer
+
+    def store(self, cache_key: str, question: str, embedding: Optional[Sequence[float]], answer: str):
+        normalized = normalize_question(question)
+        vector = _unit(embedding) if embedding is not None else None
+        with self._lock:
+            entries = self._videos.setdefault(cache_key, OrderedDict())
+            entries[normalized] = CachedAnswer(question, vector, answer, time.time())
+            entries.move_to_end(normalized)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, cache_key: str):
+        with self._lock:
+            self._videos.pop(cache_key, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'videos': len(self._videos)
+        }
+
+    def _expire(self, entries: "OrderedDict[str, CachedAnswer]", now: float):
+        expired = [key for key, entry in entries.items() if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            del entries[key]
+
+    def _most_similar(self, entries: "OrderedDict[str, CachedAnswer]", vector: np.ndarray) -> Optional[CachedAnswer]:
+        candidates: List[CachedAnswer] = [entry for entry in entries.values() if entry.embedding is not None]
+        if not candidates:
+            return None
+        matrix = np.stack([entry.embedding for entry in candidates])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity_threshold else None
+
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -1,15 +1,26 @@
-from fastapi import FastAPI, HTTPException
+# Imported first: its clock measures the rest of startup
+import startup
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from pydantic import BaseModel
-from data_ingestion import fetch_transcript, split_transcript
-from embeddings import get_embeddings_model, create_vector_store
-from retrieval import get_llm_model, get_prompt_template, build_chain
+from sessions import ChainRegistry
+from shared_registry import SharedIndexRegistry, READY as INDEX_READY, FAILED as INDEX_FAILED
+from metrics import REGISTRY, start_trace, server_timing, timed, update_cache_stats
+import jobs
 import yaml
 import uvicorn
 from dotenv import load_dotenv
 import os
 import logging
+import asyncio
+import functools
+import importlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,21 +45,622 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variable for RAG chain
-rag_chain = None
-current_video_id = None
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ytchat_request_duration_seconds", "HTTP request duration by route.", ("method", "route", "status")
+)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Time every request; optionally report its stage timings in a Server-Timing header"""
+    trace = start_trace()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = next(
+        (r.path for r in app.router.routes if r.matches(request.scope)[0] == Match.FULL),
+        "unmatched"
+    )
+    REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    # Streaming responses only include the stages finished before the body starts
+    if request.headers.get("x-timing") or timing_headers:
+        response.headers["Server-Timing"] = server_timing(trace + [("total", elapsed)])
+    return response
+
+# Live chain handles, shared by all requests
+chain_registry = None
+latest_handle = None
+index_store = None
+worker_pool = None
+job_queue = None
+prefetch_pool = None
+answer_cache = None
+index_registry = None
+startup_state = startup.StartupState()
+warmup_task = None
+# Chat model used instead of Gemini when set, e.g. fakes.FakeChatModel by a load-test harness
+chat_model = None
+# timing_headers from the config, read once at startup
+timing_headers = False
+
+# Modules that pull in torch, transformers, FAISS, LangChain and the Gemini client. They
+# are imported inside the functions that use them, so the server starts listening (and
+# answers liveness checks) before paying for them; the warm-up imports them in order.
+HEAVY_MODULES = (
+    "transcript_store", "data_ingestion", "embeddings", "index_store",
+    "answer_cache", "retrieval", "hybrid_retrieval", "summarization"
+)
+
+def load_config():
+    """Load config/config.yaml, falling back to defaults if it is missing."""
+    try:
+        with open('config/config.yaml', 'r') as f:
+            config = yaml.safe_load(f)
+    except FileNotFoundError:
+        # Use default configuration if file not found
+        config = {
+            'chunk_size': 1000,
+            'chunk_overlap': 200,
+            'embeddings_model': 'text-embedding-ada-002',
+            'retriever_k': 3,
+            'llm_model': 'gpt-3.5-turbo',
+            'temperature': 0.7,
+            'max_tokens': 500
+        }
+        logger.warning("Config file not found, using default configuration")
+    return config
+
+def get_index_store(config):
+    """Return the on-disk index cache, or None if it is disabled in config."""
+    from index_store import IndexStore
+
+    global index_store
+    if index_store is None and config.get('index_cache_dir'):
+        index_store = IndexStore(
+            config['index_cache_dir'],
+            max_bytes=int(config.get('index_cache_max_mb', 2048)) * 1024 * 1024
+        )
+    return index_store
+
+def get_index_registry(config):
+    """Return the cross-process registry of ingested indexes, or None if it is disabled in config."""
+    global index_registry
+    # Only meaningful when workers share the on-disk index cache
+    if index_registry is None and config.get('shared_registry_path') and config.get('index_cache_dir'):
+        index_registry = SharedIndexRegistry(
+            config['shared_registry_path'],
+            stale_seconds=float(config.get('shared_registry_stale_seconds', 900))
+        )
+    return index_registry
+
+def get_chain_registry(config):
+    """Return the in-memory LRU of live chain handles."""
+    global chain_registry
+    if chain_registry is None:
+        chain_registry = ChainRegistry(
+            max_entries=int(config.get('max_live_videos', 32)),
+            max_bytes=int(config.get('max_live_memory_mb', 1024)) * 1024 * 1024
+        )
+    return chain_registry
+
+def get_answer_cache(config):
+    """Return the shared per-video answer cache, or None if it is disabled in config."""
+    from answer_cache import AnswerCache
+
+    global answer_cache
+    if answer_cache is None and config.get('answer_cache_enabled', True):
+        answer_cache = AnswerCache(
+            ttl_seconds=float(config.get('answer_cache_ttl_seconds', 3600)),
+            max_entries=int(config.get('answer_cache_max_entries', 256)),
+            similarity_threshold=float(config.get('answer_cache_similarity', 0.95))
+        )
+    return answer_cache
+
+def build_rag_chain(vector_store, config, handle):
+    """Build the retriever, answer chain, summary engine and routed chain for a vector store"""
+    from embeddings import set_search_params
+    from hybrid_retrieval import HybridRetriever, load_or_build_bm25
+    from llm_gateway import get_coalescer
+    from retrieval import get_llm_model, get_prompt_template, build_chain, build_answer_chain, build_cached_chain, coalesce_answers
+    from summarization import SummaryEngine, build_routed_chain
+
+    # BM25 postings and section summaries live next to the cached FAISS index
+    store = get_index_store(config)
+    index_dir = store.entry_path(handle) if store else None
+    # Query-time knobs can be retuned in config without rebuilding cached indexes
+    index_config = config.get('vector_index') or {}
+    set_search_params(vector_store.index, index_config.get('ivf_nprobe'), index_config.get('hnsw_ef_search'))
+    if config.get('retriever_type') == 'hybrid':
+        bm25 = load_or_build_bm25(vector_store, index_dir)
+        retriever = HybridRetriever(
+            vectorstore=vector_store,
+            bm25=bm25,
+            search_kwargs={"k": config['retriever_k']},
+            fetch_k=int(config.get('hybrid_fetch_k', 20))
+        )
+    else:
+        retriever = vector_store.as_retriever(
+            search_type="similarity", 
+            search_kwargs={"k": config['retriever_k']}
+        )
+    llm = get_llm_model(config['llm_model'], config['temperature'], config['max_tokens'], llm=chat_model)
+    prompt = get_prompt_template()
+    max_context_tokens = config.get('context_max_tokens')
+    # Concurrent identical questions about this index share one generation (/ask and /ask/stream)
+    coalescer = get_coalescer() if config.get('llm_coalesce', True) else None
+    answer_chain = coalesce_answers(build_answer_chain(llm, prompt, max_context_tokens), coalescer, handle)
+    cache = get_answer_cache(config)
+    if cache is not None:
+        chain = build_cached_chain(retriever, answer_chain, cache, handle)
+    else:
+        chain = build_chain(retriever, llm, prompt, max_context_tokens, coalescer, handle)
+    summarizer = SummaryEngine(
+        vector_store,
+        llm,
+        cache_dir=index_dir,
+        window_size=int(config.get('summary_window_chunks', 8)),
+        max_concurrency=int(config.get('summary_max_concurrency', 4)),
+        max_context_tokens=int(config.get('summary_max_context_tokens', 3000)),
+        answer_cache=cache,
+        cache_key=handle,
+        coalescer=coalescer
+    )
+    return {
+        # Whole-video questions go to the section summaries, the rest to top-k retrieval
+        'chain': build_routed_chain(chain, summarizer),
+        'retriever': retriever,
+        'answer_chain': answer_chain,
+        'summarizer': summarizer
+    }
+
+def resolve_chain(handle):
+    """Find the live chain for a handle, reloading it from the index cache if it was evicted."""
+    from embeddings import get_embeddings_model
+
+    config = load_config()
+    registry = get_chain_registry(config)
+    handle = handle or latest_handle
+    if handle is None and get_index_registry(config) is not None:
+        # Nothing ingested by this worker yet; fall back to the latest video from any worker
+        handle = get_index_registry(config).latest_ready()
+    if handle is None:
+        return None
+
+    entry = registry.get(handle)
+    if entry is not None:
+        return entry
+
+    store = get_index_store(config)
+    if store is None:
+        return None
+    hit = store.load(handle, get_embeddings_model(config['embeddings_model']))
+    if hit is None:
+        return None
+    vector_store, index_meta = hit
+    logger.info(f"Opened chain handle {handle} from index cache")
+    return registry.put(handle, index_meta.get('video_id'), vector_store, **build_rag_chain(vector_store, config, handle))
+
+def get_job_queue(config=None):
+    """Return the background ingestion queue, which runs on the worker pool."""
+    global job_queue
+    if job_queue is None:
+        config = config or load_config()
+        job_queue = jobs.JobQueue(
+            get_worker_pool(config),
+            prefetch_executor=get_prefetch_pool(),
+            max_prefetch_pending=int(config.get('prefetch_max_pending', 4)),
+            prefetch_max_age=float(config.get('prefetch_max_age_seconds', 120))
+        )
+    return job_queue
+
+def get_prefetch_pool():
+    """Return the single low-priority thread that runs speculative (prefetch) ingestion."""
+    global prefetch_pool
+    if prefetch_pool is None:
+        prefetch_pool = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="prefetch",
+            initializer=jobs.lower_thread_priority
+        )
+    return prefetch_pool
+
+def get_worker_pool(config=None):
+    """Return the bounded thread pool used for blocking fetch/embed/index work."""
+    global worker_pool
+    if worker_pool is None:
+        config = config or load_config()
+        worker_pool = ThreadPoolExecutor(
+            max_workers=int(config.get('ingest_workers', 2)),
+            thread_name_prefix="ingest"
+        )
+    return worker_pool
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the worker pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_worker_pool(), functools.partial(func, *args))
+
+def video_index_key(video_id, config):
+    from embeddings import embeddings_model_id
+    from index_store import make_index_key
+
+    return make_index_key(
+        video_id, config['chunk_size'], config['chunk_overlap'], embeddings_model_id(config['embeddings_model']),
+        config.get('vector_index')
+    )
+
+def corpus_index_key(name, config):
+    """Handle of a named multi-video corpus index (see /corpus)."""
+    return video_index_key(f"corpus:{name}", config)
+
+def corpus_job(name, video_ids, remove_video_ids, config, on_stage=None):
+    """
+    Background job body: upsert videos into a named corpus index, remove others, save it
+    and (re)register its chain handle.
+    """
+    from data_ingestion import TranscriptConfig, YouTubeTranscriptProcessor
+    from embeddings import get_embeddings_model
+    from index_manager import sync_corpus
+
+    on_stage = on_stage or (lambda stage: None)
+    store = get_index_store(config)
+    handle = corpus_index_key(name, config)
+    embeddings = get_embeddings_model(config['embeddings_model'])
+    processor = YouTubeTranscriptProcessor(TranscriptConfig(
+        chunk_size=config['chunk_size'],
+        chunk_overlap=config['chunk_overlap'],
+        max_concurrent_fetches=config.get('max_concurrent_fetches', 4),
+        max_retries=config.get('fetch_max_retries', 3)
+    ))
+
+    def chunks():
+        on_stage(jobs.FETCHING)
+        for i, chunk in enumerate(processor.iter_multiple_videos(video_ids)):
+            if i == 0:
+                on_stage(jobs.EMBEDDING)
+            yield chunk
+
+    logger.info(f"Updating corpus {name}: {len(video_ids)} videos to upsert, {len(remove_video_ids)} to remove")
+    with timed("ingest"):
+        _, summary = sync_corpus(
+            store, handle, embeddings, chunks(),
+            remove_video_ids=remove_video_ids,
+            index_config=config.get('vector_index'),
+            batch_size=int(config.get('embedding_batch_size', 256)),
+            metadata={'corpus': name},
+            sidecars=index_sidecars(config)
+        )
+
+    on_stage(jobs.INDEXING)
+    registry = get_chain_registry(config)
+    registry.remove(handle)
+    if answer_cache is not None:
+        # Answers about the old corpus may no longer hold
+        answer_cache.invalidate(handle)
+        answer_cache.invalidate(f"summary:{handle}")
+    hit = store.load(handle, embeddings) if summary['chunks'] else None
+    if hit is not None:
+        # Serve the saved copy, memory-mapped like every other cached index
+        registry.put(handle, None, hit[0], **build_rag_chain(hit[0], config, handle))
+    return dict(summary, handle=handle)
+
+def process_job(video_id, config, on_stage=None):
+    """Background job body: ingest a video and register its chain handle."""
+    global latest_handle
+    on_stage = on_stage or (lambda stage: None)
+    shared = get_index_registry(config)
+    if shared is not None:
+        # Mirror progress so other workers can report this job
+        handle, report = video_index_key(video_id, config), on_stage
+
+        def on_stage(stage):
+            report(stage)
+            shared.update(handle, stage)
+
+    logger.info(f"Processing video: {video_id}")
+    try:
+        with timed("ingest"):
+            index_key, vector_store, index_meta = ingest_video(video_id, config, on_stage)
+
+        # Create retriever and chain
+        on_stage(jobs.INDEXING)
+        logger.info("Setting up retrieval chain...")
+        entry = get_chain_registry(config).put(index_key, video_id, vector_store, **build_rag_chain(vector_store, config, index_key))
+    except Exception as e:
+        if shared is not None:
+            shared.mark_failed(handle, getattr(e, "detail", None) or str(e))
+        raise
+    latest_handle = index_key
+    result = {
+        "handle": index_key,
+        "chunks_created": index_meta['chunks'],
+        "cached": index_meta['cached']
+    }
+    if shared is not None:
+        shared.mark_ready(index_key, result)
+
+    if config.get('summarize_on_ingest', False):
+        # Best effort: the index is already usable, and questions summarize on demand
+        logger.info("Summarizing video sections...")
+        try:
+            entry.summarizer.sections()
+        except Exception as e:
+            logger.warning(f"Could not summarize sections of {video_id}; they will be summarized on first use: {e}")
+
+    logger.info(f"Successfully processed video: {video_id}")
+    return result
+
+def prefetch_job(video_id, config, job_id, on_stage=None):
+    """
+    Prefetch job body: claim the video in the shared registry once the job actually
+    starts (so a dropped prefetch never holds a claim), then ingest it.
+
+    If another worker is already ingesting it, wait for that instead, for at most the
+    registry's stale-claim timeout; the job fails if the other worker has not finished by then.
+    """
+    shared = get_index_registry(config)
+    if shared is not None:
+        handle = video_index_key(video_id, config)
+        deadline = time.monotonic() + shared.stale_seconds
+        while True:
+            owner = claim_index(video_id, handle, job_id, config)
+            if owner['state'] == INDEX_READY:
+                return owner['result']
+            if owner['job_id'] == job_id:
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(
+                    f"Gave up after {shared.stale_seconds:.0f}s waiting for job {owner['job_id']} to ingest video {video_id}"
+                )
+            if on_stage is not None:
+                on_stage(owner['state'])
+            time.sleep(1.0)
+    return process_job(video_id, config, on_stage)
+
+def claim_index(video_id, handle, job_id, config):
+    """
+    Claim a handle in the shared registry for ingestion under ``job_id``.
+
+    Returns the owning row; a ready row whose index has since been evicted from the
+    shared directory is dropped and claimed afresh.
+    """
+    shared = get_index_registry(config)
+    owner = shared.claim(handle, video_id, job_id)
+    if owner['state'] == INDEX_READY and not get_index_store(config).contains(handle):
+        shared.forget(handle)
+        owner = shared.claim(handle, video_id, job_id)
+    return owner
+
+async def queue_ingestion(video_id, handle, config, prefetch=False):
+    """
+    Start ingesting a video, or join the ingestion already under way here or in another worker.
+
+    Returns:
+        (stage, job_id): jobs.DONE and None if the video is already ingested, else the
+        stage and id of the job doing the work
+    """
+    queue = get_job_queue(config)
+    job_id = jobs.new_job_id()
+    if get_index_registry(config) is not None and not prefetch:
+        # A local job (a prefetch is promoted) keeps its id; claiming under it lets a queued
+        # prefetch start as the owner instead of waiting for a claim taken under a new id
+        job = queue.join(handle, video_id)
+        owner = await asyncio.to_thread(claim_index, video_id, handle, job.job_id if job else job_id, config)
+        if job is not None:
+            return job.stage, job.job_id
+        if owner['state'] == INDEX_READY:
+            # Ingested by another worker: /ask opens its saved index on first use
+            return jobs.DONE, None
+        if owner['job_id'] != job_id:
+            logger.info(f"Video {video_id} is already being ingested by job {owner['job_id']}")
+            return owner['state'], owner['job_id']
+
+    if prefetch:
+        job = queue.submit(handle, video_id, prefetch_job, video_id, config, job_id, job_id=job_id, prefetch=True)
+    else:
+        job = queue.submit(handle, video_id, process_job, video_id, config, job_id=job_id)
+    return job.stage, job.job_id
+
+def find_job(job_id):
+    """Look up an ingestion job in this worker, or in the shared registry if another worker runs it."""
+    job = get_job_queue().get(job_id)
+    if job is not None:
+        return job
+    shared = get_index_registry(load_config())
+    row = shared.get_job(job_id) if shared is not None else None
+    if row is None:
+        return None
+    return jobs.IngestionJob(
+        job_id=row['job_id'],
+        key=row['handle'],
+        video_id=row['video_id'],
+        stage={INDEX_READY: jobs.DONE, INDEX_FAILED: jobs.ERROR}.get(row['state'], row['state']),
+        error=row['error'],
+        result=row['result'],
+        created_at=row['created_at'],
+        updated_at=row['updated_at']
+    )
+
+def index_sidecars(config):
+    """Files built at ingestion and saved with each index: BM25 postings for the hybrid retriever."""
+    from hybrid_retrieval import save_bm25
+
+    return [save_bm25] if config.get('retriever_type') == 'hybrid' else []
+
+def ingest_video(video_id, config, on_stage=None):
+    """
+    Fetch, split and embed a video, or load its index from the cache.
+
+    Returns:
+        (index_key, vector_store, index_meta)
+    """
+    from data_ingestion import fetch_transcript_snippets, split_snippets
+    from embeddings import get_embeddings_model, create_vector_store, describe_index
+    from index_store import load_or_build_vector_store
+
+    on_stage = on_stage or (lambda stage: None)
+    embeddings = get_embeddings_model(config['embeddings_model'])
+
+    def build_index():
+        # Fetch and process transcript
+        on_stage(jobs.FETCHING)
+        logger.info("Fetching transcript...")
+        snippets = fetch_transcript_snippets(video_id)
+
+        if not snippets:
+            raise HTTPException(status_code=400, detail="Could not fetch transcript for this video")
+
+        on_stage(jobs.CHUNKING)
+        logger.info("Splitting transcript into chunks...")
+        chunks = split_snippets(
+            snippets, config['chunk_size'], config['chunk_overlap'], {'video_id': video_id}
+        )
+
+        if not chunks:
+            raise HTTPException(status_code=400, detail="Could not process transcript into chunks")
+
+        # Create embeddings and vector store
+        on_stage(jobs.EMBEDDING)
+        logger.info("Creating embeddings...")
+        vector_store = create_vector_store(chunks, embeddings, config.get('vector_index'))
+        on_stage(jobs.INDEXING)
+        return vector_store, {
+            'chunks': len(chunks),
+            'video_id': video_id,
+            'vector_index': describe_index(vector_store.index)
+        }
+
+    index_key = video_index_key(video_id, config)
+    vector_store, index_meta = load_or_build_vector_store(
+        get_index_store(config), index_key, embeddings, build_index, index_sidecars(config)
+    )
+    return index_key, vector_store, index_meta
 
 class ProcessRequest(BaseModel):
     video_id: str
 
+class CorpusRequest(BaseModel):
+    name: str
+    video_ids: List[str] = []
+    remove_video_ids: List[str] = []
+
 class AskRequest(BaseModel):
     question: str
+    handle: Optional[str] = None
+
+def import_heavy_modules():
+    """Import HEAVY_MODULES, timing each one (later modules only pay for what is new)."""
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        startup_state.record(f"import_{name}", time.perf_counter() - start)
+
+def api_workers(config):
+    """Number of API worker processes (API_WORKERS overrides api_workers)."""
+    return max(1, int(os.getenv("API_WORKERS", config.get('api_workers', 1))))
+
+def configure_pipeline(config):
+    """Configure the embeddings backend, the embedding and transcript caches and the LLM limiter"""
+    from embeddings import configure_embeddings_backend, configure_embedding_cache
+    from llm_gateway import configure_llm_limiter
+    from transcript_store import configure_transcript_store
+
+    configure_embeddings_backend(config.get('embeddings_backend', 'huggingface'), **(config.get('onnx_embeddings') or {}))
+    configure_embedding_cache(config.get('embedding_cache_dir'), config.get('embedding_cache_dtype', 'float32'))
+    configure_transcript_store(
+        config.get('transcript_cache_dir'),
+        ttl_seconds=float(config.get('transcript_cache_ttl_hours', 168)) * 3600,
+        negative_ttl_seconds=float(config.get('transcript_negative_ttl_hours', 24)) * 3600
+    )
+    # The limiter lives in each worker process: split the budget so all workers together
+    # stay within llm_max_concurrency
+    workers = api_workers(config)
+    max_concurrency = max(1, int(config.get('llm_max_concurrency', 8)) // workers)
+    logger.info(f"LLM concurrency limit: {max_concurrency} per worker x {workers} worker(s)")
+    configure_llm_limiter(
+        max_concurrency=max_concurrency,
+        max_retries=int(config.get('llm_max_retries', 4)),
+        base_delay=float(config.get('llm_backoff_seconds', 1.0)),
+        max_delay=float(config.get('llm_max_backoff_seconds', 30.0))
+    )
+
+async def warm_up(config):
+    """Import the heavy modules, configure the pipeline and load the embeddings models"""
+    warm_up_start = time.perf_counter()
+    startup_state.set_state(startup.WARMING)
+    try:
+        start = time.perf_counter()
+        await asyncio.to_thread(import_heavy_modules)
+        startup_state.record("imports", time.perf_counter() - start)
+        await asyncio.to_thread(configure_pipeline, config)
+    except Exception as e:
+        startup_state.set_state(startup.FAILED, str(e))
+        raise
+
+    from embeddings import warm_embeddings_models
+
+    model_names = config.get('warmup_embeddings_models', [config['embeddings_model']])
+    start = time.perf_counter()
+    try:
+        await run_blocking(warm_embeddings_models, model_names)
+        logger.info(f"Warmed embeddings models: {model_names}")
+    except Exception as e:
+        # Models will still be loaded lazily on the first /process call
+        logger.error(f"Failed to warm embeddings models: {str(e)}")
+    startup_state.record("models", time.perf_counter() - start)
+    startup_state.record("warm_up", time.perf_counter() - warm_up_start)
+    startup_state.set_state(startup.READY)
+
+def start_warm_up(config=None):
+    """Start the warm-up task once and return it"""
+    global warmup_task
+    if warmup_task is None:
+        warmup_task = asyncio.create_task(warm_up(config or load_config()))
+    return warmup_task
+
+async def ensure_warm():
+    """Wait for the warm-up to finish; requests arriving early queue here instead of blocking the event loop"""
+    try:
+        await asyncio.shield(start_warm_up())
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Server failed to start: {str(e)}")
+
+@app.on_event("startup")
+async def start_up():
+    """Start warming up; by default in the background so health checks are answered immediately"""
+    global timing_headers
+    config = load_config()
+    timing_headers = bool(config.get('timing_headers', False))
+    task = start_warm_up(config)
+    if not config.get('warmup_in_background', True):
+        await task
+    startup_state.mark_listening()
+
+@app.on_event("shutdown")
+async def stop_worker_pool():
+    """Let in-flight ingestion finish and release the worker threads"""
+    if prefetch_pool is not None:
+        # Queued prefetches are speculative; don't hold up shutdown for them
+        prefetch_pool.shutdown(wait=True, cancel_futures=True)
+    if worker_pool is not None:
+        worker_pool.shutdown(wait=True)
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "YouTube Chatbot API is running", "status": "healthy"}
 
+@app.get("/healthz")
+async def liveness():
+    """Liveness probe: the process is up and serving, whether or not it has warmed up"""
+    return {"status": "alive", "uptime_s": round(startup_state.uptime(), 3)}
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness probe: 200 once models are loaded, 503 (with startup timings) until then"""
+    body = startup_state.to_dict()
+    return JSONResponse(status_code=200 if startup_state.ready else 503, content=body)
+
 @app.options("/process")
 async def options_process():
     """Handle preflight requests for /process"""
@@ -63,64 +675,36 @@ async def options_process():
 
 @app.post("/process")
 async def process_video(request: ProcessRequest):
-    """Process a YouTube video for chatbot functionality"""
-    global rag_chain, current_video_id
-    
-    try:
-        logger.info(f"Processing video: {request.video_id}")
-        
-        # Load configuration
-        try:
-            with open('config/config.yaml', 'r') as f:
-                config = yaml.safe_load(f)
-        except FileNotFoundError:
-            # Use default configuration if file not found
-            config = {
-                'chunk_size': 1000,
-                'chunk_overlap': 200,
-                'embeddings_model': 'text-embedding-ada-002',
-                'retriever_k': 3,
-                'llm_model': 'gpt-3.5-turbo',
-                'temperature': 0.7,
-                'max_tokens': 500
-            }
-            logger.warning("Config file not found, using default configuration")
+    """Queue a YouTube video for processing and return its job and chain handle"""
+    global latest_handle
 
-        # Fetch and process transcript
-        logger.info("Fetching transcript...")
-        transcript = fetch_transcript(request.video_id)
-        
-        if not transcript:
-            raise HTTPException(status_code=400, detail="Could not fetch transcript for this video")
-        
-        logger.info("Splitting transcript into chunks...")
-        chunks = split_transcript(transcript, config['chunk_size'], config['chunk_overlap'])
-        
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Could not process transcript into chunks")
+    await ensure_warm()
+    try:
+        config = load_config()
+        handle = video_index_key(request.video_id, config)
 
-        # Create embeddings and vector store
-        logger.info("Creating embeddings...")
-        embeddings = get_embeddings_model(config['embeddings_model'])
-        vector_store = create_vector_store(chunks, embeddings)
+        ready = {
+            "status": "success",
+            "stage": jobs.DONE,
+            "message": f"Video {request.video_id} is ready",
+            "handle": handle
+        }
+        # Already live: nothing to enqueue
+        if handle in get_chain_registry(config):
+            latest_handle = handle
+            return ready
 
-        # Create retriever and chain
-        logger.info("Setting up retrieval chain...")
-        retriever = vector_store.as_retriever(
-            search_type="similarity", 
-            search_kwargs={"k": config['retriever_k']}
-        )
-        llm = get_llm_model(config['llm_model'], config['temperature'], config['max_tokens'])
-        prompt = get_prompt_template()
-        rag_chain = build_chain(retriever, llm, prompt)
-        
-        current_video_id = request.video_id
-        
-        logger.info(f"Successfully processed video: {request.video_id}")
+        stage, job_id = await queue_ingestion(request.video_id, handle, config)
+        if job_id is None:
+            latest_handle = handle
+            return ready
+        logger.info(f"Queued ingestion job {job_id} for video {request.video_id}")
         return {
-            "status": "success", 
-            "message": f"Processed video {request.video_id}",
-            "chunks_created": len(chunks)
+            "status": "queued",
+            "stage": stage,
+            "message": f"Processing video {request.video_id}",
+            "job_id": job_id,
+            "handle": handle
         }
 
     except Exception as e:  # 👈 same level as try
@@ -132,7 +716,101 @@ async def process_video(request: ProcessRequest):
             "error": str(e)  # 👈 send the actual error back to frontend
         }
 
+@app.options("/prefetch")
+async def options_prefetch():
+    """Handle preflight requests for /prefetch"""
+    return JSONResponse(
+        status_code=200,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, OPTIONS",
+            "Access-Control-Allow-Headers": "*"
+        }
+    )
+
+@app.post("/prefetch")
+async def prefetch_video(request: ProcessRequest):
+    """Speculatively ingest a video the user is looking at, so a later /process is a cache hit.
+
+    Best effort and never in the way of user requests: it is skipped while the server is
+    warming up or busy with user ingestion, runs on a low-priority thread, and a queued
+    prefetch is dropped if user work arrives before it starts.
+    """
+    config = load_config()
+    if not config.get('prefetch_enabled', True):
+        return {"status": "disabled"}
+    if not startup_state.ready:
+        jobs.PREFETCH_JOBS.inc(result="skipped")
+        return {"status": "skipped", "reason": "warming up"}
+
+    try:
+        handle = video_index_key(request.video_id, config)
+        if handle in get_chain_registry(config):
+            return {"status": "ready", "handle": handle}
+        queue = get_job_queue(config)
+        if not queue.is_in_flight(handle) and not queue.accepting_prefetch():
+            jobs.PREFETCH_JOBS.inc(result="skipped")
+            return {"status": "skipped", "reason": "busy", "handle": handle}
+
+        stage, job_id = await queue_ingestion(request.video_id, handle, config, prefetch=True)
+        if job_id is None:
+            return {"status": "ready", "handle": handle}
+        logger.info(f"Prefetching video {request.video_id} as job {job_id}")
+        jobs.PREFETCH_JOBS.inc(result="accepted")
+        return {"status": "prefetching", "stage": stage, "job_id": job_id, "handle": handle}
+    except Exception as e:
+        logger.error(f"Error prefetching video {request.video_id}: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
+@app.post("/corpus")
+async def update_corpus(request: CorpusRequest):
+    """Add or refresh videos in a named multi-video corpus, or remove them, in the background.
+
+    The corpus index is updated in place: only new or revised transcript text is embedded.
+    Poll the returned job, then ask about the whole corpus with the returned handle.
+    """
+    await ensure_warm()
+    config = load_config()
+    if get_index_store(config) is None:
+        raise HTTPException(status_code=400, detail="Corpora need index_cache_dir to be configured")
+    handle = corpus_index_key(request.name, config)
+    job_id = jobs.new_job_id()
+    # Keyed per request so updates queue up (sync_corpus applies them in turn) instead of joining
+    job = get_job_queue(config).submit(
+        f"{handle}:{job_id}", f"corpus:{request.name}", corpus_job,
+        request.name, request.video_ids, request.remove_video_ids, config, job_id=job_id
+    )
+    logger.info(f"Queued corpus job {job.job_id} for corpus {request.name}")
+    return {"status": "queued", "stage": job.stage, "job_id": job.job_id, "handle": handle}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll the progress of an ingestion job"""
+    job = await asyncio.to_thread(find_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    """Stream ingestion job progress as server-sent events until it finishes"""
+    job = await asyncio.to_thread(find_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
 
+    async def events():
+        current, last_stage = job, None
+        while True:
+            if current.stage != last_stage:
+                last_stage = current.stage
+                yield f"event: {current.stage}\ndata: {json.dumps(current.to_dict())}\n\n"
+            if current.finished:
+                break
+            await asyncio.sleep(0.25)
+            # Jobs run by another worker are snapshots; fetch a fresh one
+            current = await asyncio.to_thread(find_job, job_id) or current
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.options("/ask")
 async def options_ask():
@@ -149,35 +827,127 @@ async def options_ask():
 @app.post("/ask")
 async def ask_question(request: AskRequest):
     """Ask a question about the processed video"""
-    global rag_chain
-    
-    if rag_chain is None:
-        raise HTTPException(
-            status_code=400, 
-            detail="No video processed yet. Please call /process endpoint first."
-        )
+    await ensure_warm()
+    # Cache reloads are short; keep them off the ingestion pool so /ask never queues behind /process
+    entry = await asyncio.to_thread(resolve_chain, request.handle)
+    if entry is None:
+        detail = "No video processed yet. Please call /process endpoint first."
+        if request.handle:
+            detail = f"Unknown or expired handle {request.handle}. Please call /process again."
+        raise HTTPException(status_code=400, detail=detail)
     
     try:
-        logger.info(f"Answering question: {request.question}")
-        answer = rag_chain.invoke(request.question)
+        logger.info(f"Answering question for video {entry.video_id}: {request.question}")
+        answer = await entry.chain.ainvoke(request.question)
         
         logger.info("Successfully generated answer")
-        return {"answer": answer}
+        return {"answer": answer, "handle": entry.handle}
         
     except Exception as e:
         logger.error(f"Error answering question: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
 
+@app.options("/ask/stream")
+async def options_ask_stream():
+    """Handle preflight requests for /ask/stream"""
+    return JSONResponse(
+        status_code=200,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, OPTIONS",
+            "Access-Control-Allow-Headers": "*"
+        }
+    )
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: AskRequest):
+    """Ask a question and stream the answer as server-sent events.
+
+    Emits one ``context`` event with the retrieved chunks (or, for whole-video
+    questions, the section summaries), ``token`` events as
+    the answer is generated, then ``done`` (or ``error``).
+    """
+    await ensure_warm()
+    from retrieval import astream_answer
+    from summarization import is_global_question
+
+    entry = await asyncio.to_thread(resolve_chain, request.handle)
+    if entry is None:
+        detail = "No video processed yet. Please call /process endpoint first."
+        if request.handle:
+            detail = f"Unknown or expired handle {request.handle}. Please call /process again."
+        raise HTTPException(status_code=400, detail=detail)
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def events():
+        logger.info(f"Streaming answer for video {entry.video_id}: {request.question}")
+        try:
+            if entry.summarizer is not None and is_global_question(request.question):
+                stream = entry.summarizer.astream_answer(request.question)
+            else:
+                answers = get_answer_cache(load_config())
+                stream = astream_answer(
+                    entry.retriever, entry.answer_chain, request.question, answers, entry.handle
+                )
+            async for kind, payload in stream:
+                if kind == "context":
+                    yield sse("context", {"handle": entry.handle, "sources": payload})
+                else:
+                    yield sse("token", {"text": payload})
+            yield sse("done", {"handle": entry.handle})
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield sse("error", {"detail": f"Error generating answer: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/status")
 async def get_status():
     """Get the current status of the API"""
+    registry = get_chain_registry(load_config())
+    latest = registry.get(latest_handle) if latest_handle else None
+    # Cache stats live in the heavy modules; skip them until the warm-up has imported those
+    embedding_stats, transcripts, llm = None, None, None
+    if startup_state.ready:
+        from embeddings import embedding_cache_stats
+        from llm_gateway import get_llm_limiter
+        from transcript_store import get_transcript_store
+        embedding_stats, transcripts, llm = embedding_cache_stats(), get_transcript_store(), get_llm_limiter().stats()
     return {
         "status": "running",
-        "video_processed": current_video_id is not None,
-        "current_video_id": current_video_id,
-        "chain_ready": rag_chain is not None
+        "video_processed": latest is not None,
+        "current_video_id": latest.video_id if latest else None,
+        "chain_ready": latest is not None,
+        "live_handles": len(registry),
+        "live_memory_bytes": registry.total_bytes,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "embedding_cache": embedding_stats,
+        "transcript_cache": transcripts.stats() if transcripts else None,
+        "llm": llm,
+        "startup": startup_state.to_dict()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage latency histograms, throughput and cache hit rates"""
+    if answer_cache is not None:
+        update_cache_stats("answer", answer_cache.stats())
+    if startup_state.ready:
+        from embeddings import embedding_cache_stats
+        from transcript_store import get_transcript_store
+        if get_transcript_store() is not None:
+            update_cache_stats("transcript", get_transcript_store().stats())
+        for model_name, stats in embedding_cache_stats().items():
+            update_cache_stats(f"embedding:{model_name}", stats)
+    update_cache_stats("index")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Exception handler for CORS
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -192,10 +962,14 @@ if __name__ == "__main__":
     port = int(os.getenv("API_PORT", 8000))
     host = os.getenv("API_HOST", "0.0.0.0")
     
-    logger.info(f"Starting YouTube Chatbot API on {host}:{port}")
+    workers = api_workers(load_config())
+
+    logger.info(f"Starting YouTube Chatbot API on {host}:{port} with {workers} worker(s)")
     uvicorn.run(
-        app, 
+        # Several workers need an import string so each process can load the app
+        "api:app" if workers > 1 else app,
         host=host, 
         port=port,
+        workers=workers,
         log_level="info"
     )
\ No newline at end of file
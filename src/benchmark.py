@@ -0,0 +1,264 @@
+"""
+End-to-end pipeline benchmark against a stub YouTube API and a fake LLM.
+
+Times each stage separately (fetch, split, embed, index, retrieve, time to first token,
+generate) for every combination of video length and concurrency, and writes JSON that
+can be compared with an earlier run to catch regressions.
+
+Usage:
+    python -m src.benchmark --minutes 5 30 120 --concurrency 1 4 --output bench.json
+    python -m src.benchmark --fake-embeddings 384 --baseline bench.json --output new.json
+
+With ``--baseline`` the exit status is 1 if any stage's median got slower than
+``--tolerance`` (relative) over the baseline.
+"""
+import argparse
+import hashlib
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import yaml
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+try:
+    from .data_ingestion import fetch_transcript_snippets, split_snippets
+    from .embeddings import (
+        configure_embeddings_backend, embeddings_model_id, get_embeddings_model, vector_store_from_embeddings
+    )
+    from .fakes import FakeChatModel, StubYouTubeAdapter
+    from .hybrid_retrieval import BM25Index, HybridRetriever
+    from .retrieval import build_answer_chain, get_prompt_template
+    from .transcript_store import configure_transcript_store, make_http_session
+except ImportError:
+    from data_ingestion import fetch_transcript_snippets, split_snippets
+    from embeddings import (
+        configure_embeddings_backend, embeddings_model_id, get_embeddings_model, vector_store_from_embeddings
+    )
+    from fakes import FakeChatModel, StubYouTubeAdapter
+    from hybrid_retrieval import BM25Index, HybridRetriever
+    from retrieval import build_answer_chain, get_prompt_template
+    from transcript_store import configure_transcript_store, make_http_session
+
+STAGES = ("fetch", "split", "embed", "index", "retrieve", "first_token", "generate")
+
+QUESTIONS = [
+    "What does the video say about fusion energy?",
+    "How is the plasma confined in the reactor?",
+    "What problem with battery storage is mentioned?",
+    "Who funds the research?",
+    "What is the most important result?"
+]
+
+
+class StageTimer:
+    """Thread-safe collection of per-stage durations."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, durations in self.durations.items():
+            if not durations:
+                continue
+            ordered = sorted(durations)
+            summary[stage] = {
+                'count': len(ordered),
+                'mean_s': round(statistics.fmean(ordered), 6),
+                'p50_s': round(ordered[len(ordered) // 2], 6),
+                'p95_s': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 6),
+                'max_s': round(ordered[-1], 6)
+            }
+        return summary
+
+
+def run_video(video_id: str, config: Dict[str, Any], embeddings, llm, questions: Sequence[str], timer: StageTimer) -> Dict[str, int]:
+    """Ingest one video and answer ``questions`` about it, timing every stage."""
+    with timer.time("fetch"):
+        snippets = fetch_transcript_snippets(video_id)
+    with timer.time("split"):
+        chunks = split_snippets(snippets, config['chunk_size'], config['chunk_overlap'], {'video_id': video_id})
+
+    texts = [chunk.page_content for chunk in chunks]
+    with timer.time("embed"):
+        vectors = embeddings.embed_documents(texts)
+    with timer.time("index"):
+        vector_store = vector_store_from_embeddings(
+            texts, vectors, [chunk.metadata for chunk in chunks], embeddings, config.get('vector_index')
+        )
+        if config.get('retriever_type') == 'hybrid':
+            retriever = HybridRetriever(
+                vectorstore=vector_store,
+                bm25=BM25Index.from_vector_store(vector_store),
+                search_kwargs={"k": config['retriever_k']},
+                fetch_k=int(config.get('hybrid_fetch_k', 20))
+            )
+        else:
+            retriever = vector_store.as_retriever(search_type="similarity", search_kwargs={"k": config['retriever_k']})
+
+    answer_chain = build_answer_chain(llm, get_prompt_template(), config.get('context_max_tokens'))
+    for question in questions:
+        with timer.time("retrieve"):
+            docs = retriever.invoke(question)
+        start = time.perf_counter()
+        first_token = None
+        for _ in answer_chain.stream({'docs': docs, 'question': question}):
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        timer.record("first_token", first_token if first_token is not None else time.perf_counter() - start)
+        timer.record("generate", time.perf_counter() - start)
+
+    return {'snippets': len(snippets), 'chunks': len(chunks)}
+
+
+def run_case(minutes: float, concurrency: int, config: Dict[str, Any], embeddings, llm, args) -> Dict[str, Any]:
+    """Process ``concurrency * rounds`` distinct videos of ``minutes`` each, ``concurrency`` at a time."""
+    video_ids = [
+        hashlib.sha256(f"{minutes}-{concurrency}-{i}".encode("utf-8")).hexdigest()[:11]
+        for i in range(concurrency * args.rounds)
+    ]
+    adapter = StubYouTubeAdapter(minutes=minutes, latency=args.fetch_latency)
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Fresh transcript cache per case so every fetch goes through the stub
+        configure_transcript_store(cache_dir, http_client=make_http_session(concurrency, adapter))
+        questions = QUESTIONS[:args.questions]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            counts = list(pool.map(
+                lambda video_id: run_video(video_id, config, embeddings, llm, questions, timer), video_ids
+            ))
+        wall_seconds = time.perf_counter() - start
+        configure_transcript_store(None)
+
+    chunks = sum(count['chunks'] for count in counts)
+    return {
+        'minutes': minutes,
+        'concurrency': concurrency,
+        'videos': len(video_ids),
+        'snippets': sum(count['snippets'] for count in counts),
+        'chunks': chunks,
+        'wall_seconds': round(wall_seconds, 6),
+        'chunks_per_second': round(chunks / wall_seconds, 3) if wall_seconds else None,
+        'stages': timer.summary()
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, floor_s: float = 0.001) -> List[str]:
+    """Describe every stage whose median is more than ``tolerance`` slower than in ``baseline``."""
+    previous = {(case['minutes'], case['concurrency']): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        old_case = previous.get((case['minutes'], case['concurrency']))
+        if old_case is None:
+            continue
+        for stage, stats in case['stages'].items():
+            old = old_case['stages'].get(stage)
+            if old is None:
+                continue
+            # Ignore sub-millisecond jitter on very fast stages
+            if stats['p50_s'] > old['p50_s'] * (1 + tolerance) and stats['p50_s'] - old['p50_s'] > floor_s:
+                regressions.append(
+                    f"{case['minutes']} min x{case['concurrency']} {stage}: "
+                    f"p50 {old['p50_s'] * 1000:.1f} ms -> {stats['p50_s'] * 1000:.1f} ms"
+                )
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [f"{'minutes':>8}{'conc':>6}{'chunks':>8}{'wall s':>9}  " + "".join(f"{stage:>13}" for stage in STAGES)]
+    for case in results['cases']:
+        stages = "".join(
+            f"{case['stages'][stage]['p50_s'] * 1000:>10.1f} ms" if stage in case['stages'] else f"{'-':>13}"
+            for stage in STAGES
+        )
+        lines.append(f"{case['minutes']:>8g}{case['concurrency']:>6}{case['chunks']:>8}{case['wall_seconds']:>9.2f}  {stages}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 30, 120], help="Synthetic video lengths")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Videos processed at once")
+    parser.add_argument("--rounds", type=int, default=1, help="Videos per worker in each case")
+    parser.add_argument("--questions", type=int, default=3, help=f"Questions per video (max {len(QUESTIONS)})")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="Simulated seconds per YouTube request")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM seconds before the first token")
+    parser.add_argument("--llm-tps", type=float, default=0.0, help="Fake LLM tokens per second (0 = instant)")
+    parser.add_argument("--fake-embeddings", type=int, metavar="DIM", help="Use hash embeddings of this size instead of the model")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against an earlier results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p50 slowdown")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+
+    if args.fake_embeddings:
+        embeddings = DeterministicFakeEmbedding(size=args.fake_embeddings)
+        embeddings_name = f"fake-{args.fake_embeddings}"
+    else:
+        configure_embeddings_backend(config.get('embeddings_backend', 'huggingface'), **(config.get('onnx_embeddings') or {}))
+        embeddings = get_embeddings_model(config['embeddings_model'])
+        embeddings_name = embeddings_model_id(config['embeddings_model'])
+        # Load the model before timing anything
+        embeddings.embed_documents(["warm up"])
+    llm = FakeChatModel(latency=args.llm_latency, tokens_per_second=args.llm_tps)
+
+    results = {
+        'meta': {
+            'created_at': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'embeddings': embeddings_name,
+            'chunk_size': config['chunk_size'],
+            'chunk_overlap': config['chunk_overlap'],
+            'retriever_type': config.get('retriever_type', 'similarity'),
+            'vector_index': config.get('vector_index'),
+            'args': vars(args)
+        },
+        'cases': [
+            run_case(minutes, concurrency, config, embeddings, llm, args)
+            for minutes in args.minutes
+            for concurrency in args.concurrency
+        ]
+    }
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
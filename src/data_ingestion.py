@@ -1,6 +1,9 @@
 import re
+import time
+from collections import deque
 import logging
-from typing import List, Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Dict, Any, Iterable, Iterator
 from dataclasses import dataclass
 
 from youtube_transcript_api import (
@@ -12,6 +15,13 @@ from youtube_transcript_api import (
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+try:
+    from .transcript_store import TranscriptStore, get_transcript_store, make_http_session
+    from .metrics import CHUNKS_PER_VIDEO, timed
+except ImportError:
+    from transcript_store import TranscriptStore, get_transcript_store, make_http_session
+    from metrics import CHUNKS_PER_VIDEO, timed
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +34,10 @@ class TranscriptConfig:
     preferred_langs: List[str] = None
     include_auto_generated: bool = True
     preserve_formatting: bool = False
+    timestamped_chunks: bool = True
+    max_concurrent_fetches: int = 4
+    max_retries: int = 3
+    retry_backoff: float = 1.0
     
     def __post_init__(self):
         if self.preferred_langs is None:
@@ -32,15 +46,18 @@ class TranscriptConfig:
 class YouTubeTranscriptProcessor:
     """Enhanced YouTube transcript processor with latest API methods."""
     
-    def __init__(self, config: Optional[TranscriptConfig] = None):
+    def __init__(self, 
+                 config: Optional[TranscriptConfig] = None,
+                 store: Optional[TranscriptStore] = None):
         self.config = config or TranscriptConfig()
+        self.store = store or get_transcript_store()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.config.chunk_size,
             chunk_overlap=self.config.chunk_overlap,
             length_function=len,
             is_separator_regex=False,
         )
-        self.api = YouTubeTranscriptApi()
+        self.api = self.store.api if self.store else _shared_api()
     
     @staticmethod
     def extract_video_id(url_or_id: str) -> str:
@@ -73,21 +90,25 @@ class YouTubeTranscriptProcessor:
         video_id = self.extract_video_id(video_url_or_id)
         
         try:
-            transcript_list = self.api.list(video_id)
+            if self.store is not None:
+                transcript_infos = self.store.list_transcripts(video_id)
+            else:
+                transcript_infos = [
+                    {
+                        'language': transcript.language,
+                        'language_code': transcript.language_code,
+                        'is_generated': transcript.is_generated,
+                        'is_translatable': transcript.is_translatable
+                    }
+                    for transcript in self.api.list(video_id)
+                ]
             available = {
                 'manual': [],
                 'auto_generated': []
             }
             
-            for transcript in transcript_list:
-                transcript_info = {
-                    'language': transcript.language,
-                    'language_code': transcript.language_code,
-                    'is_generated': transcript.is_generated,
-                    'is_translatable': transcript.is_translatable
-                }
-                
-                if transcript.is_generated:
+            for transcript_info in transcript_infos:
+                if transcript_info['is_generated']:
                     available['auto_generated'].append(transcript_info)
                 else:
                     available['manual'].append(transcript_info)
@@ -98,9 +119,23 @@ class YouTubeTranscriptProcessor:
             logger.error(f"Failed to list transcripts for {video_id}: {e}")
             return {'manual': [], 'auto_generated': []}
     
-    def fetch_transcript(self, video_url_or_id: str) -> str:
+    def fetch_snippets(self, video_url_or_id: str):
         """
-        Fetch transcript using the latest API methods.
+        Fetch the raw transcript (an iterable of timed snippets), from the transcript store if configured.
+        """
+        with timed("fetch"):
+            if self.store is None:
+                return self._download_snippets(video_url_or_id)
+            video_id = self.extract_video_id(video_url_or_id)
+            return self.store.get_or_fetch(
+                video_id,
+                self.config.preferred_langs + ([] if self.config.include_auto_generated else ['manual']),
+                lambda: self._download_snippets(video_id)
+            )
+    
+    def _download_snippets(self, video_url_or_id: str):
+        """
+        Fetch the raw transcript from YouTube using the latest API methods.
         """
         video_id = self.extract_video_id(video_url_or_id)
         logger.info(f"Fetching transcript for video ID: {video_id}")
@@ -141,17 +176,7 @@ class YouTubeTranscriptProcessor:
                     else:
                         raise NoTranscriptFound(f"No manual transcripts found for video {video_id}")
             
-            # Process the fetched transcript
-            if self.config.preserve_formatting:
-                # Keep timestamps and formatting
-                formatted_text = []
-                for snippet in fetched_transcript:
-                    timestamp = f"[{snippet.start:.1f}s]" if hasattr(snippet, 'start') else ""
-                    formatted_text.append(f"{timestamp} {snippet.text}")
-                return "\n".join(formatted_text)
-            else:
-                # Clean text joining - FetchedTranscript is iterable
-                return " ".join(snippet.text.strip() for snippet in fetched_transcript if snippet.text.strip())
+            return fetched_transcript
             
         except TranscriptsDisabled:
             raise ValueError(f"Transcripts are disabled for video ID {video_id}")
@@ -162,6 +187,24 @@ class YouTubeTranscriptProcessor:
         except Exception as e:
             raise RuntimeError(f"Unexpected error fetching transcript for video ID {video_id}: {str(e)}")
     
+    def fetch_transcript(self, video_url_or_id: str) -> str:
+        """
+        Fetch transcript using the latest API methods.
+        """
+        fetched_transcript = self.fetch_snippets(video_url_or_id)
+        
+        # Process the fetched transcript
+        if self.config.preserve_formatting:
+            # Keep timestamps and formatting
+            formatted_text = []
+            for snippet in fetched_transcript:
+                timestamp = f"[{snippet.start:.1f}s]" if hasattr(snippet, 'start') else ""
+                formatted_text.append(f"{timestamp} {snippet.text}")
+            return "\n".join(formatted_text)
+        else:
+            # Clean text joining - FetchedTranscript is iterable
+            return " ".join(snippet.text.strip() for snippet in fetched_transcript if snippet.text.strip())
+    
     def create_documents(self, 
                         video_url_or_id: str, 
                         metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
@@ -176,7 +219,6 @@ class YouTubeTranscriptProcessor:
             List of Document objects with transcript chunks
         """
         video_id = self.extract_video_id(video_url_or_id)
-        transcript_text = self.fetch_transcript(video_url_or_id)
         
         # Prepare base metadata
         base_metadata = {
@@ -191,11 +233,20 @@ class YouTubeTranscriptProcessor:
         if metadata:
             base_metadata.update(metadata)
         
-        # Create documents with text splitting
-        documents = self.text_splitter.create_documents(
-            texts=[transcript_text],
-            metadatas=[base_metadata]
-        )
+        if self.config.timestamped_chunks:
+            # Chunk straight from the timed snippets, keeping start/end times
+            documents = list(chunk_snippets(
+                self.fetch_snippets(video_url_or_id),
+                self.config.chunk_size,
+                self.config.chunk_overlap,
+                base_metadata
+            ))
+        else:
+            # Create documents with text splitting
+            documents = self.text_splitter.create_documents(
+                texts=[self.fetch_transcript(video_url_or_id)],
+                metadatas=[base_metadata]
+            )
         
         # Add chunk-specific metadata
         for i, doc in enumerate(documents):
@@ -207,6 +258,61 @@ class YouTubeTranscriptProcessor:
         logger.info(f"Created {len(documents)} document chunks for video {video_id}")
         return documents
     
+    def create_documents_with_retry(self,
+                                    video_url_or_id: str,
+                                    metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        create_documents with exponential backoff on transient fetch failures.
+
+        ValueError (transcripts disabled / not found) is permanent and not retried.
+        """
+        for attempt in range(self.config.max_retries + 1):
+            try:
+                return self.create_documents(video_url_or_id, metadata)
+            except ValueError:
+                raise
+            except RuntimeError as e:
+                if attempt == self.config.max_retries:
+                    raise
+                delay = self.config.retry_backoff * (2 ** attempt)
+                logger.warning(f"Retrying {video_url_or_id} in {delay:.1f}s after error: {e}")
+                time.sleep(delay)
+    
+    def iter_multiple_videos(self, 
+                             video_urls_or_ids: List[str], 
+                             metadata_list: Optional[List[Dict[str, Any]]] = None) -> Iterator[Document]:
+        """
+        Fetch and split videos concurrently, yielding chunks as each video completes.
+        
+        At most ``config.max_concurrent_fetches`` transcripts are fetched at once, so
+        callers can embed the chunks of finished videos while others are still downloading.
+        Videos that fail after retries are logged and skipped.
+        
+        Args:
+            video_urls_or_ids: List of YouTube URLs or video IDs
+            metadata_list: Optional list of metadata dicts for each video
+            
+        Yields:
+            Document chunks, each tagged with its ``video_id``
+        """
+        total = len(video_urls_or_ids)
+        with ThreadPoolExecutor(max_workers=self.config.max_concurrent_fetches) as executor:
+            futures = {}
+            for i, video_url_or_id in enumerate(video_urls_or_ids):
+                video_metadata = metadata_list[i] if metadata_list and i < len(metadata_list) else None
+                future = executor.submit(self.create_documents_with_retry, video_url_or_id, video_metadata)
+                futures[future] = video_url_or_id
+            
+            for done, future in enumerate(as_completed(futures), start=1):
+                video_url_or_id = futures[future]
+                try:
+                    documents = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process video {video_url_or_id}: {e}")
+                    continue
+                logger.info(f"Successfully processed video {done}/{total}")
+                yield from documents
+    
     def process_multiple_videos(self, 
                               video_urls_or_ids: List[str], 
                               metadata_list: Optional[List[Dict[str, Any]]] = None) -> List[Document]:
@@ -220,21 +326,18 @@ class YouTubeTranscriptProcessor:
         Returns:
             Combined list of Document objects from all videos
         """
-        all_documents = []
-        
-        for i, video_url_or_id in enumerate(video_urls_or_ids):
-            try:
-                video_metadata = metadata_list[i] if metadata_list and i < len(metadata_list) else None
-                documents = self.create_documents(video_url_or_id, video_metadata)
-                all_documents.extend(documents)
-                logger.info(f"Successfully processed video {i+1}/{len(video_urls_or_ids)}")
-            except Exception as e:
-                logger.error(f"Failed to process video {video_url_or_id}: {e}")
-                continue
-        
-        return all_documents
+        return list(self.iter_multiple_videos(video_urls_or_ids, metadata_list))
 
 # Convenience functions for backward compatibility and simple usage
+_api = None
+
+def _shared_api() -> YouTubeTranscriptApi:
+    """YouTubeTranscriptApi with one pooled HTTP session, reused across calls."""
+    global _api
+    if _api is None:
+        _api = YouTubeTranscriptApi(http_client=make_http_session())
+    return _api
+
 def extract_video_id(url_or_id: str) -> str:
     """Extract video ID from URL or return ID directly."""
     match = re.search(r"(?:v=|\/)([0-9A-Za-z_-]{11})", url_or_id)
@@ -244,16 +347,31 @@ def fetch_transcript(video_url_or_id: str, preferred_langs: List[str] = None) ->
     """
     Simple function to fetch transcript using the latest API.
     """
+    return " ".join(snippet.text for snippet in fetch_transcript_snippets(video_url_or_id, preferred_langs))
+
+def fetch_transcript_snippets(video_url_or_id: str, preferred_langs: List[str] = None):
+    """
+    Fetch the raw transcript: an iterable of snippets with ``text``, ``start`` and ``duration``.
+    
+    Served from the transcript store without network I/O when one is configured and fresh.
+    """
     if preferred_langs is None:
         preferred_langs = ['en']
     
     video_id = extract_video_id(video_url_or_id)
-    api = YouTubeTranscriptApi()
-    
+    store = get_transcript_store()
+    with timed("fetch"):
+        if store is None:
+            return _download_transcript_snippets(video_id, preferred_langs, _shared_api())
+        return store.get_or_fetch(
+            video_id, preferred_langs, lambda: _download_transcript_snippets(video_id, preferred_langs, store.api)
+        )
+
+def _download_transcript_snippets(video_id: str, preferred_langs: List[str], api: YouTubeTranscriptApi):
+    """Fetch snippets from YouTube, falling back from fetch() to list() lookups."""
     try:
         # Try the simple fetch method first
-        fetched_transcript = api.fetch(video_id, languages=preferred_langs)
-        return " ".join(snippet.text for snippet in fetched_transcript)
+        return api.fetch(video_id, languages=preferred_langs)
         
     except NoTranscriptFound:
         # Fallback to list method with more control
@@ -267,8 +385,7 @@ def fetch_transcript(video_url_or_id: str, preferred_langs: List[str] = None) ->
                 # Try auto-generated
                 transcript = transcript_list.find_generated_transcript(preferred_langs)
             
-            fetched_transcript = transcript.fetch()
-            return " ".join(snippet.text for snippet in fetched_transcript)
+            return transcript.fetch()
             
         except (TranscriptsDisabled, NoTranscriptFound):
             raise ValueError(f"No captions available for video ID {video_id}.")
@@ -283,3 +400,75 @@ def split_transcript(transcript: str, chunk_size: int = 1000, chunk_overlap: int
         chunk_overlap=chunk_overlap
     )
     return splitter.create_documents([transcript])
+
+def chunk_snippets(snippets: Iterable[Any],
+                   chunk_size: int = 1000,
+                   chunk_overlap: int = 200,
+                   metadata: Optional[Dict[str, Any]] = None) -> Iterator[Document]:
+    """
+    Build chunks directly from timed transcript snippets in a single pass.
+    
+    Snippets are never split: a chunk grows until adding the next snippet would exceed
+    ``chunk_size`` characters, and the next chunk starts with the trailing snippets that
+    fit in ``chunk_overlap``. Each snippet enters and leaves the window once, so long
+    transcripts are chunked in linear time without building one flat string.
+    
+    Args:
+        snippets: Iterable of objects with ``text``, ``start`` and ``duration``
+        chunk_size: Maximum characters per chunk (a single longer snippet becomes its own chunk)
+        chunk_overlap: Maximum characters carried over into the next chunk
+        metadata: Base metadata copied into every chunk
+        
+    Yields:
+        Documents with ``chunk_index``, ``start`` and ``end`` (seconds) in their metadata
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+    
+    window = deque()  # (text, start, end)
+    length = 0  # characters in window, including joining spaces
+    chunk_index = 0
+    
+    def emit():
+        return Document(
+            page_content=" ".join(text for text, _, _ in window),
+            metadata=dict(
+                metadata or {},
+                chunk_index=chunk_index,
+                start=round(window[0][1], 2),
+                end=round(window[-1][2], 2)
+            )
+        )
+    
+    for snippet in snippets:
+        text = snippet.text.strip()
+        if not text:
+            continue
+        start = float(snippet.start)
+        end = start + float(getattr(snippet, 'duration', 0.0) or 0.0)
+        
+        added = len(text) + (1 if window else 0)
+        if window and length + added > chunk_size:
+            yield emit()
+            chunk_index += 1
+            # Keep the trailing snippets that fit in the overlap
+            while window and length > chunk_overlap:
+                removed, _, _ = window.popleft()
+                length -= len(removed) + (1 if window else 0)
+            added = len(text) + (1 if window else 0)
+        
+        window.append((text, start, end))
+        length += added
+    
+    if window:
+        yield emit()
+
+def split_snippets(snippets: Iterable[Any],
+                   chunk_size: int = 1000,
+                   chunk_overlap: int = 200,
+                   metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
+    """Split timed transcript snippets into LangChain Document chunks with start/end times."""
+    with timed("split"):
+        chunks = list(chunk_snippets(snippets, chunk_size, chunk_overlap, metadata))
+    CHUNKS_PER_VIDEO.observe(len(chunks))
+    return chunks
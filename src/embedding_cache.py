@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows; there the cache must not be shared between processes
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 16
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.bin"
+META_FILE = "meta.json"
+LOCK_FILE = "append.lock"
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only content-hash -> vector store for one embeddings model.
+
+    Vectors live in a flat float32/float16 file read through ``np.memmap``; a parallel
+    file of 16-byte text digests gives each vector's row, loaded into a dict on open.
+    Several processes (API workers) can share one cache: appends happen under an
+    exclusive file lock at the files' real end, after picking up rows other processes
+    appended, and lookups that miss pick those rows up too.
+    """
+
+    def __init__(self, root: str, model_name: str, dtype: str = "float32"):
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        self.dtype = np.dtype(dtype)
+        self.dimension: Optional[int] = None
+        self.rows: Dict[bytes, int] = {}
+        # Rows of the files loaded so far; can exceed len(rows) when processes raced on a text
+        self._count = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._mmap = None
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        if self._refresh():
+            logger.info(f"Opened embedding cache {self.path} with {self._count} vectors")
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._file(LOCK_FILE), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> bool:
+        meta_path = self._file(META_FILE)
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if np.dtype(meta['dtype']) != self.dtype:
+            logger.warning(f"Embedding cache at {self.path} uses {meta['dtype']}, ignoring requested {self.dtype}")
+            self.dtype = np.dtype(meta['dtype'])
+        self.dimension = meta['dimension']
+        return True
+
+    def _complete_rows(self) -> int:
+        # Vectors are written before their keys, and a crash mid-append can leave one
+        # file longer than the other; only rows present in both are complete
+        row_bytes = self.dimension * self.dtype.itemsize
+        keys_size = os.path.getsize(self._file(KEYS_FILE)) if os.path.exists(self._file(KEYS_FILE)) else 0
+        vectors_size = os.path.getsize(self._file(VECTORS_FILE)) if os.path.exists(self._file(VECTORS_FILE)) else 0
+        return min(keys_size // DIGEST_SIZE, vectors_size // row_bytes)
+
+    def _refresh(self) -> bool:
+        """Load rows appended to the files since the last refresh (by any process)."""
+        if self.dimension is None and not self._read_meta():
+            return False
+        count = self._complete_rows()
+        if count > self._count:
+            with open(self._file(KEYS_FILE), "rb") as f:
+                f.seek(self._count * DIGEST_SIZE)
+                keys = f.read((count - self._count) * DIGEST_SIZE)
+            for i in range(count - self._count):
+                self.rows.setdefault(keys[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE], self._count + i)
+            self._count = count
+        return True
+
+    def _vectors(self) -> np.ndarray:
+        if self._mmap is None or self._mmap.shape[0] < self._count:
+            self._mmap = np.memmap(
+                self._file(VECTORS_FILE), dtype=self.dtype, mode="r", shape=(self._count, self.dimension)
+            )
+        return self._mmap
+
+    def get_many(self, digests: List[bytes]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            rows = [self.rows.get(digest) for digest in digests]
+            if any(row is None for row in rows) and self._refresh():
+                # Other processes may have embedded these texts since we last looked
+                rows = [self.rows.get(digest) for digest in digests]
+            vectors = self._vectors() if any(row is not None for row in rows) else None
+            found = [None if row is None else np.asarray(vectors[row], dtype=np.float32) for row in rows]
+            hits = sum(vector is not None for vector in found)
+            self.hits += hits
+            self.misses += len(found) - hits
+            return found
+
+    def put_many(self, digests: List[bytes], vectors: List[List[float]]):
+        with self._lock, self._file_lock():
+            # Append at the files' real end, knowing what other processes appended
+            if not self._refresh():
+                self.dimension = len(vectors[0]) if vectors else None
+                if self.dimension is None:
+                    return
+                # Readers open the cache without the lock, so never show them a partial file
+                tmp_path = self._file(f".{META_FILE}.{os.getpid()}")
+                with open(tmp_path, "w") as f:
+                    json.dump({'dimension': self.dimension, 'dtype': self.dtype.name}, f)
+                os.replace(tmp_path, self._file(META_FILE))
+
+            unique = {}
+            for digest, vector in zip(digests, vectors):
+                if digest not in self.rows:
+                    unique.setdefault(digest, vector)
+            if not unique:
+                return
+
+            start = self._count
+            row_bytes = self.dimension * self.dtype.itemsize
+            matrix = np.asarray(list(unique.values()), dtype=self.dtype)
+            # Drop a torn tail left by a crash so the two files stay row-aligned
+            with open(self._file(VECTORS_FILE), "ab") as f:
+                f.truncate(start * row_bytes)
+                f.write(matrix.tobytes())
+            with open(self._file(KEYS_FILE), "ab") as f:
+                f.truncate(start * DIGEST_SIZE)
+                f.write(b"".join(unique))
+            for offset, digest in enumerate(unique):
+                self.rows[digest] = start + offset
+            self._count = start + len(unique)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'vectors': len(self.rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document vectors from an EmbeddingCache before calling the model."""
+
+    def __init__(self, model: Embeddings, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        digests = [text_digest(text) for text in texts]
+        vectors = self.cache.get_many(digests)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            # Identical texts within one call are embedded once
+            unique = {}
+            for i in missing:
+                unique.setdefault(digests[i], texts[i])
+            embedded = self.model.embed_documents(list(unique.values()))
+            self.cache.put_many(list(unique), embedded)
+            by_digest = dict(zip(unique, embedded))
+            for i in missing:
+                vectors[i] = by_digest[digests[i]]
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries may be embedded differently from documents (e.g. instruction prefixes)
+        return self.model.embed_query(text)
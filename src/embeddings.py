@@ -1,8 +1,266 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
-def get_embeddings_model(model_name: str):
+try:
+    from .embedding_cache import CachedEmbeddings, EmbeddingCache
+    from .metrics import record_embedding, timed
+except ImportError:
+    from embedding_cache import CachedEmbeddings, EmbeddingCache
+    from metrics import record_embedding, timed
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of loaded embeddings models, keyed by model name.
+_models: Dict[str, Embeddings] = {}
+_models_lock = threading.Lock()
+
+# Where (and at what precision) document vectors are cached; None disables caching
+_cache_settings: Dict[str, str] = {}
+
+# How models are run: "huggingface" (PyTorch) or "onnx" (ONNX Runtime) plus its options
+_backend_settings: Dict[str, Any] = {'backend': "huggingface"}
+
+def configure_embedding_cache(cache_dir: str = None, dtype: str = "float32"):
+    """
+    Put a content-hash vector cache in front of every model loaded afterwards.
+
+    Pass ``cache_dir=None`` to disable. Call before the first get_embeddings_model.
+    """
+    _cache_settings.clear()
+    if cache_dir:
+        _cache_settings.update(cache_dir=cache_dir, dtype=dtype)
+
+def configure_embeddings_backend(backend: str = "huggingface", **options):
+    """
+    Choose how models loaded afterwards are run.
+
+    ``"huggingface"`` uses PyTorch through HuggingFaceEmbeddings. ``"onnx"`` uses an int8
+    ONNX Runtime export (see onnx_embeddings.py); ``options`` are passed to
+    load_onnx_embeddings. Call before the first get_embeddings_model.
+    """
+    if backend not in ("huggingface", "onnx"):
+        raise ValueError(f"Unknown embeddings backend {backend!r}")
+    _backend_settings.clear()
+    _backend_settings.update(options, backend=backend)
+
+def embeddings_model_id(model_name: str) -> str:
+    """Model name qualified by backend, for cache keys: ONNX int8 vectors differ slightly from PyTorch's."""
+    if _backend_settings['backend'] == "onnx":
+        return f"{model_name}@onnx{'-int8' if _backend_settings.get('quantized', True) else ''}"
+    return model_name
+
+def _load_model(model_name: str) -> Embeddings:
+    options = dict(_backend_settings)
+    if options.pop('backend') == "onnx":
+        try:
+            from .onnx_embeddings import load_onnx_embeddings
+        except ImportError:
+            from onnx_embeddings import load_onnx_embeddings
+        return load_onnx_embeddings(model_name, **options)
+
+    # Imported here so the ONNX backend never loads torch
+    from langchain_huggingface import HuggingFaceEmbeddings
     return HuggingFaceEmbeddings(model_name=model_name)
 
-def create_vector_store(chunks: list, embeddings):
-    return FAISS.from_documents(chunks, embeddings)
\ No newline at end of file
+def get_embeddings_model(model_name: str):
+    """Return the shared embeddings model for ``model_name``, loading it on first use."""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            logger.info(f"Loading embeddings model: {model_name} ({_backend_settings['backend']})")
+            model = _load_model(model_name)
+            if _cache_settings:
+                cache = EmbeddingCache(_cache_settings['cache_dir'], embeddings_model_id(model_name), _cache_settings['dtype'])
+                model = CachedEmbeddings(model, cache)
+            _models[model_name] = model
+    return model
+
+def warm_embeddings_models(model_names: Iterable[str]):
+    """Eagerly load every model in ``model_names`` into the registry."""
+    for model_name in model_names:
+        get_embeddings_model(model_name)
+
+def loaded_embeddings_models():
+    return list(_models)
+
+def embedding_cache_stats():
+    """Hit-rate stats for every cached model, keyed by model name."""
+    return {
+        model_name: model.cache.stats()
+        for model_name, model in _models.items()
+        if isinstance(model, CachedEmbeddings)
+    }
+
+def clear_embeddings_models():
+    with _models_lock:
+        _models.clear()
+
+# FAISS index types selectable with the ``vector_index`` config section
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq")
+
+def _index_spec(index_type: str, dimension: int, n_vectors: int, config: Dict[str, Any]) -> Tuple[str, int]:
+    """Return (faiss index_factory string, minimum number of training vectors)."""
+    if index_type == "flat":
+        return "Flat", 0
+    if index_type == "hnsw":
+        return f"HNSW{int(config.get('hnsw_m', 32))}", 0
+    if index_type == "sq":
+        return config.get('sq_type', "SQ8"), 1
+    if index_type == "ivfpq":
+        nlist = int(config.get('ivf_nlist') or max(1, 4 * math.sqrt(n_vectors)))
+        pq_m = int(config.get('pq_m', 48))
+        while dimension % pq_m:
+            pq_m -= 1
+        pq_bits = int(config.get('pq_bits', 8))
+        # k-means needs at least one training vector per centroid, both for IVF and PQ
+        return f"IVF{nlist},PQ{pq_m}x{pq_bits}", max(nlist, 2 ** pq_bits)
+    raise ValueError(f"Unknown vector index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def _unwrap_index(index):
+    index = faiss.downcast_index(index)
+    # IndexManager keeps stable vector IDs in an ID map around the real index
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Apply query-time accuracy/speed knobs to an IVF or HNSW index; other types ignore them."""
+    index = _unwrap_index(index)
+    if nprobe and isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(int(nprobe), index.nlist)
+    if ef_search and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(ef_search)
+
+def build_faiss_index(vectors: np.ndarray, config: Optional[Dict[str, Any]] = None):
+    """
+    Create an empty, trained FAISS index for ``vectors`` as described by a ``vector_index`` config.
+
+    Quantized indexes are trained on a random sample of at most ``train_sample`` vectors.
+    If there are too few vectors to train an IVF-PQ index (e.g. one short video), an exact
+    flat index is built instead.
+    """
+    config = config or {}
+    index_type = config.get('type', "flat")
+    n_vectors, dimension = vectors.shape
+    spec, min_train = _index_spec(index_type, dimension, n_vectors, config)
+    if n_vectors < min_train:
+        logger.info(f"Only {n_vectors} vectors, need {min_train} to train {spec}; using a flat index")
+        spec = "Flat"
+
+    index = faiss.index_factory(dimension, spec, faiss.METRIC_L2)
+    if not index.is_trained:
+        sample = vectors
+        train_sample = int(config.get('train_sample', 20000))
+        if n_vectors > train_sample:
+            rows = np.random.default_rng(0).choice(n_vectors, train_sample, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        logger.info(f"Trained {spec} index on {len(sample)} vectors")
+    set_search_params(index, config.get('ivf_nprobe'), config.get('hnsw_ef_search'))
+    return index
+
+def describe_index(index) -> Dict[str, Any]:
+    """Type and parameters of a FAISS index, recorded in the index cache metadata."""
+    index = _unwrap_index(index)
+    params = {'class': type(index).__name__, 'dimension': index.d, 'ntotal': index.ntotal}
+    if isinstance(index, faiss.IndexIVF):
+        params.update(nlist=index.nlist, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexIVFPQ):
+        params.update(pq_m=index.pq.M, pq_bits=index.pq.nbits)
+    if isinstance(index, faiss.IndexHNSW):
+        params.update(ef_search=index.hnsw.efSearch, ef_construction=index.hnsw.efConstruction)
+    return params
+
+def _is_flat(index_config: Optional[Dict[str, Any]]) -> bool:
+    return not index_config or index_config.get('type', "flat") == "flat"
+
+def _new_vector_store(vectors: np.ndarray, embeddings, index_config: Optional[Dict[str, Any]]) -> FAISS:
+    return FAISS(embeddings, build_faiss_index(vectors, index_config), InMemoryDocstore(), {})
+
+def embed_texts(embeddings, texts: List[str]) -> List[List[float]]:
+    """embed_documents, recording the embed stage duration and throughput."""
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    record_embedding(len(texts), time.perf_counter() - start)
+    return vectors
+
+def create_vector_store(chunks: list, embeddings, index_config: Optional[Dict[str, Any]] = None):
+    """Embed ``chunks`` into a FAISS vector store of the type given by ``index_config``."""
+    texts = [doc.page_content for doc in chunks]
+    vectors = embed_texts(embeddings, texts)
+    return vector_store_from_embeddings(texts, vectors, [doc.metadata for doc in chunks], embeddings, index_config)
+
+def vector_store_from_embeddings(texts: List[str],
+                                 vectors: List[List[float]],
+                                 metadatas: List[dict],
+                                 embeddings,
+                                 index_config: Optional[Dict[str, Any]] = None) -> FAISS:
+    """Index already computed vectors, e.g. to time embedding and index building separately."""
+    with timed("index"):
+        if _is_flat(index_config):
+            return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings, metadatas=metadatas)
+        vector_store = _new_vector_store(np.asarray(vectors, dtype=np.float32), embeddings, index_config)
+        vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+        return vector_store
+
+def create_vector_store_batched(chunks: Iterable,
+                                embeddings,
+                                batch_size: int = 256,
+                                index_config: Optional[Dict[str, Any]] = None):
+    """
+    Build one FAISS index from a stream of chunks, embedding in fixed-size batches.
+
+    ``chunks`` may be a generator (e.g. YouTubeTranscriptProcessor.iter_multiple_videos),
+    so embedding overlaps with transcripts still being fetched. Chunks keep their
+    metadata, so searches can be narrowed per video with ``filter={'video_id': ...}``.
+    Quantized index types hold embedded batches back until ``train_sample`` vectors
+    are available to train on.
+    """
+    vector_store = None
+    batch: List = []
+    pending: List[Tuple[str, List[float], dict]] = []
+    train_size = 0 if _is_flat(index_config) else int(index_config.get('train_sample', 20000))
+
+    def flush(final: bool = False):
+        nonlocal vector_store
+        if batch:
+            texts = [doc.page_content for doc in batch]
+            vectors = embed_texts(embeddings, texts)
+            pending.extend(zip(texts, vectors, [doc.metadata for doc in batch]))
+            logger.info(f"Embedded batch of {len(batch)} chunks")
+            batch.clear()
+        if not pending or (vector_store is None and not final and len(pending) < train_size):
+            return
+
+        with timed("index"):
+            if vector_store is None:
+                vector_store = _new_vector_store(
+                    np.asarray([vector for _, vector, _ in pending], dtype=np.float32), embeddings, index_config
+                )
+            vector_store.add_embeddings(
+                [(text, vector) for text, vector, _ in pending], metadatas=[metadata for _, _, metadata in pending]
+            )
+        pending.clear()
+
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            flush()
+    flush(final=True)
+
+    if vector_store is None:
+        raise ValueError("No chunks to index")
+    return vector_store
@@ -0,0 +1,221 @@
+"""
+Local stand-ins for the two external services, for benchmarks and load tests.
+
+- StubYouTubeAdapter: a requests transport serving synthetic YouTube watch pages, player
+  responses and caption XML, so the real youtube-transcript-api code path runs offline.
+- FakeChatModel: a deterministic chat model usable wherever ChatGoogleGenerativeAI is,
+  optionally rejecting calls over a concurrency quota the way Gemini rate limits them.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from requests import Response
+from requests.adapters import HTTPAdapter
+
+_WORDS = (
+    "the a we this that energy plasma fusion reactor magnetic field temperature neutron tokamak "
+    "stellarator confinement experiment data model result scientists team question answer video "
+    "today first next because however therefore important example problem solution cost power "
+    "grid solar wind battery storage carbon climate policy future research funding startup design"
+).split()
+
+
+def synthetic_snippets(video_id: str, minutes: float, snippet_seconds: float = 3.0) -> List[Dict[str, Any]]:
+    """Deterministic (text, start, duration) snippets covering ``minutes`` of speech."""
+    rng = random.Random(video_id)
+    snippets = []
+    for i in range(int(minutes * 60 / snippet_seconds)):
+        words = rng.choices(_WORDS, k=rng.randint(5, 10))
+        snippets.append({'text': " ".join(words), 'start': i * snippet_seconds, 'duration': snippet_seconds})
+    return snippets
+
+
+class StubYouTubeAdapter(HTTPAdapter):
+    """
+    requests transport answering the three calls youtube-transcript-api makes.
+
+    Mount it with ``transcript_store.make_http_session(adapter=StubYouTubeAdapter(...))``.
+    Every video has one auto-generated English track of ``minutes`` long, unless
+    ``video_minutes`` overrides it; IDs in ``disabled`` have transcripts disabled.
+    ``latency`` seconds are slept per request to mimic the network.
+    """
+
+    def __init__(self,
+                 minutes: float = 10.0,
+                 video_minutes: Optional[Dict[str, float]] = None,
+                 disabled: Optional[List[str]] = None,
+                 latency: float = 0.0):
+        super().__init__()
+        self.minutes = minutes
+        self.video_minutes = dict(video_minutes or {})
+        self.disabled = set(disabled or [])
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs) -> Response:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.url)
+        query = parse_qs(url.query)
+        if url.path == "/watch":
+            return self._response(request, '<html><script>var cfg = {"INNERTUBE_API_KEY": "stub-key"};</script></html>')
+        if url.path == "/youtubei/v1/player":
+            video_id = json.loads(request.body)['videoId']
+            return self._response(request, json.dumps(self._player(video_id)), "application/json")
+        if url.path == "/api/timedtext":
+            video_id = query['v'][0]
+            minutes = self.video_minutes.get(video_id, self.minutes)
+            body = "".join(
+                f'<text start="{s["start"]}" dur="{s["duration"]}">{escape(s["text"])}</text>'
+                for s in synthetic_snippets(video_id, minutes)
+            )
+            return self._response(request, f'<?xml version="1.0" encoding="utf-8" ?><transcript>{body}</transcript>', "text/xml")
+        return self._response(request, "Not found", status_code=404)
+
+    def _player(self, video_id: str) -> Dict[str, Any]:
+        player = {'playabilityStatus': {'status': "OK"}}
+        if video_id not in self.disabled:
+            player['captions'] = {'playerCaptionsTracklistRenderer': {
+                'captionTracks': [{
+                    'baseUrl': f"https://www.youtube.com/api/timedtext?v={video_id}&lang=en",
+                    'name': {'runs': [{'text': "English (auto-generated)"}]},
+                    'languageCode': "en",
+                    'kind': "asr",
+                    'isTranslatable': False
+                }],
+                'translationLanguages': []
+            }}
+        return player
+
+    def _response(self, request, body: str, content_type: str = "text/html", status_code: int = 200) -> Response:
+        response = Response()
+        response.status_code = status_code
+        response._content = body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers['Content-Type'] = content_type
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class FakeRateLimitError(Exception):
+    """What FakeChatModel raises over its quota, shaped like a Gemini 429."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 Resource has been exhausted (e.g. check quota). Please retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model: the same prompt always produces the same answer.
+
+    The answer is ``answer_words`` words drawn from the prompt itself, seeded by its hash.
+    ``latency`` seconds pass before the first token and ``tokens_per_second`` (0 for
+    unlimited) paces the rest, so time-to-first-token and streaming behave realistically.
+    With ``rate_limit_concurrency`` set, a call started while that many are running fails
+    with FakeRateLimitError asking to retry in ``retry_after`` seconds. ``calls`` counts
+    generations, ``rate_limited`` rejections and ``max_in_flight`` the peak concurrency.
+    """
+
+    latency: float = 0.0
+    tokens_per_second: float = 0.0
+    answer_words: int = 40
+    rate_limit_concurrency: int = 0
+    retry_after: float = 0.1
+    calls: int = 0
+    rate_limited: int = 0
+    max_in_flight: int = 0
+    _in_flight: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        words = re.findall(r"\w+", prompt) or ["empty"]
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        tokens = rng.choices(words, k=self.answer_words)
+        return [token if i == 0 else " " + token for i, token in enumerate(tokens)]
+
+    def _delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _enter(self):
+        with self._lock:
+            if self.rate_limit_concurrency and self._in_flight >= self.rate_limit_concurrency:
+                self.rate_limited += 1
+                raise FakeRateLimitError(self.retry_after)
+            self._in_flight += 1
+            self.calls += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._enter()
+        try:
+            tokens = self._answer(messages)
+            time.sleep(self.latency + self._delay() * len(tokens))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._enter()
+        try:
+            tokens = self._answer(messages)
+            await asyncio.sleep(self.latency + self._delay() * len(tokens))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self._enter()
+        try:
+            tokens = self._answer(messages)
+            time.sleep(self.latency)
+            for token in tokens:
+                time.sleep(self._delay())
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+        finally:
+            self._exit()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self._enter()
+        try:
+            tokens = self._answer(messages)
+            await asyncio.sleep(self.latency)
+            for token in tokens:
+                await asyncio.sleep(self._delay())
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+        finally:
+            self._exit()
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+logger = logging.getLogger(__name__)
+
+BM25_FILE = "bm25.npz"
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents, with array-backed postings.
+
+    Postings are stored CSR-style: the postings of term ``t`` are
+    ``doc_ids[offsets[t]:offsets[t + 1]]`` with matching ``term_freqs``. ``docstore_ids``
+    maps document positions back to the vector store's docstore IDs.
+    """
+
+    def __init__(self,
+                 vocabulary: Dict[str, int],
+                 offsets: np.ndarray,
+                 doc_ids: np.ndarray,
+                 term_freqs: np.ndarray,
+                 doc_lengths: np.ndarray,
+                 docstore_ids: Sequence[str],
+                 k1: float = 1.5,
+                 b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.docstore_ids = list(docstore_ids)
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(offsets)
+        self.idf = np.log(1 + (n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts: Sequence[str], docstore_ids: Sequence[str], **kwargs) -> "BM25Index":
+        vocabulary: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, freq))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        term_freqs = np.fromiter((f for p in postings for _, f in p), dtype=np.uint16, count=int(offsets[-1]))
+        return cls(vocabulary, offsets, doc_ids, term_freqs, doc_lengths, docstore_ids, **kwargs)
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs) -> "BM25Index":
+        """Index a FAISS vector store's documents, in FAISS index order."""
+        docstore_ids = [vector_store.index_to_docstore_id[i] for i in sorted(vector_store.index_to_docstore_id)]
+        texts = [vector_store.docstore.search(docstore_id).page_content for docstore_id in docstore_ids]
+        return cls.build(texts, docstore_ids, **kwargs)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to ``k`` (docstore_id, score) pairs, best first."""
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(self.docstore_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str):
+        """Write the index to ``path`` atomically: readers in other workers never see a partial file."""
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self._write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _write(self, f):
+        np.savez(
+            f,
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            vocabulary=np.array(json.dumps(self.vocabulary)),
+            docstore_ids=np.array(json.dumps(self.docstore_ids)),
+            params=np.array([self.k1, self.b], dtype=np.float32)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            k1, b = data['params'].tolist()
+            return cls(
+                json.loads(str(data['vocabulary'])),
+                data['offsets'],
+                data['doc_ids'],
+                data['term_freqs'],
+                data['doc_lengths'],
+                json.loads(str(data['docstore_ids'])),
+                k1=k1,
+                b=b
+            )
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], rrf_k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(id) = sum over lists of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing FAISS similarity and BM25 rankings with reciprocal-rank fusion."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    bm25: BM25Index
+    search_kwargs: Dict[str, Any] = {'k': 4}
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _dense_ranking(self, embedding: List[float]) -> List[str]:
+        """Docstore IDs of the ``fetch_k`` nearest chunks: the same IDs the BM25 ranking uses."""
+        vector_store = self.vectorstore
+        vector = np.asarray([embedding], dtype=np.float32)
+        if vector_store._normalize_L2:
+            faiss.normalize_L2(vector)
+        _, indices = vector_store.index.search(vector, self.fetch_k)
+        return [vector_store.index_to_docstore_id[i] for i in indices[0].tolist() if i != -1]
+
+    def _fuse(self, dense_ranking: List[str], query: str) -> List[Document]:
+        k = self.search_kwargs.get('k', 4)
+        sparse_ranking = [docstore_id for docstore_id, _ in self.bm25.search(query, self.fetch_k)]
+
+        results = []
+        for docstore_id, _ in reciprocal_rank_fusion([dense_ranking, sparse_ranking], self.rrf_k)[:k]:
+            doc = self.vectorstore.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                results.append(doc)
+        return results
+
+    def retrieve_with_embedding(self, query: str, embedding: List[float]) -> List[Document]:
+        """Hybrid retrieval reusing an already computed query embedding."""
+        return self._fuse(self._dense_ranking(embedding), query)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._fuse(self._dense_ranking(self.vectorstore._embed_query(query)), query)
+
+
+def save_bm25(vector_store, index_dir: str):
+    """Build the BM25 index of a vector store and save it in its index directory (an IndexStore sidecar)."""
+    bm25 = BM25Index.from_vector_store(vector_store)
+    bm25.save(os.path.join(index_dir, BM25_FILE))
+    logger.info(f"Built BM25 index over {len(bm25)} chunks")
+
+
+def load_or_build_bm25(vector_store, index_dir: Optional[str] = None) -> BM25Index:
+    """
+    Load the BM25 index saved next to a cached FAISS index, or build (and save) it.
+
+    Indexes saved with the save_bm25 sidecar already have one; building here covers
+    entries cached before hybrid retrieval was enabled.
+    ``index_dir`` is the vector store's IndexStore entry directory, or None for no persistence.
+    """
+    path = os.path.join(index_dir, BM25_FILE) if index_dir else None
+    if path and os.path.exists(path):
+        try:
+            return BM25Index.load(path)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable BM25 index {path}: {e}")
+
+    bm25 = BM25Index.from_vector_store(vector_store)
+    if path and os.path.isdir(index_dir):
+        bm25.save(path)
+    logger.info(f"Built BM25 index over {len(bm25)} chunks")
+    return bm25
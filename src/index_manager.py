@@ -0,0 +1,370 @@
+import hashlib
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+try:
+    from .embeddings import build_faiss_index, describe_index, embed_texts
+except ImportError:
+    from embeddings import build_faiss_index, describe_index, embed_texts
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(video_id: str, text: str) -> str:
+    """Stable chunk ID: the same text in the same video always maps to the same ID."""
+    return f"{video_id}:{content_hash(text)[:16]}"
+
+
+class IncrementalFAISS(FAISS):
+    """FAISS vector store that hides soft-deleted chunks until they are compacted away."""
+
+    def __init__(self, *args, manager: "IndexManager" = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manager = manager
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, fetch_k: int = 20, **kwargs):
+        with self.manager.lock:
+            deleted = self.manager.deleted_chunk_ids
+            # Over-fetch so soft-deleted hits don't shrink the result set
+            extra = len(deleted)
+            results = super().similarity_search_with_score_by_vector(
+                embedding, k=k + extra, filter=filter, fetch_k=fetch_k + extra, **kwargs
+            )
+        if extra:
+            results = [(doc, score) for doc, score in results if doc.metadata.get('chunk_id') not in deleted]
+        return results[:k]
+
+
+class IndexManager:
+    """
+    Incrementally maintained FAISS index over many videos.
+
+    Chunks get stable IDs (``video_id:content_hash``) and stable int64 vector IDs
+    through an ``IndexIDMap2`` around an index built by embeddings.build_faiss_index (any
+    ``vector_index`` type), so adding or replacing one video never rebuilds the rest of
+    the index. Chunks whose text was already embedded (in any video) reuse the stored
+    vector, and new text goes through the embeddings model (and its embedding cache).
+    Deletions are soft until ``compact`` physically removes them, which ``maybe_compact``
+    runs on a background thread once enough chunks are deleted. ``save``/``load`` persist
+    the index through an IndexStore.
+    """
+
+    def __init__(self, embeddings, index_config: Optional[Dict[str, Any]] = None, compact_ratio: float = 0.2):
+        self.embeddings = embeddings
+        self.index_config = index_config or {}
+        self.compact_ratio = compact_ratio
+        self.lock = threading.RLock()
+        self.vector_store: Optional[IncrementalFAISS] = None
+        self.chunk_to_vector: Dict[str, int] = {}
+        self.hash_to_vector: Dict[str, int] = {}
+        self.video_chunks: Dict[str, Set[str]] = {}
+        self.deleted_chunk_ids: Set[str] = set()
+        self._next_id = 0
+        self._compacting = False
+
+    def __len__(self):
+        # Compaction updates both collections under the lock
+        with self.lock:
+            return len(self.chunk_to_vector) - len(self.deleted_chunk_ids)
+
+    def video_ids(self) -> List[str]:
+        return [video_id for video_id, chunk_ids in self.video_chunks.items() if chunk_ids]
+
+    @classmethod
+    def load(cls, store, key: str, embeddings, index_config: Optional[Dict[str, Any]] = None,
+             compact_ratio: float = 0.2) -> Optional["IndexManager"]:
+        """Reopen a manager saved under ``key`` in an IndexStore, or None if there is none."""
+        hit = store.load(key, embeddings, writable=True)
+        if hit is None:
+            return None
+        vector_store, _ = hit
+        if not isinstance(vector_store.index, faiss.IndexIDMap2):
+            logger.warning(f"Index {key} was not built by IndexManager; starting over")
+            return None
+        manager = cls(embeddings, index_config, compact_ratio)
+        manager._adopt(vector_store)
+        logger.info(f"Loaded incremental index {key} with {len(manager)} chunks from {len(manager.video_ids())} videos")
+        return manager
+
+    def save(self, store, key: str, metadata: Optional[Dict[str, Any]] = None, sidecars: Sequence[Callable] = ()):
+        """Compact, then write the index (and ``sidecars``, see IndexStore.save) to an IndexStore under ``key``."""
+        with self.lock:
+            if self.vector_store is None:
+                return
+            self.compact()
+            store.save(key, self.vector_store, dict(
+                metadata or {},
+                chunks=len(self),
+                videos=sorted(self.video_ids()),
+                vector_index=describe_index(self.vector_store.index)
+            ), sidecars)
+
+    def add(self, video_id: str, chunks: Iterable[Document]) -> int:
+        """
+        Add a video's chunks, skipping ones already indexed for that video.
+
+        Returns:
+            Number of chunks added
+        """
+        return self._add([(video_id, chunk) for chunk in chunks]).get(video_id, 0)
+
+    def delete(self, video_id: str) -> int:
+        """Soft-delete every chunk of a video. Returns the number of chunks deleted."""
+        with self.lock:
+            chunk_ids = self.video_chunks.pop(video_id, set())
+            self.deleted_chunk_ids.update(chunk_ids)
+        self.maybe_compact()
+        return len(chunk_ids)
+
+    def upsert(self, video_id: str, chunks: Iterable[Document]) -> Dict[str, int]:
+        """
+        Replace a video's chunks, e.g. after YouTube revised its transcript.
+
+        Unchanged chunks are kept as they are; only new text is embedded and only
+        chunks that disappeared are deleted.
+        """
+        chunks = [Document(page_content=chunk.page_content, metadata=dict(chunk.metadata, video_id=video_id))
+                  for chunk in chunks]
+        return self.upsert_many(chunks)[video_id] if chunks else self._replace(video_id, set(), 0)
+
+    def upsert_many(self, chunks: Iterable[Document], batch_size: int = 256) -> Dict[str, Dict[str, int]]:
+        """
+        Upsert every video in a stream of chunks tagged with ``video_id`` metadata.
+
+        ``chunks`` may be a generator (e.g. YouTubeTranscriptProcessor.iter_multiple_videos):
+        new text is embedded in batches of ``batch_size`` while later videos are still being
+        fetched. Quantized index types wait for ``train_sample`` chunks before the first batch
+        so they have enough vectors to train on. Each video in the stream ends up with
+        exactly the chunks streamed for it; videos not in the stream are left alone.
+        """
+        seen: Dict[str, Set[str]] = {}
+        added: Dict[str, int] = {}
+        batch: List[Tuple[str, Document]] = []
+
+        def flush():
+            for video_id, count in self._add(batch).items():
+                added[video_id] = added.get(video_id, 0) + count
+            batch.clear()
+
+        for chunk in chunks:
+            video_id = chunk.metadata['video_id']
+            seen.setdefault(video_id, set()).add(make_chunk_id(video_id, chunk.page_content))
+            batch.append((video_id, chunk))
+            if len(batch) >= self._batch_limit(batch_size):
+                flush()
+        flush()
+
+        results = {video_id: self._replace(video_id, chunk_ids, added.get(video_id, 0))
+                   for video_id, chunk_ids in seen.items()}
+        self.maybe_compact()
+        return results
+
+    def maybe_compact(self):
+        """Start a background compaction if the deleted fraction exceeds ``compact_ratio``."""
+        with self.lock:
+            total = len(self.chunk_to_vector)
+            if self._compacting or not total or len(self.deleted_chunk_ids) / total < self.compact_ratio:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="index-compaction", daemon=True).start()
+
+    def compact(self):
+        """Physically remove soft-deleted chunks from the FAISS index and docstore."""
+        try:
+            with self.lock:
+                deleted = list(self.deleted_chunk_ids)
+                if deleted:
+                    self._remove(deleted)
+                    logger.info(f"Compacted {len(deleted)} deleted chunks")
+        finally:
+            self._compacting = False
+
+    def _batch_limit(self, batch_size: int) -> int:
+        if self.vector_store is None and self.index_config.get('type', "flat") != "flat":
+            return max(batch_size, int(self.index_config.get('train_sample', 20000)))
+        return batch_size
+
+    def _replace(self, video_id: str, chunk_ids: Set[str], added: int) -> Dict[str, int]:
+        with self.lock:
+            old_ids = self.video_chunks.get(video_id, set())
+            removed = old_ids - chunk_ids
+            self.deleted_chunk_ids.update(removed)
+            self.video_chunks[video_id] = old_ids - removed
+            if not self.video_chunks[video_id]:
+                del self.video_chunks[video_id]
+        return {'added': added, 'removed': len(removed), 'unchanged': len(old_ids - removed) - added}
+
+    def _add(self, items: List[Tuple[str, Document]]) -> Dict[str, int]:
+        with self.lock:
+            pending: Dict[str, Tuple[str, Document]] = {}
+            for video_id, chunk in items:
+                chunk_id = make_chunk_id(video_id, chunk.page_content)
+                if chunk_id in self.chunk_to_vector and chunk_id not in self.deleted_chunk_ids:
+                    self.video_chunks.setdefault(video_id, set()).add(chunk_id)
+                    continue
+                pending[chunk_id] = (video_id, chunk)
+            if not pending:
+                return {}
+
+            # Re-added soft-deleted chunks: drop their stale vectors before remapping
+            stale = [chunk_id for chunk_id in pending if chunk_id in self.chunk_to_vector]
+            if stale:
+                self._remove(stale)
+
+            chunk_ids = list(pending)
+            docs = [pending[chunk_id][1] for chunk_id in chunk_ids]
+            vectors = self._vectors_for(docs)
+            vector_ids = np.arange(self._next_id, self._next_id + len(docs), dtype=np.int64)
+            self._next_id += len(docs)
+
+            store = self._ensure_store(vectors)
+            store.index.add_with_ids(vectors, vector_ids)
+            counts: Dict[str, int] = {}
+            for chunk_id, doc, vector_id in zip(chunk_ids, docs, vector_ids.tolist()):
+                video_id = pending[chunk_id][0]
+                text_hash = content_hash(doc.page_content)
+                metadata = dict(doc.metadata, video_id=video_id, chunk_id=chunk_id, content_hash=text_hash)
+                store.docstore.add({chunk_id: Document(id=chunk_id, page_content=doc.page_content, metadata=metadata)})
+                store.index_to_docstore_id[vector_id] = chunk_id
+                self.chunk_to_vector[chunk_id] = vector_id
+                self.hash_to_vector.setdefault(text_hash, vector_id)
+                self.video_chunks.setdefault(video_id, set()).add(chunk_id)
+                counts[video_id] = counts.get(video_id, 0) + 1
+
+            logger.info(f"Added {len(docs)} chunks for {len(counts)} videos")
+            return counts
+
+    def _remove(self, chunk_ids: List[str]):
+        """Physically remove chunks; called with the lock held."""
+        store = self.vector_store
+        vector_ids = np.array([self.chunk_to_vector.pop(chunk_id) for chunk_id in chunk_ids], dtype=np.int64)
+        try:
+            store.index.remove_ids(vector_ids)
+        except RuntimeError:
+            # Some index types (HNSW) cannot remove vectors; rebuild from the ones that stay
+            self._rebuild()
+        for chunk_id, vector_id in zip(chunk_ids, vector_ids.tolist()):
+            store.index_to_docstore_id.pop(vector_id, None)
+            store.docstore.delete([chunk_id])
+            self.deleted_chunk_ids.discard(chunk_id)
+        # Other chunks with the same text may still hold a vector for it
+        self._index_hashes()
+
+    def _rebuild(self):
+        ids = np.array(sorted(self.chunk_to_vector.values()), dtype=np.int64)
+        old = self.vector_store.index
+        vectors = np.vstack([old.reconstruct(int(vector_id)) for vector_id in ids]).astype(np.float32) if len(ids) else None
+        if vectors is None:
+            self.vector_store.index = faiss.IndexIDMap2(faiss.IndexFlatL2(old.d))
+            return
+        index = faiss.IndexIDMap2(build_faiss_index(vectors, self.index_config))
+        index.add_with_ids(vectors, ids)
+        self.vector_store.index = index
+        logger.info(f"Rebuilt index with {len(ids)} vectors")
+
+    def _index_hashes(self):
+        docstore = self.vector_store.docstore
+        self.hash_to_vector = {}
+        for chunk_id, vector_id in self.chunk_to_vector.items():
+            if chunk_id in self.deleted_chunk_ids:
+                continue
+            doc = docstore.search(chunk_id)
+            if isinstance(doc, Document):
+                self.hash_to_vector.setdefault(doc.metadata['content_hash'], vector_id)
+
+    def _adopt(self, vector_store: FAISS):
+        self.vector_store = IncrementalFAISS(
+            self.embeddings, vector_store.index, vector_store.docstore, vector_store.index_to_docstore_id, manager=self
+        )
+        for vector_id, chunk_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(chunk_id)
+            self.chunk_to_vector[chunk_id] = vector_id
+            self.video_chunks.setdefault(doc.metadata['video_id'], set()).add(chunk_id)
+        self._next_id = max(self.chunk_to_vector.values(), default=-1) + 1
+        self._index_hashes()
+
+    def _vectors_for(self, docs: List[Document]) -> np.ndarray:
+        """Embed only text not seen before; reconstruct vectors for known content hashes."""
+        vectors: List[Optional[np.ndarray]] = [None] * len(docs)
+        missing = []
+        for i, doc in enumerate(docs):
+            vector_id = self.hash_to_vector.get(content_hash(doc.page_content))
+            if vector_id is not None and self.vector_store is not None:
+                try:
+                    vectors[i] = self.vector_store.index.reconstruct(vector_id)
+                    continue
+                except RuntimeError:
+                    # IVF indexes cannot reconstruct by ID; the embedding cache covers these
+                    pass
+            missing.append(i)
+
+        if missing:
+            # Identical texts within the batch are embedded once
+            texts = list(dict.fromkeys(docs[i].page_content for i in missing))
+            embedded = dict(zip(texts, embed_texts(self.embeddings, texts)))
+            for i in missing:
+                vectors[i] = np.asarray(embedded[docs[i].page_content], dtype=np.float32)
+        logger.info(f"Embedded {len(missing)} of {len(docs)} chunks, reused {len(docs) - len(missing)}")
+        return np.vstack(vectors).astype(np.float32)
+
+    def _ensure_store(self, vectors: np.ndarray) -> IncrementalFAISS:
+        if self.vector_store is None:
+            # The first batch trains quantized index types
+            index = faiss.IndexIDMap2(build_faiss_index(vectors, self.index_config))
+            self.vector_store = IncrementalFAISS(
+                self.embeddings, index, InMemoryDocstore(), {}, manager=self
+            )
+        return self.vector_store
+
+
+def sync_corpus(store,
+                key: str,
+                embeddings,
+                chunks: Iterable[Document],
+                remove_video_ids: Iterable[str] = (),
+                keep_video_ids: Optional[Iterable[str]] = None,
+                index_config: Optional[Dict[str, Any]] = None,
+                batch_size: int = 256,
+                metadata: Optional[Dict[str, Any]] = None,
+                sidecars: Sequence[Callable] = ()) -> Tuple[IndexManager, Dict[str, Any]]:
+    """
+    Load the corpus index saved under ``key`` in ``store`` (or start one), upsert the videos streamed in
+    ``chunks``, delete ``remove_video_ids`` (and, given ``keep_video_ids``, every video not
+    in it), and save it back to ``store``.
+
+    Without a store the index lives in memory only. Runs under the store's lock for ``key`` so concurrent updates (e.g. from several API
+    workers) apply one after another instead of overwriting each other.
+
+    Returns:
+        (manager, summary) with per-video upsert counts and the corpus size
+    """
+    with store.lock(key) if store is not None else nullcontext():
+        manager = store is not None and IndexManager.load(store, key, embeddings, index_config)
+        manager = manager or IndexManager(embeddings, index_config)
+        videos = manager.upsert_many(chunks, batch_size)
+        remove_video_ids = set(remove_video_ids)
+        if keep_video_ids is not None:
+            remove_video_ids.update(set(manager.video_ids()) - set(keep_video_ids))
+        removed = {video_id: manager.delete(video_id) for video_id in remove_video_ids}
+        if store is not None:
+            manager.save(store, key, metadata, sidecars)
+        else:
+            manager.compact()
+    return manager, {
+        'videos': videos,
+        'removed': removed,
+        'chunks': len(manager),
+        'video_ids': sorted(manager.video_ids())
+    }
@@ -0,0 +1,134 @@
+"""
+Recall/latency/memory report for the FAISS index types in ``vector_index``.
+
+Usage:
+    python -m src.index_report --synthetic 50000
+    python -m src.index_report --index-key <key from the index cache> --json report.json
+
+Each index type is built with the ``vector_index`` settings from config/config.yaml and
+compared against exact (flat) search over the same vectors.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+import yaml
+
+try:
+    from .embeddings import INDEX_TYPES, build_faiss_index, describe_index
+    from .index_store import INDEX_FILE, IndexStore, _read_index
+except ImportError:
+    from embeddings import INDEX_TYPES, build_faiss_index, describe_index
+    from index_store import INDEX_FILE, IndexStore, _read_index
+
+
+def synthetic_vectors(n_vectors: int, dimension: int = 384, n_topics: int = 64, seed: int = 0) -> np.ndarray:
+    """Unit vectors clustered around random topic centres, roughly like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_topics, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, n_topics, n_vectors)] + 0.5 * rng.standard_normal((n_vectors, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def cached_vectors(index_dir: str) -> np.ndarray:
+    """Vectors of a cached flat index, reconstructed from its index.faiss."""
+    index = _read_index(f"{index_dir}/{INDEX_FILE}")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def evaluate(vectors: np.ndarray,
+             index_config: Dict[str, Any],
+             index_types: Sequence[str] = INDEX_TYPES,
+             k: int = 10,
+             n_queries: int = 200,
+             seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build each index type over ``vectors`` and measure it against exact search.
+
+    Queries are perturbed copies of randomly chosen stored vectors. Returns one row per
+    type with build time, serialized size, recall@k and per-query latency.
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    queries = (queries + 0.05 * rng.standard_normal(queries.shape)).astype(np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, dict(index_config, type=index_type))
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            found[i] = ids[0]
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())])
+        rows.append({
+            'type': index_type,
+            'index': describe_index(index),
+            'vectors': len(vectors),
+            'build_seconds': round(build_seconds, 3),
+            'bytes': len(faiss.serialize_index(index)),
+            f'recall_at_{k}': round(float(recall), 4),
+            'mean_ms': round(1000 * float(np.mean(latencies)), 4),
+            'p95_ms': round(1000 * float(np.percentile(latencies, 95)), 4)
+        })
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    recall_key = next(key for key in rows[0] if key.startswith('recall_at_'))
+    lines = [f"{'type':<8}{'class':<24}{'MB':>9}{'build s':>10}{recall_key:>14}{'mean ms':>10}{'p95 ms':>10}"]
+    for row in rows:
+        lines.append(
+            f"{row['type']:<8}{row['index']['class']:<24}{row['bytes'] / 2 ** 20:>9.2f}{row['build_seconds']:>10.3f}"
+            f"{row[recall_key]:>14.4f}{row['mean_ms']:>10.4f}{row['p95_ms']:>10.4f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="N", help="Use N synthetic vectors")
+    source.add_argument("--index-key", help="Use the vectors of a cached (flat) index")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--config", default="config/config.yaml")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="Also write the rows to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dimension)
+    else:
+        index_dir = IndexStore(config['index_cache_dir']).entry_path(args.index_key)
+        if index_dir is None:
+            parser.error(f"No cached index {args.index_key} in {config['index_cache_dir']}")
+        vectors = cached_vectors(index_dir)
+
+    rows = evaluate(vectors, config.get('vector_index') or {}, args.types, args.k, args.queries)
+    print(format_report(rows))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows; there updates are only serialized within one process
+    fcntl = None
+
+try:
+    from .metrics import record_cache_lookup, timed
+except ImportError:
+    from metrics import record_cache_lookup, timed
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+META_FILE = "meta.json"
+
+
+# Bump when chunk boundaries or metadata change so stale cached indexes are not reused
+CHUNKER_VERSION = "snippets-v1"
+
+# Build-time ``vector_index`` settings of each index type, with the defaults
+# embeddings.build_faiss_index applies. Query-time knobs (ivf_nprobe, hnsw_ef_search) are
+# left out: set_search_params applies them on load, so retuning them reuses the index.
+INDEX_BUILD_PARAMS = {
+    'hnsw': {'hnsw_m': 32},
+    'ivfpq': {'ivf_nlist': 0, 'pq_m': 48, 'pq_bits': 8, 'train_sample': 20000},
+    'sq': {'sq_type': "SQ8"}
+}
+
+
+def make_index_key(video_id: str,
+                   chunk_size: int,
+                   chunk_overlap: int,
+                   embeddings_model: str,
+                   index_config: Optional[Dict[str, Any]] = None) -> str:
+    """Build a content-addressed key for a video's index under a given chunking/model/index setup."""
+    key = {
+        'chunker': CHUNKER_VERSION,
+        'video_id': video_id,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'embeddings_model': embeddings_model
+    }
+    # Flat indexes keep their original keys so existing cache entries stay valid
+    index_type = (index_config or {}).get('type', "flat")
+    if index_type != "flat":
+        defaults = INDEX_BUILD_PARAMS.get(index_type, {})
+        key['vector_index'] = dict(
+            {name: index_config.get(name) or default for name, default in defaults.items()},
+            type=index_type
+        )
+    payload = json.dumps(key, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class IndexStore:
+    """On-disk cache of FAISS vector stores with size-bounded LRU eviction."""
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # Keys whose lock the current thread holds, so lock() is reentrant
+        self._held = threading.local()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def entry_path(self, key: str) -> Optional[str]:
+        """Directory of a cached entry, where sidecar files (e.g. BM25 postings) can live."""
+        return self._path(key) if self.contains(key) else None
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self._path(key), META_FILE))
+
+    @contextmanager
+    def lock(self, key: str):
+        """
+        Exclusive lock on ``key`` across threads and processes, for read-modify-write updates.
+
+        Reentrant within a thread, so save() and load() can be called with the lock already held.
+        """
+        held = self._held_keys()
+        if key in held:
+            yield
+            return
+        with self._key_lock(key), self._file_lock(key, exclusive=True):
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+
+    def _held_keys(self) -> set:
+        return self._held.__dict__.setdefault('keys', set())
+
+    @contextmanager
+    def _file_lock(self, key: str, exclusive: bool):
+        # Shared for readers, exclusive for writers swapping the entry
+        with open(os.path.join(self.root, f".{key}.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        # flock is per open file, so threads of one process also need a lock of their own
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def load(self, key: str, embeddings, writable: bool = False) -> Optional[Tuple[FAISS, Dict[str, Any]]]:
+        """
+        Load a cached vector store, memory-mapping the FAISS index where supported.
+
+        ``writable`` reads the index into memory instead, for callers that modify it.
+
+        Returns:
+            (vector_store, metadata) on a hit, None on a miss or unreadable entry
+        """
+        path = self._path(key)
+        if not self.contains(key):
+            return None
+
+        # A shared lock keeps save() in another worker from swapping the entry mid-read
+        with nullcontext() if key in self._held_keys() else self._file_lock(key, exclusive=False):
+            if not self.contains(key):
+                return None
+            try:
+                index_path = os.path.join(path, INDEX_FILE)
+                index = faiss.read_index(index_path) if writable else _read_index(index_path)
+                with open(os.path.join(path, DOCSTORE_FILE), "rb") as f:
+                    docstore, index_to_docstore_id = pickle.load(f)
+                with open(os.path.join(path, META_FILE), "r") as f:
+                    metadata = json.load(f)
+            except Exception as e:
+                logger.warning(f"Discarding unreadable index cache entry {key}: {e}")
+                self.delete(key)
+                return None
+
+            # Directory mtime doubles as the LRU access time
+            os.utime(path, None)
+        vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+        return vector_store, metadata
+
+    def save(self,
+             key: str,
+             vector_store: FAISS,
+             metadata: Optional[Dict[str, Any]] = None,
+             sidecars: Sequence[Callable[[FAISS, str], None]] = ()):
+        """
+        Atomically write a vector store under ``key`` and evict old entries if over budget.
+
+        Each of ``sidecars`` is called with (vector_store, directory) to write extra files
+        derived from the index (e.g. BM25 postings), which are swapped in together with it.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=self.root)
+        try:
+            vector_store.save_local(tmp_dir)
+            for sidecar in sidecars:
+                sidecar(vector_store, tmp_dir)
+            with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+                json.dump(dict(metadata or {}, created_at=time.time()), f)
+
+            # Other workers share the directory: swap entries under the cross-process lock
+            with self.lock(key):
+                path = self._path(key)
+                old_dir = self._move_aside(key)
+                os.replace(tmp_dir, path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+        self.evict()
+
+    def _move_aside(self, key: str) -> Optional[str]:
+        """Rename an entry out of the way in one step, so readers never see it half deleted."""
+        old_dir = os.path.join(self.root, f".{key}-old-{os.getpid()}-{threading.get_ident()}")
+        try:
+            os.rename(self._path(key), old_dir)
+        except FileNotFoundError:
+            return None
+        return old_dir
+
+    def delete(self, key: str):
+        old_dir = self._move_aside(key)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def entries(self) -> List[Tuple[str, float, int]]:
+        """Return (key, last_access, size_in_bytes) for every complete entry."""
+        entries = []
+        for name in os.listdir(self.root):
+            path = self._path(name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, f))
+                for f in os.listdir(path)
+            )
+            entries.append((name, os.path.getmtime(path), size))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the store fits in ``max_bytes``."""
+        with self._lock:
+            entries = sorted(self.entries(), key=lambda e: e[1])
+            total = sum(size for _, _, size in entries)
+            for key, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                logger.info(f"Evicting cached index {key} ({size} bytes)")
+                self.delete(key)
+                total -= size
+
+
+def _read_index(path: str):
+    # IO_FLAG_MMAP_IFC (newer faiss) maps the vector codes of every index type straight
+    # from the file, so processes opening the same index share its pages. IO_FLAG_MMAP
+    # only maps IVF inverted lists and copies everything else onto the heap.
+    for flag in (getattr(faiss, "IO_FLAG_MMAP_IFC", None), faiss.IO_FLAG_MMAP):
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type supports every memory-mapped read
+            continue
+    return faiss.read_index(path)
+
+
+def load_or_build_vector_store(store: Optional[IndexStore],
+                               key: str,
+                               embeddings,
+                               build: Callable[[], Tuple[FAISS, Dict[str, Any]]],
+                               sidecars: Sequence[Callable[[FAISS, str], None]] = ()) -> Tuple[FAISS, Dict[str, Any]]:
+    """
+    Return the cached vector store for ``key``, or build it with ``build()`` and cache it.
+
+    Args:
+        store: Index store to consult, or None to always build
+        key: Key from make_index_key
+        embeddings: Embeddings model bound to the loaded vector store
+        build: Callable returning (vector_store, metadata) on a cache miss
+        sidecars: Extra files to write next to a newly built index (see IndexStore.save)
+
+    Returns:
+        (vector_store, metadata) with ``cached`` set in the metadata
+    """
+    if store is not None:
+        with timed("index_load"):
+            hit = store.load(key, embeddings)
+        record_cache_lookup("index", hit is not None)
+        if hit is not None:
+            vector_store, metadata = hit
+            logger.info(f"Loaded cached index {key}")
+            return vector_store, dict(metadata, cached=True)
+
+    vector_store, metadata = build()
+    if store is not None:
+        store.save(key, vector_store, metadata, sidecars)
+        # Reopen the saved copy so this process maps the same pages as every other reader
+        saved = store.load(key, embeddings)
+        if saved is not None:
+            vector_store = saved[0]
+    return vector_store, dict(metadata, cached=False)
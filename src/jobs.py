@@ -0,0 +1,221 @@
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Ingestion stages, in the order a job moves through them
+QUEUED = "queued"
+FETCHING = "fetching"
+CHUNKING = "chunking"
+EMBEDDING = "embedding"
+INDEXING = "indexing"
+DONE = "done"
+ERROR = "error"
+# A prefetch job abandoned before it started because the server was busy
+DROPPED = "dropped"
+
+STAGES = [QUEUED, FETCHING, CHUNKING, EMBEDDING, INDEXING, DONE]
+FINISHED = (DONE, ERROR, DROPPED)
+
+PREFETCH_JOBS = REGISTRY.counter(
+    "ytchat_prefetch_jobs_total", "Speculative ingestion jobs by outcome.", ("result",)
+)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def lower_thread_priority(niceness: int = 10):
+    """Thread initializer that makes the calling thread yield the CPU to the others (Linux only)."""
+    # Linux schedules threads individually, so this leaves the rest of the process alone
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+        except OSError as e:
+            logger.warning(f"Could not lower prefetch thread priority: {e}")
+
+
+@dataclass
+class IngestionJob:
+    """State of one background ingestion job, as reported by the status endpoints."""
+    job_id: str
+    key: str
+    video_id: str
+    stage: str = QUEUED
+    error: Optional[str] = None
+    result: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Speculative (no user waiting on it yet); cleared when a user request joins the job
+    prefetch: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in FINISHED
+
+    @property
+    def progress(self) -> float:
+        if self.stage in (ERROR, DROPPED):
+            return 1.0
+        return STAGES.index(self.stage) / (len(STAGES) - 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['progress'] = round(self.progress, 2)
+        return data
+
+
+class JobQueue:
+    """
+    Runs ingestion jobs on a bounded executor and deduplicates identical in-flight work.
+
+    A job is submitted under a key (e.g. the index cache key); while a job with that key
+    is queued or running, further submissions return the existing job instead of starting
+    another one.
+
+    Prefetch jobs (speculative ingestion nobody has asked for yet) run on their own,
+    low-priority ``prefetch_executor`` and give way to user work: they are only accepted
+    while no user job is in flight and fewer than ``max_prefetch_pending`` are waiting,
+    and a prefetch job is dropped when it reaches the front of the queue if a user job
+    has started since or it waited longer than ``prefetch_max_age``. A user submission
+    for the same key joins the prefetch job and promotes it, so it is never dropped; a
+    promoted job that has not started yet is also queued on ``executor`` and runs on
+    whichever pool reaches it first, instead of waiting behind other prefetches.
+    """
+
+    def __init__(self,
+                 executor: Executor,
+                 max_finished: int = 256,
+                 prefetch_executor: Optional[Executor] = None,
+                 max_prefetch_pending: int = 4,
+                 prefetch_max_age: float = 120.0):
+        self.executor = executor
+        self.max_finished = max_finished
+        self.prefetch_executor = prefetch_executor or executor
+        self.max_prefetch_pending = max_prefetch_pending
+        self.prefetch_max_age = prefetch_max_age
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._in_flight: Dict[str, IngestionJob] = {}
+        # job_id -> (func, args) of jobs not started yet
+        self._pending: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, video_id: str, func: Callable[..., Dict[str, Any]], *args,
+               job_id: Optional[str] = None, prefetch: bool = False) -> IngestionJob:
+        """
+        Enqueue ``func(*args, on_stage=...)`` unless a job for ``key`` is already in flight.
+
+        ``func`` reports progress by calling ``on_stage(stage)`` and returns the job result.
+        ``job_id`` names the job (e.g. one already claimed in a shared registry).
+        """
+        with self._lock:
+            job = self._join(key, video_id, prefetch)
+            if job is not None:
+                return job
+
+            job = IngestionJob(job_id=job_id or new_job_id(), key=key, video_id=video_id, prefetch=prefetch)
+            self._jobs[job.job_id] = job
+            self._in_flight[key] = job
+            self._pending[job.job_id] = (func, args)
+            self._prune()
+
+        (self.prefetch_executor if prefetch else self.executor).submit(self._run, job)
+        return job
+
+    def join(self, key: str, video_id: str) -> Optional[IngestionJob]:
+        """Join the job in flight for ``key`` as a user request, promoting a prefetch job; None if there is none."""
+        with self._lock:
+            return self._join(key, video_id, False)
+
+    def _join(self, key: str, video_id: str, prefetch: bool) -> Optional[IngestionJob]:
+        job = self._in_flight.get(key)
+        if job is not None:
+            if job.prefetch and not prefetch:
+                logger.info(f"Promoting prefetch job {job.job_id} for video {video_id}")
+                job.prefetch = False
+                PREFETCH_JOBS.inc(result="promoted")
+                if job.job_id in self._pending:
+                    # Don't leave a user waiting behind other prefetches on the low-priority thread
+                    self.executor.submit(self._run, job)
+            else:
+                logger.info(f"Joining in-flight job {job.job_id} for video {video_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def is_in_flight(self, key: str) -> bool:
+        return key in self._in_flight
+
+    def _user_in_flight(self) -> int:
+        return sum(1 for job in self._in_flight.values() if not job.prefetch)
+
+    def accepting_prefetch(self) -> bool:
+        """Whether a new prefetch job would be taken now (no user work, prefetch queue not full)."""
+        with self._lock:
+            pending = sum(1 for job in self._in_flight.values() if job.prefetch)
+            return self._user_in_flight() == 0 and pending < self.max_prefetch_pending
+
+    def _set_stage(self, job: IngestionJob, stage: str):
+        job.stage = stage
+        job.updated_at = time.time()
+
+    def _should_drop(self, job: IngestionJob) -> bool:
+        with self._lock:
+            if not job.prefetch:
+                return False
+            if self._user_in_flight() == 0 and time.time() - job.created_at <= self.prefetch_max_age:
+                return False
+            # Stop joins from promoting a job that is not going to run
+            self._in_flight.pop(job.key, None)
+            self._set_stage(job, DROPPED)
+            return True
+
+    def _run(self, job: IngestionJob):
+        with self._lock:
+            task = self._pending.pop(job.job_id, None)
+        if task is None:
+            # A promoted job already started on the other pool
+            return
+        func, args = task
+        if self._should_drop(job):
+            logger.info(f"Dropped prefetch job {job.job_id} for video {job.video_id}: server busy or request stale")
+            PREFETCH_JOBS.inc(result="dropped")
+            return
+
+        try:
+            job.result = func(*args, on_stage=lambda stage: self._set_stage(job, stage)) or {}
+            self._set_stage(job, DONE)
+            if job.prefetch:
+                PREFETCH_JOBS.inc(result="completed")
+        except Exception as e:
+            logger.error(f"Ingestion job {job.job_id} for video {job.video_id} failed: {str(e)}")
+            job.error = getattr(e, "detail", None) or str(e)
+            self._set_stage(job, ERROR)
+            if job.prefetch:
+                PREFETCH_JOBS.inc(result="failed")
+        finally:
+            with self._lock:
+                self._in_flight.pop(job.key, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,492 @@
+"""
+Traffic control for LLM calls: a process-wide concurrency limit with rate-limit backoff,
+and coalescing of identical in-flight answer generations.
+
+- LLMLimiter caps concurrent model calls (sync and async callers share one FIFO queue).
+  A rate-limit error (HTTP 429 / RESOURCE_EXHAUSTED) pauses *every* caller for the
+  provider's retry delay, or an exponential backoff, before the call is retried.
+- InflightCoalescer lets identical requests share one generation: for answers the key
+  is (video, normalized question, retrieved context), so concurrent users asking the
+  same thing about a trending video cost one LLM call, streamed to all of them.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.runnables import Runnable
+
+try:
+    from .answer_cache import normalize_question
+    from .metrics import REGISTRY
+except ImportError:
+    from answer_cache import normalize_question
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "ytchat_llm_queue_seconds", "Time LLM calls waited for a concurrency slot (including rate-limit cooldown)."
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "ytchat_llm_in_flight", "LLM calls currently running."
+)
+LLM_WAITING = REGISTRY.gauge(
+    "ytchat_llm_waiting", "LLM calls queued for a concurrency slot."
+)
+LLM_RATE_LIMITED = REGISTRY.counter(
+    "ytchat_llm_rate_limited_total", "LLM calls rejected by the provider's rate limit."
+)
+LLM_COALESCED = REGISTRY.counter(
+    "ytchat_llm_coalesced_total", "Requests served by joining an identical in-flight generation."
+)
+
+_RATE_LIMIT_NAMES = ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota exceeded", re.IGNORECASE)
+_RETRY_DELAY_TEXT = re.compile(r"retry(?:[ _]delay| in| after)\D{0,20}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Whether ``error`` (or what caused it) is a provider rate-limit / quota rejection."""
+    for e in _error_chain(error):
+        if 429 in (getattr(e, "status_code", None), getattr(e, "code", None)):
+            return True
+        if type(e).__name__ in _RATE_LIMIT_NAMES or _RATE_LIMIT_TEXT.search(str(e)):
+            return True
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The retry delay the provider asked for, if the error carries one."""
+    for e in _error_chain(error):
+        retry_after = getattr(e, "retry_after", None)
+        if retry_after is None:
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+        if retry_after is None:
+            match = _RETRY_DELAY_TEXT.search(str(e))
+            retry_after = match.group(1) if match else None
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+class LLMLimiter:
+    """
+    Process-wide cap on concurrent LLM calls, with a FIFO queue and rate-limit backoff.
+
+    Slots are handed to waiters in arrival order, whether they wait in a thread or on an
+    event loop. When a call is rate limited every caller holds off until the cooldown
+    ends (the provider's retry delay, else ``base_delay * 2**attempt`` with jitter,
+    capped at ``max_delay``), then the call is retried up to ``max_retries`` times.
+    Streams are only retried if they fail before their first chunk.
+
+    The concurrency actually allowed adapts to the provider: it is halved on each new
+    rate-limit event (not again for 429s arriving during the same cooldown) and grows
+    back by one after that many calls succeed, up to ``max_concurrency``.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 8,
+                 max_retries: int = 4,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limited = 0
+        self._limit = self.max_concurrency
+        self._successes = 0
+        self._active = 0
+        # threading.Event for threads, (loop, future) for coroutines
+        self._waiters: deque = deque()
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'concurrency_limit': self._limit,
+                'in_flight': self._active,
+                'waiting': len(self._waiters),
+                'rate_limited': self.rate_limited,
+                'cooldown_s': round(max(0.0, self._cooldown_until - time.monotonic()), 3)
+            }
+
+    def _update_gauges(self):
+        LLM_IN_FLIGHT.set(self._active)
+        LLM_WAITING.set(len(self._waiters))
+
+    def _cooldown(self) -> float:
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._lock:
+            event = None
+            if self._active < self._limit and not self._waiters:
+                self._active += 1
+            else:
+                event = threading.Event()
+                self._waiters.append(event)
+            self._update_gauges()
+        if event is not None:
+            # release() hands its slot over before setting the event
+            event.wait()
+        while self._cooldown() > 0:
+            time.sleep(self._cooldown())
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - start)
+
+    async def aacquire(self):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = None
+            if self._active < self._limit and not self._waiters:
+                self._active += 1
+            else:
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            self._update_gauges()
+        if waiter is not None:
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._lock:
+                    handed_over = waiter not in self._waiters
+                    if not handed_over:
+                        self._waiters.remove(waiter)
+                        self._update_gauges()
+                if handed_over:
+                    self.release()
+                raise
+        try:
+            while self._cooldown() > 0:
+                await asyncio.sleep(self._cooldown())
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - start)
+
+    def release(self):
+        with self._lock:
+            # The slot is handed straight to the next waiter unless the limit has shrunk
+            self._active -= 1
+            self._grant()
+            self._update_gauges()
+
+    def _grant(self):
+        # Called with the lock held
+        while self._waiters and self._active < self._limit:
+            waiter = self._waiters.popleft()
+            self._active += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def _succeeded(self):
+        with self._lock:
+            if self._limit >= self.max_concurrency:
+                return
+            self._successes += 1
+            if self._successes >= self._limit:
+                self._successes = 0
+                self._limit += 1
+                self._grant()
+                self._update_gauges()
+
+    def _backoff(self, error: BaseException, attempt: int) -> float:
+        hint = retry_after_seconds(error)
+        delay = hint if hint is not None else min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            if now >= self._cooldown_until:
+                # A new rate-limit event rather than another 429 from the same burst
+                self._limit = max(1, self._limit // 2)
+                self._successes = 0
+            self._cooldown_until = max(self._cooldown_until, now + delay)
+        LLM_RATE_LIMITED.inc()
+        logger.warning(f"LLM rate limited (attempt {attempt + 1}/{self.max_retries + 1}); pausing LLM calls for {delay:.1f}s")
+        return delay
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_retries and is_rate_limit_error(error)
+
+    def call(self, func: Callable[[], Any]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                result = func()
+                self._succeeded()
+                return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self._backoff(e, attempt)
+            finally:
+                self.release()
+
+    async def acall(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire()
+            try:
+                result = await func()
+                self._succeeded()
+                return result
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self._backoff(e, attempt)
+            finally:
+                self.release()
+
+    def stream(self, func: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            started = False
+            try:
+                for chunk in func():
+                    started = True
+                    yield chunk
+                self._succeeded()
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                self._backoff(e, attempt)
+            finally:
+                self.release()
+
+    async def astream(self, func: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire()
+            started = False
+            try:
+                async for chunk in func():
+                    started = True
+                    yield chunk
+                self._succeeded()
+                return
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                self._backoff(e, attempt)
+            finally:
+                self.release()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LimitedLLM(Runnable):
+    """A chat model whose every call goes through an LLMLimiter."""
+
+    def __init__(self, llm: Runnable, limiter: LLMLimiter):
+        self.llm = llm
+        self.limiter = limiter
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.limiter.call(lambda: self.llm.invoke(input, config, **kwargs))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.limiter.acall(lambda: self.llm.ainvoke(input, config, **kwargs))
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.limiter.stream(lambda: self.llm.stream(input, config, **kwargs))
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.limiter.astream(lambda: self.llm.astream(input, config, **kwargs)):
+            yield chunk
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _Broadcast:
+    """One streaming generation fanned out to every subscriber, replaying what they missed."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.finished = False
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for chunk in self.chunks:
+            queue.put_nowait(("chunk", chunk))
+        self.subscribers.append(queue)
+        return queue
+
+    def publish(self, kind: str, value: Any = None):
+        if kind == "chunk":
+            self.chunks.append(value)
+        else:
+            self.finished = True
+        for queue in self.subscribers:
+            queue.put_nowait((kind, value))
+
+
+class InflightCoalescer:
+    """
+    Shares one in-flight computation between concurrent requests with the same key.
+
+    Nothing is cached: once the leader's call finishes, the next request with that key
+    starts a new one. A streaming generation keeps running while anyone is subscribed,
+    even if the request that started it goes away, and is cancelled once nobody is.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._broadcasts: Dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            LLM_COALESCED.inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def astream(self, key: str, func: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        # Broadcasts are only touched from the event loop, so they need no lock
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None:
+            broadcast = self._broadcasts[key] = _Broadcast()
+            queue = broadcast.subscribe()
+            broadcast.task = asyncio.create_task(self._produce(key, broadcast, func))
+        else:
+            LLM_COALESCED.inc()
+            queue = broadcast.subscribe()
+
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            broadcast.subscribers.remove(queue)
+            if not broadcast.subscribers and not broadcast.finished:
+                broadcast.task.cancel()
+
+    async def _produce(self, key: str, broadcast: _Broadcast, func: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in func():
+                broadcast.publish("chunk", chunk)
+            broadcast.publish("done")
+        except asyncio.CancelledError:
+            broadcast.publish("error", asyncio.CancelledError())
+        except Exception as e:
+            broadcast.publish("error", e)
+        finally:
+            if self._broadcasts.get(key) is broadcast:
+                del self._broadcasts[key]
+
+
+def answer_key(scope: Optional[str], question: str, docs: Sequence[Any]) -> str:
+    """Coalescing key for an answer: the video (or index handle), question and retrieved context."""
+    digest = hashlib.sha256()
+    for part in [scope or "", normalize_question(question)] + [doc.page_content for doc in docs]:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CoalescedAnswerChain(Runnable):
+    """
+    An answer chain ({docs, question} -> text) that shares identical in-flight generations.
+
+    Async calls (``ainvoke`` and ``astream``) share one streamed generation; sync
+    ``invoke`` calls share one result. Sync ``stream`` is passed through.
+    """
+
+    def __init__(self, answer_chain: Runnable, coalescer: InflightCoalescer, scope: Optional[str] = None):
+        self.answer_chain = answer_chain
+        self.coalescer = coalescer
+        self.scope = scope
+
+    def _key(self, input: Dict[str, Any]) -> str:
+        return answer_key(self.scope, input['question'], input['docs'])
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.coalescer.run(self._key(input), lambda: self.answer_chain.invoke(input, config, **kwargs))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return "".join([chunk async for chunk in self.astream(input, config, **kwargs)])
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.answer_chain.stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.coalescer.astream(self._key(input), lambda: self.answer_chain.astream(input, config, **kwargs)):
+            yield chunk
+
+
+_limiter = LLMLimiter()
+_coalescer = InflightCoalescer()
+
+
+def configure_llm_limiter(max_concurrency: int = 8,
+                          max_retries: int = 4,
+                          base_delay: float = 1.0,
+                          max_delay: float = 30.0) -> LLMLimiter:
+    """Set the process-wide limits. Models wrapped earlier keep the limiter they were given."""
+    global _limiter
+    _limiter = LLMLimiter(max_concurrency, max_retries, base_delay, max_delay)
+    return _limiter
+
+
+def get_llm_limiter() -> LLMLimiter:
+    return _limiter
+
+
+def get_coalescer() -> InflightCoalescer:
+    return _coalescer
@@ -0,0 +1,280 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Pipeline code records stage durations with ``timed(stage)`` / ``record_stage``. They feed
+the ``ytchat_stage_duration_seconds`` histogram and, inside a request that called
+``start_trace``, that request's trace (rendered as a ``Server-Timing`` header).
+LLM and retriever runs are timed by ``callback_handler``, a LangChain callback.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_INF_LABEL = 'le="+Inf"'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a count maintained elsewhere (e.g. a cache's own hit counter)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ytchat_stage_duration_seconds", "Duration of pipeline stages.", ("stage",)
+)
+CHUNKS_PER_VIDEO = REGISTRY.histogram(
+    "ytchat_chunks_per_video", "Chunks produced per transcript.",
+    buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+EMBEDDED_CHUNKS = REGISTRY.counter(
+    "ytchat_embedded_chunks_total", "Chunks embedded."
+)
+EMBEDDING_THROUGHPUT = REGISTRY.histogram(
+    "ytchat_embedding_chunks_per_second", "Embedding throughput per embedding call.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "ytchat_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result")
+)
+CACHE_HIT_RATE = REGISTRY.gauge(
+    "ytchat_cache_hit_rate", "Hit rate of each cache since startup.", ("cache",)
+)
+
+# Per-request list of (stage, seconds), set by start_trace
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("ytchat_trace", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_embedding(chunks: int, seconds: float):
+    record_stage("embed", seconds)
+    EMBEDDED_CHUNKS.inc(chunks)
+    if seconds > 0:
+        EMBEDDING_THROUGHPUT.observe(chunks / seconds)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def update_cache_stats(cache: str, stats: Optional[Dict[str, float]] = None):
+    """
+    Refresh a cache's lookup counters and hit rate.
+
+    ``stats`` (with ``hits`` and ``misses``) mirrors a cache that counts for itself;
+    without it the rate is computed from record_cache_lookup calls.
+    """
+    if stats is not None:
+        CACHE_LOOKUPS.set(stats['hits'], cache=cache, result="hit")
+        CACHE_LOOKUPS.set(stats['misses'], cache=cache, result="miss")
+    hits = CACHE_LOOKUPS.value(cache=cache, result="hit")
+    lookups = hits + CACHE_LOOKUPS.value(cache=cache, result="miss")
+    CACHE_HIT_RATE.set(hits / lookups if lookups else 0.0, cache=cache)
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    """Collect the stages timed in the current context (request) into the returned list."""
+    trace: List[Tuple[str, float]] = []
+    _trace.set(trace)
+    return trace
+
+
+def server_timing(trace: List[Tuple[str, float]]) -> str:
+    """Render a trace as a Server-Timing header value (durations in milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times retriever runs and LLM calls (time to first token and total)."""
+
+    # Record on the calling thread so request traces see the timings
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID):
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), None]
+
+    def _finish(self, run_id: UUID) -> Optional[List[Any]]:
+        with self._lock:
+            return self._runs.pop(run_id, None)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run is not None:
+            record_stage("retrieve", time.perf_counter() - run[0])
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run[1] is not None:
+                return
+            run[1] = time.perf_counter()
+        record_stage("llm_first_token", run[1] - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        if run is not None:
+            record_stage("llm", time.perf_counter() - run[0])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+callback_handler = MetricsCallbackHandler()
@@ -0,0 +1,337 @@
+"""
+ONNX Runtime embeddings backend (``embeddings_backend: "onnx"`` in config).
+
+A sentence-transformers model is exported once to ONNX and quantized to int8. The
+export needs torch; serving needs only onnxruntime and tokenizers. Concurrent
+embedding calls are merged into shared batches by DynamicBatcher.
+
+Usage:
+    python -m src.onnx_embeddings export --model BAAI/bge-small-en-v1.5
+    python -m src.onnx_embeddings parity --model BAAI/bge-small-en-v1.5
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "onnx_config.json"
+
+BATCH_SIZE = REGISTRY.histogram(
+    "ytchat_embedding_batch_size", "Texts per ONNX embedding batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+PARITY_TEXTS = [
+    "Nuclear fusion could provide almost limitless clean energy.",
+    "The tokamak confines plasma with strong magnetic fields.",
+    "In this video we compare lithium-ion and sodium-ion batteries.",
+    "Solar panels got ten times cheaper over the last decade.",
+    "Let's talk about how transformers process text.",
+    "The recipe needs two cups of flour and a pinch of salt.",
+    "He scored the winning goal in the final minute of the match.",
+    "Interest rates affect mortgage payments and housing prices.",
+    "Photosynthesis converts sunlight, water and carbon dioxide into sugar.",
+    "Don't forget to like and subscribe for more videos like this one."
+]
+
+
+def model_dir_for(root: str, model_name: str) -> str:
+    return os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+
+
+def _pooling_mode(pooling_config: Dict[str, Any]) -> Optional[str]:
+    mode = pooling_config.get('pooling_mode')
+    if mode is not None:
+        # sentence-transformers >= 6 names the mode directly
+        return mode[0] if isinstance(mode, list) and len(mode) == 1 else mode
+    if pooling_config.get('pooling_mode_cls_token'):
+        return "cls"
+    if pooling_config.get('pooling_mode_mean_tokens'):
+        return "mean"
+    return None
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True, opset: int = 17) -> str:
+    """
+    Export a sentence-transformers model to ONNX (plus an int8 copy) with its tokenizer.
+
+    Pooling and normalization are read from the model's modules and applied at
+    inference time, so outputs match ``HuggingFaceEmbeddings(model_name)``.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    pooling = next((module for module in model if isinstance(module, Pooling)), None)
+    pooling_mode = _pooling_mode(pooling.get_config_dict()) if pooling is not None else "mean"
+    if pooling_mode not in ("cls", "mean"):
+        raise ValueError(f"Unsupported pooling {pooling_mode!r} for ONNX export of {model_name}")
+
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *tensors):
+            return self.auto_model(**dict(zip(input_names, tensors))).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        HiddenStates(transformer.auto_model.eval()),
+        tuple(sample[name] for name in input_names),
+        model_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+        opset_version=opset,
+        dynamo=False
+    )
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(output_dir, CONFIG_FILE), "w") as f:
+        json.dump({
+            'model_name': model_name,
+            'input_names': input_names,
+            'pooling': pooling_mode,
+            'normalize': any(isinstance(module, Normalize) for module in model),
+            'max_seq_length': model.max_seq_length,
+            'pad_token': tokenizer.pad_token,
+            'pad_token_id': tokenizer.pad_token_id,
+            'dimension': model.get_sentence_embedding_dimension()
+        }, f, indent=2)
+    logger.info(f"Exported {model_name} to {output_dir}")
+    return output_dir
+
+
+class DynamicBatcher:
+    """
+    Merges concurrent requests into batches for one worker thread.
+
+    A batch is run as soon as it holds ``max_batch_size`` texts, or ``max_wait``
+    seconds after its first request arrived, whichever comes first. Requests larger
+    than a batch are split into batch-sized pieces.
+    """
+
+    def __init__(self, run_batch: Callable[[List[str]], np.ndarray], max_batch_size: int = 64, max_wait: float = 0.005):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: "deque[tuple]" = deque()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        futures = []
+        with self._cond:
+            for i in range(0, len(texts), self.max_batch_size):
+                future = Future()
+                self._pending.append((list(texts[i:i + self.max_batch_size]), future))
+                futures.append(future)
+            self._cond.notify()
+        return futures
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([future.result() for future in self.submit(texts)])
+
+    def _next_batch(self) -> List[tuple]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                if self._pending:
+                    if size + len(self._pending[0][0]) > self.max_batch_size:
+                        break
+                    item = self._pending.popleft()
+                    batch.append(item)
+                    size += len(item[0])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            BATCH_SIZE.observe(len(texts))
+            try:
+                vectors = self.run_batch(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Embeddings served by ONNX Runtime from a directory written by export_onnx_model."""
+
+    def __init__(self,
+                 model_dir: str,
+                 quantized: bool = True,
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0,
+                 threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE), "r") as f:
+            self.config: Dict[str, Any] = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.batcher = DynamicBatcher(self._run, max_batch_size, max_wait_ms / 1000.0)
+        logger.info(f"Loaded ONNX embeddings {model_dir}/{model_file}")
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        columns = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            'attention_mask': mask,
+            'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        hidden = self.session.run(None, {name: columns[name] for name in self.config['input_names']})[0]
+
+        if self.config['pooling'] == "cls":
+            vectors = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            vectors = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.config['normalize']:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.embed([text])[0].tolist()
+
+
+def load_onnx_embeddings(model_name: str,
+                         model_root: str = ".cache/onnx",
+                         quantized: bool = True,
+                         max_batch_size: int = 64,
+                         max_wait_ms: float = 5.0,
+                         threads: Optional[int] = None) -> OnnxEmbeddings:
+    """
+    Load the exported model for ``model_name``.
+
+    Raises FileNotFoundError if it has not been exported: exporting needs torch and takes
+    a while, so it is a separate step rather than something serving does on startup.
+    """
+    model_dir = model_dir_for(model_root, model_name)
+    model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+    if not all(os.path.exists(os.path.join(model_dir, name)) for name in (CONFIG_FILE, model_file)):
+        options = (f" --root {model_root}" if model_root != ".cache/onnx" else "") + ("" if quantized else " --no-quantize")
+        raise FileNotFoundError(
+            f"No ONNX export of {model_name} in {model_dir}; "
+            f"run: python -m src.onnx_embeddings export --model {model_name}{options}"
+        )
+    return OnnxEmbeddings(model_dir, quantized, max_batch_size, max_wait_ms, threads)
+
+
+def check_parity(model_name: str, onnx_embeddings: Embeddings, texts: Sequence[str] = PARITY_TEXTS, k: int = 3) -> Dict[str, float]:
+    """
+    Compare ONNX vectors with the PyTorch HuggingFaceEmbeddings vectors for ``texts``.
+
+    Reports per-text cosine similarity between the two backends and how often each
+    text's ``k`` nearest neighbours (among ``texts``) agree.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    expected = np.asarray(HuggingFaceEmbeddings(model_name=model_name).embed_documents(list(texts)), dtype=np.float32)
+    actual = np.asarray(onnx_embeddings.embed_documents(list(texts)), dtype=np.float32)
+    cosine = (expected * actual).sum(axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+
+    k = min(k, len(texts) - 1)
+    neighbours = lambda vectors: np.argsort(-(vectors @ vectors.T), axis=1)[:, 1:k + 1]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(neighbours(expected).tolist(), neighbours(actual).tolist())]
+    return {
+        'texts': len(texts),
+        'min_cosine': float(cosine.min()),
+        'mean_cosine': float(cosine.mean()),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        f'top{k}_overlap': float(np.mean(overlap))
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--model", required=True, help="sentence-transformers model name or path")
+    parser.add_argument("--root", default=".cache/onnx", help="Directory holding exported models")
+    parser.add_argument("--no-quantize", action="store_true", help="Use (or export only) the float32 model")
+    parser.add_argument("--texts", help="File with one parity text per line")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Parity fails below this cosine")
+    args = parser.parse_args(argv)
+
+    quantized = not args.no_quantize
+    if args.command == "export":
+        export_onnx_model(args.model, model_dir_for(args.root, args.model), quantize=quantized)
+        return 0
+
+    texts = PARITY_TEXTS
+    if args.texts:
+        with open(args.texts, "r") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    report = check_parity(args.model, load_onnx_embeddings(args.model, args.root, quantized), texts)
+    print(json.dumps(report, indent=2))
+    return 0 if report['min_cosine'] >= args.min_cosine else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
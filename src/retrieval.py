@@ -2,18 +2,39 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableParallel, RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
+import asyncio
 import os
+from functools import lru_cache, partial
+from operator import itemgetter
+from typing import List, Optional
+
+import tiktoken
 from dotenv import load_dotenv
 
+try:
+    from .llm_gateway import CoalescedAnswerChain, LimitedLLM, get_llm_limiter
+    from .metrics import callback_handler, timed
+except ImportError:
+    from llm_gateway import CoalescedAnswerChain, LimitedLLM, get_llm_limiter
+    from metrics import callback_handler, timed
+
 load_dotenv()
 
-def get_llm_model(model_name: str, temperature: float = 0.2, max_tokens: int = 512):
-    return ChatGoogleGenerativeAI(
-        model=model_name,
-        google_api_key=os.getenv("GOOGLE_API_KEY"),
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
+def get_llm_model(model_name: str, temperature: float = 0.2, max_tokens: int = 512, llm=None):
+    """
+    Chat model whose calls go through the process-wide LLM limiter (see llm_gateway).
+
+    ``llm`` replaces the Gemini model, e.g. fakes.FakeChatModel in benchmarks and load tests.
+    """
+    if llm is None:
+        llm = ChatGoogleGenerativeAI(
+            model=model_name,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            callbacks=[callback_handler]
+        )
+    return LimitedLLM(llm, get_llm_limiter())
 
 def get_prompt_template():
     return PromptTemplate(
@@ -27,13 +48,207 @@ def get_prompt_template():
         input_variables=['context', 'question']
     )
 
-def format_docs(retrieved_docs):
-    return "\n\n".join(doc.page_content for doc in retrieved_docs)
+def get_video_retriever(vector_store, video_id: str, k: int = 4, fetch_k: int = 50):
+    """Retriever over a shared multi-video index restricted to one video's chunks."""
+    return vector_store.as_retriever(
+        search_type="similarity",
+        search_kwargs={'k': k, 'fetch_k': fetch_k, 'filter': {'video_id': video_id}}
+    )
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding files could not be loaded (e.g. offline); fall back to a character estimate
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        # Rounded up, so text cut by truncate_to_tokens counts as exactly max_tokens
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
 
-def build_chain(retriever, llm, prompt):
+def merge_overlap(left: str, right: str, max_overlap: int = 2000) -> Optional[str]:
+    """Join two texts if the end of ``left`` repeats the start of ``right``; None if they don't overlap."""
+    probe = right[:32]
+    if not probe:
+        return left
+    start = left.find(probe, max(0, len(left) - max_overlap))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return left[:start] + right
+        start = left.find(probe, start + 1)
+    return None
+
+def _position(doc):
+    metadata = doc.metadata
+    return (metadata.get('video_id', ''), metadata.get('chunk_index', metadata.get('start', 0)))
+
+def pack_docs(retrieved_docs, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Assemble retrieved chunks into context passages.
+
+    Chunks are taken in retrieval-rank order until ``max_tokens`` is reached (the best
+    chunk is truncated if it alone is over budget), exact duplicates are dropped, then
+    the kept chunks are put back in transcript order and neighbouring chunks
+    (consecutive ``chunk_index`` or overlapping text) are merged so overlap is sent once.
+    """
+    selected, seen, used = [], set(), 0
+    for doc in retrieved_docs:
+        if doc.page_content in seen:
+            continue
+        tokens = count_tokens(doc.page_content)
+        if max_tokens is not None and used + tokens > max_tokens:
+            if not selected:
+                selected.append(doc.model_copy(update={'page_content': truncate_to_tokens(doc.page_content, max_tokens)}))
+            break
+        seen.add(doc.page_content)
+        selected.append(doc)
+        used += tokens
+
+    passages = []
+    previous = None
+    for doc in sorted(selected, key=_position):
+        text = doc.page_content
+        if passages and any(text in passage for passage in passages):
+            continue
+        if previous is not None and _position(previous)[0] == _position(doc)[0]:
+            merged = merge_overlap(passages[-1], text)
+            previous_index, index = previous.metadata.get('chunk_index'), doc.metadata.get('chunk_index')
+            adjacent = previous_index is not None and index is not None and index - previous_index == 1
+            if merged is not None:
+                passages[-1] = merged
+                previous = doc
+                continue
+            if adjacent:
+                passages[-1] = passages[-1] + " " + text
+                previous = doc
+                continue
+        passages.append(text)
+        previous = doc
+    return passages
+
+def format_docs(retrieved_docs, max_tokens: Optional[int] = None):
+    return "\n\n".join(pack_docs(retrieved_docs, max_tokens))
+
+def build_answer_chain(llm, prompt, max_context_tokens: Optional[int] = None):
+    """The generation half of the RAG chain: {docs, question} -> answer text."""
+    context = RunnableParallel({
+        'context': itemgetter('docs') | RunnableLambda(partial(format_docs, max_tokens=max_context_tokens)),
+        'question': itemgetter('question')
+    })
+    return context | prompt | llm | StrOutputParser()
+
+def coalesce_answers(answer_chain, coalescer=None, scope: Optional[str] = None):
+    """
+    Share identical in-flight generations of ``answer_chain`` through ``coalescer``.
+
+    Requests coalesce when they have the same ``scope`` (video or index handle),
+    normalized question and retrieved context. Without a coalescer the chain is unchanged.
+    """
+    if coalescer is None:
+        return answer_chain
+    return CoalescedAnswerChain(answer_chain, coalescer, scope)
+
+def build_chain(retriever, llm, prompt, max_context_tokens: Optional[int] = None, coalescer=None, scope: Optional[str] = None):
     parallel_chain = RunnableParallel({
-        'context': retriever | RunnableLambda(format_docs),
+        'docs': retriever.with_config(callbacks=[callback_handler]),
         'question': RunnablePassthrough()
     })
-    parser = StrOutputParser()
-    return parallel_chain | prompt | llm | parser
\ No newline at end of file
+    return parallel_chain | coalesce_answers(build_answer_chain(llm, prompt, max_context_tokens), coalescer, scope)
+
+def describe_docs(retrieved_docs, preview_chars: int = 200):
+    """JSON-friendly summary of retrieved chunks, sent to clients ahead of the answer."""
+    return [
+        {
+            'rank': i,
+            'metadata': dict(doc.metadata),
+            'preview': doc.page_content[:preview_chars]
+        }
+        for i, doc in enumerate(retrieved_docs)
+    ]
+
+def embed_question(retriever, question: str):
+    """Embed a question with the model behind a vector store retriever."""
+    vector_store = retriever.vectorstore
+    embeddings = getattr(vector_store, "embeddings", None)
+    with timed("embed_query"):
+        if embeddings is not None:
+            return embeddings.embed_query(question)
+        return vector_store.embedding_function(question)
+
+def retrieve_by_vector(retriever, embedding, question: str = None):
+    """Run the retriever's search with a precomputed question embedding."""
+    with timed("retrieve"):
+        if hasattr(retriever, 'retrieve_with_embedding'):
+            return retriever.retrieve_with_embedding(question, embedding)
+        k = retriever.search_kwargs.get('k', 4)
+        return retriever.vectorstore.similarity_search_by_vector(embedding, k=k)
+
+def build_cached_chain(retriever, answer_chain, cache, cache_key: str):
+    """
+    RAG chain with a per-video answer cache in front of the LLM.
+
+    The question is embedded once; that embedding is used both for the semantic
+    cache lookup and, on a miss, for the vector search.
+    """
+    def answer(question: str) -> str:
+        embedding = embed_question(retriever, question)
+        cached = cache.lookup(cache_key, question, embedding)
+        if cached is not None:
+            return cached
+        retrieved_docs = retrieve_by_vector(retriever, embedding, question)
+        result = answer_chain.invoke({'docs': retrieved_docs, 'question': question})
+        cache.store(cache_key, question, embedding, result)
+        return result
+
+    async def aanswer(question: str) -> str:
+        embedding = await asyncio.to_thread(embed_question, retriever, question)
+        cached = cache.lookup(cache_key, question, embedding)
+        if cached is not None:
+            return cached
+        retrieved_docs = await asyncio.to_thread(retrieve_by_vector, retriever, embedding, question)
+        result = await answer_chain.ainvoke({'docs': retrieved_docs, 'question': question})
+        cache.store(cache_key, question, embedding, result)
+        return result
+
+    return RunnableLambda(answer, afunc=aanswer)
+
+async def astream_answer(retriever, answer_chain, question: str, cache=None, cache_key: str = None):
+    """
+    Retrieve context for ``question`` and stream the answer.
+
+    Yields ``("context", [...])`` once with the retrieved chunk summaries, then
+    ``("token", text)`` for each piece of generated text as it arrives. With a
+    cache, a hit yields an empty context followed by the whole cached answer.
+    """
+    embedding = None
+    if cache is not None:
+        embedding = await asyncio.to_thread(embed_question, retriever, question)
+        cached = cache.lookup(cache_key, question, embedding)
+        if cached is not None:
+            yield "context", []
+            yield "token", cached
+            return
+        retrieved_docs = await asyncio.to_thread(retrieve_by_vector, retriever, embedding, question)
+    else:
+        retrieved_docs = await retriever.ainvoke(question, config={'callbacks': [callback_handler]})
+    yield "context", describe_docs(retrieved_docs)
+
+    inputs = {'docs': retrieved_docs, 'question': question}
+    answer = []
+    async for token in answer_chain.astream(inputs):
+        if token:
+            answer.append(token)
+            yield "token", token
+
+    if cache is not None:
+        cache.store(cache_key, question, embedding, "".join(answer))
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChainHandle:
+    """A live vector store and the RAG chain built on it, for one processed video."""
+    handle: str
+    video_id: str
+    vector_store: Any
+    chain: Any
+    retriever: Any = None
+    answer_chain: Any = None
+    summarizer: Any = None
+    size_bytes: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+
+
+def estimate_vector_store_bytes(vector_store) -> int:
+    """Rough in-memory footprint of a FAISS vector store: vector codes plus stored text."""
+    index = getattr(vector_store, "index", None)
+    # Quantized indexes store code_size bytes per vector; flat/HNSW storage is float32
+    size = index.ntotal * getattr(index, "code_size", index.d * 4) if index is not None else 0
+    docstore = getattr(getattr(vector_store, "docstore", None), "_dict", {})
+    size += sum(len(doc.page_content) for doc in docstore.values())
+    return size
+
+
+class ChainRegistry:
+    """In-memory LRU of live chain handles bounded by entry count and memory."""
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 1024 ** 3):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ChainHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, handle: str):
+        return handle in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def put(self, handle: str, video_id: str, vector_store, chain,
+            retriever=None, answer_chain=None, summarizer=None) -> ChainHandle:
+        entry = ChainHandle(
+            handle=handle,
+            video_id=video_id,
+            vector_store=vector_store,
+            chain=chain,
+            retriever=retriever,
+            answer_chain=answer_chain,
+            summarizer=summarizer,
+            size_bytes=estimate_vector_store_bytes(vector_store)
+        )
+        with self._lock:
+            self._entries[handle] = entry
+            self._entries.move_to_end(handle)
+            self._evict()
+        return entry
+
+    def get(self, handle: str) -> Optional[ChainHandle]:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None:
+                entry.last_used = time.time()
+                self._entries.move_to_end(handle)
+            return entry
+
+    def remove(self, handle: str):
+        with self._lock:
+            self._entries.pop(handle, None)
+
+    def handles(self) -> List[str]:
+        return list(self._entries)
+
+    def _evict(self):
+        # Never evict the most recently added entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            handle, entry = self._entries.popitem(last=False)
+            logger.info(f"Evicting chain handle {handle} for video {entry.video_id}")
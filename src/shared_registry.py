@@ -0,0 +1,167 @@
+"""
+Cross-process registry of video indexes, shared by API worker processes through SQLite.
+
+Each row maps an index handle (see index_store.make_index_key) to its ingestion state.
+A worker claims a handle before ingesting it, reports stage changes while it works and
+marks it ready once the index is saved to the shared IndexStore directory. The other
+workers see the claim (and poll its job through any worker) instead of ingesting the
+same video again, and open the saved index memory-mapped once it is ready.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Row states; in-flight rows hold a jobs.* stage name
+READY = "ready"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexes (
+    handle TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _row_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    data = dict(row)
+    data['result'] = json.loads(data['result']) if data['result'] else {}
+    return data
+
+
+class SharedIndexRegistry:
+    """
+    SQLite-backed handle -> ingestion state table, safe to use from several processes.
+
+    An in-flight claim is abandoned (and can be taken over) when its owner process has
+    exited or it has not been updated for ``stale_seconds``.
+    """
+
+    def __init__(self, path: str, stale_seconds: float = 900.0):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS indexes_job_id ON indexes (job_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: cheap, and never shared across threads
+        conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _abandoned(self, row: sqlite3.Row) -> bool:
+        if row['state'] in (READY, FAILED):
+            return False
+        return not _pid_alive(row['owner_pid']) or time.time() - row['updated_at'] > self.stale_seconds
+
+    def claim(self, handle: str, video_id: str, job_id: str) -> Dict[str, Any]:
+        """
+        Claim ``handle`` for ingestion under ``job_id`` unless it is ready or in flight elsewhere.
+
+        Returns the row that now owns the handle: the caller should ingest only if its
+        ``job_id`` is the one passed in. Failed and abandoned claims are taken over.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM indexes WHERE handle = ?", (handle,)).fetchone()
+            if row is not None and row['state'] != FAILED and not self._abandoned(row):
+                conn.execute("COMMIT")
+                return _row_dict(row)
+            if row is not None and row['state'] != FAILED:
+                logger.warning(f"Taking over abandoned ingestion of {handle} from pid {row['owner_pid']}")
+            conn.execute(
+                "INSERT OR REPLACE INTO indexes "
+                "(handle, video_id, job_id, state, owner_pid, error, result, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, NULL, NULL, ?, ?)",
+                (handle, video_id, job_id, os.getpid(), now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(handle)
+
+    def update(self, handle: str, state: str, error: Optional[str] = None, result: Optional[Dict[str, Any]] = None):
+        """Record a stage change (or the final READY/FAILED state) for this process's claim."""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE indexes SET state = ?, error = ?, result = COALESCE(?, result), updated_at = ? "
+                "WHERE handle = ? AND owner_pid = ?",
+                (state, error, json.dumps(result) if result is not None else None, time.time(), handle, os.getpid())
+            )
+        finally:
+            conn.close()
+
+    def mark_ready(self, handle: str, result: Dict[str, Any]):
+        self.update(handle, READY, result=result)
+
+    def mark_failed(self, handle: str, error: str):
+        self.update(handle, FAILED, error=error)
+
+    def forget(self, handle: str):
+        """Drop a handle, e.g. after its index was evicted from the shared directory."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM indexes WHERE handle = ?", (handle,))
+        finally:
+            conn.close()
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return _row_dict(conn.execute("SELECT * FROM indexes WHERE handle = ?", (handle,)).fetchone())
+        finally:
+            conn.close()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return _row_dict(conn.execute("SELECT * FROM indexes WHERE job_id = ?", (job_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def latest_ready(self) -> Optional[str]:
+        """Handle of the most recently finished index, from any worker."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT handle FROM indexes WHERE state = ? ORDER BY updated_at DESC LIMIT 1", (READY,)
+            ).fetchone()
+            return row['handle'] if row else None
+        finally:
+            conn.close()
@@ -0,0 +1,84 @@
+"""
+Process startup state for the API: liveness, readiness and how long warm-up took.
+
+Importing this module starts the clock, so import it before anything heavy. The API
+serves liveness checks as soon as it is listening and reports ready once the warm-up
+(heavy imports and model loading) has finished.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Startup states
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "ytchat_startup_phase_seconds", "Duration of each startup phase.", ("phase",)
+)
+STARTUP_READY = REGISTRY.gauge(
+    "ytchat_ready", "1 once the API has finished warming up."
+)
+
+_STARTED = time.perf_counter()
+
+
+class StartupState:
+    """Phase timings and readiness of this process, as reported by /readyz and /status."""
+
+    def __init__(self):
+        self.state = STARTING
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def uptime(self) -> float:
+        return time.perf_counter() - _STARTED
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = seconds
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    def mark_listening(self):
+        """Record how long it took from importing the app to accepting connections."""
+        self.record("listen", self.uptime())
+
+    def set_state(self, state: str, error: Optional[str] = None):
+        with self._lock:
+            self.state = state
+            self.error = error
+            if state == READY:
+                self.ready_after = self.uptime()
+        STARTUP_READY.set(1.0 if state == READY else 0.0)
+        if state == READY:
+            logger.info(f"Ready after {self.ready_after:.2f}s: " + ", ".join(
+                f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items()
+            ))
+        elif state == FAILED:
+            logger.error(f"Startup failed after {self.uptime():.2f}s: {error}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'error': self.error,
+                'uptime_s': round(self.uptime(), 3),
+                'ready_after_s': round(self.ready_after, 3) if self.ready_after is not None else None,
+                'phases_s': {phase: round(seconds, 3) for phase, seconds in self.phases.items()}
+            }
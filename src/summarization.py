@@ -0,0 +1,308 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+try:
+    from .metrics import timed
+    from .retrieval import coalesce_answers, count_tokens
+except ImportError:
+    from metrics import timed
+    from retrieval import coalesce_answers, count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARIES_FILE = "summaries.json"
+
+# Only summarization phrasing about the video itself: "what was the overall cost?" or
+# "summary of the cost discussion" are targeted questions for retrieval
+_VIDEO = r"(this|the)( whole| entire)? (video|talk|episode|lecture|podcast)"
+_GLOBAL_QUESTION_RE = re.compile(
+    r"\b(summari[sz]e|sum up|recap|give (me )?(a |an )?(short |quick |brief )?(summary|overview|recap|tl;?dr))"
+    rf"( (it|{_VIDEO}))?\s*[.!?]*$"
+    rf"|\b(summary|overview|recap|tl;?dr) of {_VIDEO}\b"
+    rf"|\bwhat (is|was) {_VIDEO} about\b"
+    rf"|\b(main|key) (points|ideas|topics|takeaways)( of| in| from)? {_VIDEO}\b"
+    r"|^\s*(tl;?dr|main points|key (points|takeaways))\s*[.!?]*$",
+    re.IGNORECASE
+)
+
+
+def is_global_question(question: str) -> bool:
+    """True for questions about the video as a whole rather than a specific moment or fact."""
+    return bool(_GLOBAL_QUESTION_RE.search(question))
+
+
+def get_section_prompt():
+    return PromptTemplate(
+        template="""Summarize this section of a video transcript in a few sentences.
+        Keep names, numbers and concrete claims.
+
+        Transcript section: {text}
+        Summary: """,
+        input_variables=['text']
+    )
+
+
+def get_reduce_prompt():
+    return PromptTemplate(
+        template="""You are a helpful assistant.
+        Below are summaries of consecutive sections of a video, in order, with their start times.
+        Answer the question using ONLY these summaries.
+
+        Section summaries: {summaries}
+        Question: {question}
+        Answer: """,
+        input_variables=['summaries', 'question']
+    )
+
+
+def _timestamp(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class SummaryEngine:
+    """
+    Map-reduce summarization over every chunk of one video's index.
+
+    Map: consecutive windows of ``window_size`` chunks are summarized in parallel (at most
+    ``max_concurrency`` LLM calls at once). The section summaries are cached in memory and,
+    given ``cache_dir``, saved next to the FAISS index. Reduce: whole-video questions are
+    answered from the section summaries; if they exceed ``max_context_tokens`` they are
+    summarized again, level by level, until they fit.
+
+    Given an ``answer_cache`` (and the video's ``cache_key``) and a ``coalescer``, answers
+    are cached and identical in-flight questions share one reduce call, as on the RAG path.
+    """
+
+    def __init__(self,
+                 vector_store,
+                 llm,
+                 cache_dir: Optional[str] = None,
+                 window_size: int = 8,
+                 max_concurrency: int = 4,
+                 max_context_tokens: int = 3000,
+                 answer_cache=None,
+                 cache_key: Optional[str] = None,
+                 coalescer=None):
+        self.vector_store = vector_store
+        self.window_size = window_size
+        self.max_concurrency = max_concurrency
+        self.max_context_tokens = max_context_tokens
+        self.cache_path = os.path.join(cache_dir, SUMMARIES_FILE) if cache_dir else None
+        self.map_chain = get_section_prompt() | llm | StrOutputParser()
+        self.reduce_chain = get_reduce_prompt() | llm | StrOutputParser()
+        self._sections: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self.answer_cache = answer_cache
+        # Kept apart from the RAG answers of the same video
+        self.cache_key = f"summary:{cache_key}"
+        self.answer_chain = coalesce_answers(SummaryAnswerChain(self), coalescer, self.cache_key)
+
+    def _windows(self) -> List[Dict[str, Any]]:
+        docstore = self.vector_store.docstore
+        # A corpus index holds many videos: window each one separately, in index order
+        videos: Dict[Any, List[Any]] = {}
+        for docstore_id in self.vector_store.index_to_docstore_id.values():
+            doc = docstore.search(docstore_id)
+            videos.setdefault(doc.metadata.get('video_id'), []).append(doc)
+        windows = []
+        for video_id, docs in videos.items():
+            docs.sort(key=lambda doc: (doc.metadata.get('chunk_index', 0), doc.metadata.get('start', 0)))
+            for i in range(0, len(docs), self.window_size):
+                window = docs[i:i + self.window_size]
+                windows.append({
+                    'video_id': video_id,
+                    'start': window[0].metadata.get('start'),
+                    'end': window[-1].metadata.get('end'),
+                    'text': " ".join(doc.page_content for doc in window)
+                })
+        return windows
+
+    def _load(self) -> Optional[List[Dict[str, Any]]]:
+        if self._sections is None and self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as f:
+                self._sections = json.load(f)
+        return self._sections
+
+    def _store(self, sections: List[Dict[str, Any]]):
+        self._sections = sections
+        directory = os.path.dirname(self.cache_path) if self.cache_path else None
+        if directory and os.path.isdir(directory):
+            # Write-then-rename so a crash or another worker never sees a partial file
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{SUMMARIES_FILE}-", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(sections, f)
+                os.replace(tmp_path, self.cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def sections(self) -> List[Dict[str, Any]]:
+        """Section summaries, computing and caching them on first use."""
+        with self._lock:
+            if self._load() is None:
+                windows = self._windows()
+                logger.info(f"Summarizing {len(windows)} sections")
+                with timed("summarize_sections"):
+                    summaries = self.map_chain.batch(
+                        [{'text': window['text']} for window in windows],
+                        config={'max_concurrency': self.max_concurrency}
+                    )
+                self._store([
+                    {'video_id': window['video_id'], 'start': window['start'], 'end': window['end'], 'summary': summary}
+                    for window, summary in zip(windows, summaries)
+                ])
+            return self._sections
+
+    async def asections(self) -> List[Dict[str, Any]]:
+        if self._load() is not None:
+            return self._sections
+        # Every caller, sync or async, goes through the one lock in sections(), so
+        # concurrent first questions wait for a single map step instead of each running it
+        return await asyncio.to_thread(self.sections)
+
+    def _format(self, sections: List[Dict[str, Any]]) -> str:
+        # Label sections with their video only when they come from more than one
+        several = len({section.get('video_id') for section in sections}) > 1
+        return "\n\n".join(
+            f"[{section['video_id']} {_timestamp(section['start'])}] {section['summary']}" if several and section.get('video_id')
+            else f"[{_timestamp(section['start'])}] {section['summary']}"
+            for section in sections
+        )
+
+    def _groups(self, sections: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        groups, current, used = [], [], 0
+        for section in sections:
+            tokens = count_tokens(section['summary'])
+            if current and used + tokens > self.max_context_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(section)
+            used += tokens
+        return groups + ([current] if current else [])
+
+    def _merge(self, group: List[Dict[str, Any]], summary: str) -> Dict[str, Any]:
+        video_ids = {section.get('video_id') for section in group}
+        return {
+            'video_id': video_ids.pop() if len(video_ids) == 1 else None,
+            'start': group[0]['start'],
+            'end': group[-1]['end'],
+            'summary': summary
+        }
+
+    def _reduce_inputs(self, sections: List[Dict[str, Any]], question: str) -> Dict[str, str]:
+        while len(sections) > 1 and count_tokens(self._format(sections)) > self.max_context_tokens:
+            groups = self._groups(sections)
+            if len(groups) == len(sections):
+                break
+            summaries = self.map_chain.batch(
+                [{'text': self._format(group)} for group in groups],
+                config={'max_concurrency': self.max_concurrency}
+            )
+            sections = [self._merge(group, summary) for group, summary in zip(groups, summaries)]
+        return {'summaries': self._format(sections), 'question': question}
+
+    async def _areduce_inputs(self, sections: List[Dict[str, Any]], question: str) -> Dict[str, str]:
+        while len(sections) > 1 and count_tokens(self._format(sections)) > self.max_context_tokens:
+            groups = self._groups(sections)
+            if len(groups) == len(sections):
+                break
+            summaries = await self.map_chain.abatch(
+                [{'text': self._format(group)} for group in groups],
+                config={'max_concurrency': self.max_concurrency}
+            )
+            sections = [self._merge(group, summary) for group, summary in zip(groups, summaries)]
+        return {'summaries': self._format(sections), 'question': question}
+
+    def _cached(self, question: str) -> Optional[str]:
+        return self.answer_cache.lookup(self.cache_key, question) if self.answer_cache is not None else None
+
+    def _remember(self, question: str, answer: str):
+        if self.answer_cache is not None:
+            self.answer_cache.store(self.cache_key, question, None, answer)
+
+    def answer(self, question: str) -> str:
+        cached = self._cached(question)
+        if cached is not None:
+            return cached
+        result = self.answer_chain.invoke({'docs': [], 'question': question})
+        self._remember(question, result)
+        return result
+
+    async def aanswer(self, question: str) -> str:
+        cached = self._cached(question)
+        if cached is not None:
+            return cached
+        result = await self.answer_chain.ainvoke({'docs': [], 'question': question})
+        self._remember(question, result)
+        return result
+
+    async def astream_answer(self, question: str):
+        """Yield ``("context", sections)`` then ``("token", text)`` pieces, like retrieval.astream_answer."""
+        cached = self._cached(question)
+        if cached is not None:
+            yield "context", []
+            yield "token", cached
+            return
+        sections = await self.asections()
+        yield "context", [
+            {'rank': i, 'metadata': {'start': section['start'], 'end': section['end']}, 'preview': section['summary'][:200]}
+            for i, section in enumerate(sections)
+        ]
+        answer = []
+        async for token in self.answer_chain.astream({'docs': [], 'question': question}):
+            if token:
+                answer.append(token)
+                yield "token", token
+        self._remember(question, "".join(answer))
+
+
+class SummaryAnswerChain(Runnable):
+    """The reduce step of a SummaryEngine as an answer chain: {question} -> answer text."""
+
+    def __init__(self, engine: SummaryEngine):
+        self.engine = engine
+
+    def invoke(self, input, config=None, **kwargs):
+        engine = self.engine
+        return engine.reduce_chain.invoke(engine._reduce_inputs(engine.sections(), input['question']), config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        engine = self.engine
+        inputs = await engine._areduce_inputs(await engine.asections(), input['question'])
+        return await engine.reduce_chain.ainvoke(inputs, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        engine = self.engine
+        inputs = await engine._areduce_inputs(await engine.asections(), input['question'])
+        async for token in engine.reduce_chain.astream(inputs, config, **kwargs):
+            yield token
+
+
+def build_routed_chain(rag_chain, summary_engine: SummaryEngine):
+    """Send whole-video questions to the summary engine and everything else to the RAG chain."""
+    def route(question: str) -> str:
+        if is_global_question(question):
+            return summary_engine.answer(question)
+        return rag_chain.invoke(question)
+
+    async def aroute(question: str) -> str:
+        if is_global_question(question):
+            return await summary_engine.aanswer(question)
+        return await rag_chain.ainvoke(question)
+
+    return RunnableLambda(route, afunc=aroute)
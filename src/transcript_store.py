@@ -0,0 +1,175 @@
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled
+from youtube_transcript_api._transcripts import FetchedTranscript, FetchedTranscriptSnippet
+
+logger = logging.getLogger(__name__)
+
+
+def make_http_session(pool_size: int = 10, adapter: Optional[HTTPAdapter] = None) -> requests.Session:
+    """
+    requests.Session with a connection pool sized for concurrent transcript fetches.
+
+    Pass ``adapter`` to route all traffic through a custom transport (e.g. a local stub).
+    """
+    session = requests.Session()
+    adapter = adapter or HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _caused_by(error: BaseException, exc_type) -> bool:
+    """True if ``error`` or anything in its cause/context chain is an ``exc_type``."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, exc_type):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TranscriptStore:
+    """
+    Caching front end to YouTubeTranscriptApi.
+
+    - one pooled HTTP session shared by every request made through ``api``
+    - raw snippets cached on disk as gzipped JSON, keyed by video ID and languages;
+      entries expire after ``ttl_seconds`` (a plain TTL: an expired entry is downloaded
+      again in full, without an ETag or If-Modified-Since check)
+    - transcript listings cached on disk for ``listing_ttl_seconds``
+    - videos with transcripts disabled remembered for ``negative_ttl_seconds``
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 http_client: Optional[requests.Session] = None,
+                 ttl_seconds: float = 7 * 24 * 3600,
+                 listing_ttl_seconds: float = 24 * 3600,
+                 negative_ttl_seconds: float = 24 * 3600,
+                 pool_size: int = 10):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.listing_ttl_seconds = listing_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.api = YouTubeTranscriptApi(http_client=http_client or make_http_session(pool_size))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, video_id: str, kind: str) -> str:
+        kind = re.sub(r"[^\w.-]+", "_", kind)
+        return os.path.join(self.cache_dir, f"{video_id}.{kind}.json.gz")
+
+    def _read(self, path: str, ttl: float) -> Optional[Dict[str, Any]]:
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def get_or_fetch(self,
+                     video_id: str,
+                     languages: Iterable[str],
+                     download: Callable[[], FetchedTranscript]) -> FetchedTranscript:
+        """
+        Return cached snippets for (video_id, languages), calling ``download()`` on a miss.
+
+        Raises ValueError without any network I/O if the video is known to have
+        transcripts disabled.
+        """
+        disabled_path = self._path(video_id, "disabled")
+        if self._read(disabled_path, self.negative_ttl_seconds) is not None:
+            raise ValueError(f"Transcripts are disabled for video ID {video_id}")
+
+        path = self._path(video_id, "snippets-" + "-".join(languages))
+        cached = self._read(path, self.ttl_seconds)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return FetchedTranscript(
+                snippets=[FetchedTranscriptSnippet(text, start, duration) for text, start, duration in cached['snippets']],
+                video_id=video_id,
+                language=cached['language'],
+                language_code=cached['language_code'],
+                is_generated=cached['is_generated']
+            )
+
+        with self._lock:
+            self.misses += 1
+        try:
+            fetched = download()
+        except Exception as e:
+            if _caused_by(e, TranscriptsDisabled):
+                self._write(disabled_path, {'video_id': video_id, 'at': time.time()})
+            raise
+
+        self._write(path, {
+            'language': fetched.language,
+            'language_code': fetched.language_code,
+            'is_generated': fetched.is_generated,
+            'snippets': [[snippet.text, snippet.start, snippet.duration] for snippet in fetched]
+        })
+        return fetched
+
+    def list_transcripts(self, video_id: str) -> List[Dict[str, Any]]:
+        """Describe the transcripts available for a video, using the cached listing when fresh."""
+        path = self._path(video_id, "listing")
+        cached = self._read(path, self.listing_ttl_seconds)
+        if cached is not None:
+            return cached['transcripts']
+
+        transcripts = [
+            {
+                'language': transcript.language,
+                'language_code': transcript.language_code,
+                'is_generated': transcript.is_generated,
+                'is_translatable': transcript.is_translatable
+            }
+            for transcript in self.api.list(video_id)
+        ]
+        self._write(path, {'transcripts': transcripts})
+        return transcripts
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+# Process-wide store used by data_ingestion when configured
+_store: Optional[TranscriptStore] = None
+
+
+def configure_transcript_store(cache_dir: Optional[str], **kwargs) -> Optional[TranscriptStore]:
+    """Enable (or, with ``cache_dir=None``, disable) the shared transcript store."""
+    global _store
+    _store = TranscriptStore(cache_dir, **kwargs) if cache_dir else None
+    return _store
+
+
+def get_transcript_store() -> Optional[TranscriptStore]:
+    return _store
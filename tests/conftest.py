@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Import the app as ``src.<module>``, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def embeddings():
+    """Deterministic stand-in for the sentence-transformers model: same text, same vector."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return DeterministicFakeEmbedding(size=32)
@@ -0,0 +1,60 @@
+from src import answer_cache
+from src.answer_cache import AnswerCache, normalize_question
+
+
+def test_normalize_question_ignores_case_punctuation_and_spacing():
+    assert normalize_question("  What is   FUSION?! ") == "what is fusion"
+
+
+def test_lookup_hits_on_rephrased_punctuation():
+    cache = AnswerCache()
+    cache.store("video", "What is fusion?", None, "Joining nuclei")
+
+    assert cache.lookup("video", "what is fusion") == "Joining nuclei"
+    assert cache.lookup("other-video", "What is fusion?") is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'videos': 1}
+
+
+def test_lookup_hits_on_a_similar_embedding(embeddings):
+    cache = AnswerCache(similarity_threshold=0.95)
+    vector = embeddings.embed_query("What is fusion?")
+    cache.store("video", "What is fusion?", vector, "Joining nuclei")
+
+    nearby = [x * 2 + 1e-4 for x in vector]
+    assert cache.lookup("video", "Explain fusion", nearby) == "Joining nuclei"
+    unrelated = embeddings.embed_query("Who hosts the show?")
+    assert cache.lookup("video", "Who hosts the show?", unrelated) is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=60)
+    cache.store("video", "What is fusion?", None, "Joining nuclei")
+
+    now[0] += 59
+    assert cache.lookup("video", "What is fusion?") == "Joining nuclei"
+    now[0] += 2
+    assert cache.lookup("video", "What is fusion?") is None
+
+
+def test_least_recently_used_answer_is_dropped():
+    cache = AnswerCache(max_entries=2)
+    cache.store("video", "first", None, "1")
+    cache.store("video", "second", None, "2")
+    cache.lookup("video", "first")
+    cache.store("video", "third", None, "3")
+
+    assert cache.lookup("video", "first") == "1"
+    assert cache.lookup("video", "second") is None
+    assert cache.lookup("video", "third") == "3"
+
+
+def test_invalidate_drops_a_videos_answers():
+    cache = AnswerCache()
+    cache.store("video", "What is fusion?", None, "Joining nuclei")
+    cache.store("other-video", "What is fusion?", None, "Something else")
+    cache.invalidate("video")
+
+    assert cache.lookup("video", "What is fusion?") is None
+    assert cache.lookup("other-video", "What is fusion?") == "Something else"
@@ -0,0 +1,61 @@
+import pytest
+from langchain_core.documents import Document
+
+# retrieval imports the Gemini client at module level
+pytest.importorskip("langchain_google_genai")
+
+from src.retrieval import count_tokens, format_docs, merge_overlap, pack_docs
+
+
+def chunk(text, index, video_id="fusion00001"):
+    return Document(page_content=text, metadata={'video_id': video_id, 'chunk_index': index})
+
+
+def test_chunks_are_taken_in_rank_order_until_the_budget():
+    docs = [chunk("best match about the reactor", 7), chunk("second match on plasma", 2), chunk("third match on magnets", 4)]
+    budget = count_tokens(docs[0].page_content) + count_tokens(docs[1].page_content)
+
+    assert pack_docs(docs, budget) == ["second match on plasma", "best match about the reactor"]
+    assert len(pack_docs(docs)) == 3
+
+
+def test_best_chunk_over_budget_is_truncated():
+    doc = chunk("word " * 400, 0)
+
+    [passage] = pack_docs([doc, chunk("runner up", 1)], max_tokens=20)
+
+    assert 0 < count_tokens(passage) <= 20
+    assert doc.page_content.startswith(passage)
+    assert doc.page_content == "word " * 400
+
+
+def test_duplicates_are_sent_once():
+    docs = [chunk("the same sentence", 1), chunk("the same sentence", 1), chunk("another sentence", 5)]
+
+    assert pack_docs(docs) == ["the same sentence", "another sentence"]
+
+
+def test_adjacent_and_overlapping_chunks_are_merged_per_video():
+    overlap = "the tokamak confines plasma with strong magnetic fields"
+    docs = [
+        chunk(f"{overlap} while heating it", 3),
+        chunk("it began with a question about energy", 1),
+        chunk("solar panel chunk", 2, video_id="solar000001"),
+        chunk(f"and where fusion fits, so {overlap}", 2),
+        chunk("much later the panel takes questions", 9),
+    ]
+
+    assert pack_docs(docs) == [
+        f"it began with a question about energy and where fusion fits, so {overlap} while heating it",
+        "much later the panel takes questions",
+        "solar panel chunk",
+    ]
+    assert format_docs(docs[2:4]) == f"and where fusion fits, so {overlap}\n\nsolar panel chunk"
+
+
+def test_merge_overlap_joins_repeated_text_only():
+    left = "the talk opens with the history of fusion research and its promise"
+    right = "the history of fusion research and its promise, then moves on"
+
+    assert merge_overlap(left, right) == "the talk opens with " + right
+    assert merge_overlap(left, "an unrelated sentence about solar power") is None
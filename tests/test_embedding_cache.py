@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from src.embedding_cache import DIGEST_SIZE, KEYS_FILE, VECTORS_FILE, CachedEmbeddings, EmbeddingCache, text_digest
+
+
+class CountingEmbeddings:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def test_cached_texts_are_not_embedded_again(tmp_path, embeddings):
+    model = CountingEmbeddings(embeddings)
+    cached = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "model"))
+
+    first = cached.embed_documents(["fusion", "solar", "fusion"])
+    second = cached.embed_documents(["solar", "wind"])
+
+    assert model.embedded == ["fusion", "solar", "wind"]
+    assert first[0] == first[2]
+    assert np.allclose(second[0], first[1])
+    assert np.allclose(second[0], embeddings.embed_documents(["solar"])[0])
+    assert cached.cache.stats() == {'vectors': 3, 'hits': 1, 'misses': 4, 'hit_rate': 0.2}
+
+
+def test_cache_persists_across_instances(tmp_path, embeddings):
+    CachedEmbeddings(embeddings, EmbeddingCache(str(tmp_path), "org/model")).embed_documents(["fusion", "solar"])
+
+    model = CountingEmbeddings(embeddings)
+    reopened = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "org/model"))
+
+    assert len(reopened.cache) == 2
+    assert np.allclose(reopened.embed_documents(["solar"])[0], embeddings.embed_documents(["solar"])[0])
+    assert model.embedded == []
+
+
+def test_float16_cache_keeps_its_dtype_on_reopen(tmp_path, embeddings):
+    EmbeddingCache(str(tmp_path), "model", dtype="float16").put_many(
+        [text_digest("fusion")], embeddings.embed_documents(["fusion"])
+    )
+
+    reopened = EmbeddingCache(str(tmp_path), "model")
+
+    assert reopened.dtype == np.float16
+    [vector] = reopened.get_many([text_digest("fusion")])
+    assert np.allclose(vector, embeddings.embed_documents(["fusion"])[0], atol=1e-2)
+
+
+def test_instances_sharing_a_directory_see_each_others_rows(tmp_path, embeddings):
+    writer = EmbeddingCache(str(tmp_path), "model")
+    reader = EmbeddingCache(str(tmp_path), "model")
+    writer.put_many([text_digest("fusion")], embeddings.embed_documents(["fusion"]))
+
+    # The reader picks up rows appended after it opened the cache
+    assert reader.get_many([text_digest("fusion")])[0] is not None
+
+    reader.put_many([text_digest("solar")], embeddings.embed_documents(["solar"]))
+    writer.put_many([text_digest("wind")], embeddings.embed_documents(["wind"]))
+
+    reopened = EmbeddingCache(str(tmp_path), "model")
+    assert len(reopened) == 3
+    for text in ("fusion", "solar", "wind"):
+        [vector] = reopened.get_many([text_digest(text)])
+        assert np.allclose(vector, embeddings.embed_documents([text])[0])
+
+
+def test_torn_append_is_ignored_and_overwritten(tmp_path, embeddings):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put_many([text_digest("fusion")], embeddings.embed_documents(["fusion"]))
+    # A crash after writing a vector but before its key
+    with open(os.path.join(cache.path, VECTORS_FILE), "ab") as f:
+        f.write(b"\0" * 40)
+
+    reopened = EmbeddingCache(str(tmp_path), "model")
+    assert len(reopened) == 1
+    reopened.put_many([text_digest("solar")], embeddings.embed_documents(["solar"]))
+
+    assert os.path.getsize(os.path.join(cache.path, KEYS_FILE)) == 2 * DIGEST_SIZE
+    assert os.path.getsize(os.path.join(cache.path, VECTORS_FILE)) == 2 * 32 * 4
+    [vector] = EmbeddingCache(str(tmp_path), "model").get_many([text_digest("solar")])
+    assert np.allclose(vector, embeddings.embed_documents(["solar"])[0])
+
+
+def _embed_in_process(root, worker):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    cached = CachedEmbeddings(DeterministicFakeEmbedding(size=32), EmbeddingCache(root, "model"))
+    for i in range(10):
+        cached.embed_documents([f"shared {i}", f"worker {worker} text {i}"])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_processes_append_to_one_cache_without_corrupting_it(tmp_path, embeddings):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_embed_in_process, args=(str(tmp_path), worker)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), "model")
+    texts = [f"shared {i}" for i in range(10)] + [f"worker {w} text {i}" for w in range(3) for i in range(10)]
+    assert len(cache) == len(texts)
+    for text, vector in zip(texts, cache.get_many([text_digest(text) for text in texts])):
+        assert np.allclose(vector, embeddings.embed_documents([text])[0])
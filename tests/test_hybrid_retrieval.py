@@ -0,0 +1,74 @@
+import os
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from src.hybrid_retrieval import (
+    BM25_FILE, BM25Index, HybridRetriever, load_or_build_bm25, reciprocal_rank_fusion, save_bm25
+)
+from src.index_store import IndexStore
+
+
+def vector_store_without_ids(embeddings, texts):
+    """A FAISS store whose documents have no Document.id, like indexes saved by older versions."""
+    index = faiss.IndexFlatL2(32)
+    index.add(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+    docstore = InMemoryDocstore({f"doc-{i}": Document(page_content=text) for i, text in enumerate(texts)})
+    return FAISS(embeddings, index, docstore, {i: f"doc-{i}" for i in range(len(texts))})
+
+
+def test_rankings_fuse_on_docstore_ids(embeddings):
+    texts = [f"fusion reactor talk part {i}" for i in range(5)] + [f"solar panel talk part {i}" for i in range(5)]
+    vector_store = vector_store_without_ids(embeddings, texts)
+    retriever = HybridRetriever(
+        vectorstore=vector_store, bm25=BM25Index.from_vector_store(vector_store), search_kwargs={'k': 8}, fetch_k=10
+    )
+
+    docs = retriever.invoke("fusion reactor talk part 3")
+
+    assert len(docs) == 8
+    assert len({doc.page_content for doc in docs}) == len(docs)
+    # Exact text match: first in the dense ranking and the BM25 ranking
+    assert docs[0].page_content == "fusion reactor talk part 3"
+
+
+def test_retrieve_with_embedding_matches_invoke(embeddings):
+    texts = [f"chunk about topic {i}" for i in range(6)]
+    vector_store = vector_store_without_ids(embeddings, texts)
+    retriever = HybridRetriever(vectorstore=vector_store, bm25=BM25Index.from_vector_store(vector_store), fetch_k=6)
+    query = "topic 2"
+
+    assert retriever.retrieve_with_embedding(query, embeddings.embed_query(query)) == retriever.invoke(query)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]], rrf_k=60)
+
+    assert [item for item, _ in fused] == ["b", "a", "c"]
+
+
+def test_bm25_sidecar_is_saved_with_the_index(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    vector_store = vector_store_without_ids(embeddings, [f"chunk about topic {i}" for i in range(6)])
+
+    store.save("video", vector_store, sidecars=[save_bm25])
+
+    path = os.path.join(store.entry_path("video"), BM25_FILE)
+    assert os.path.exists(path)
+    loaded, _ = store.load("video", embeddings)
+    bm25 = load_or_build_bm25(loaded, store.entry_path("video"))
+    assert bm25.docstore_ids == BM25Index.load(path).docstore_ids
+    assert bm25.search("topic 4", 1)[0][0] == "doc-4"
+
+
+def test_bm25_save_replaces_the_file_atomically(tmp_path):
+    path = str(tmp_path / BM25_FILE)
+    BM25Index.build(["old text"], ["old"]).save(path)
+
+    BM25Index.build(["new text", "more text"], ["a", "b"]).save(path)
+
+    assert os.listdir(tmp_path) == [BM25_FILE]
+    assert BM25Index.load(path).docstore_ids == ["a", "b"]
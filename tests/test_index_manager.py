@@ -0,0 +1,113 @@
+from langchain_core.documents import Document
+
+from src.hybrid_retrieval import HybridRetriever, load_or_build_bm25
+from src.index_manager import IndexManager, sync_corpus
+from src.index_store import IndexStore
+
+
+def talk(video_id, topic, parts=4):
+    return [Document(page_content=f"{topic} talk part {i}", metadata={'video_id': video_id, 'chunk_index': i})
+            for i in range(parts)]
+
+
+class CountingEmbeddings:
+    """Records every text sent to the wrapped embeddings model."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def search_videos(manager, query, k=8):
+    return {doc.metadata['video_id'] for doc in manager.vector_store.similarity_search(query, k=k)}
+
+
+def test_corpus_handle_hybrid_retrieval_has_no_duplicates(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    sync_corpus(store, "corpus", embeddings, talk("fusion00001", "fusion reactor") + talk("solar000001", "solar panel"))
+    vector_store, _ = store.load("corpus", embeddings)
+    retriever = HybridRetriever(
+        vectorstore=vector_store,
+        bm25=load_or_build_bm25(vector_store, store.entry_path("corpus")),
+        search_kwargs={'k': 6},
+        fetch_k=8
+    )
+
+    docs = retriever.invoke("fusion reactor talk part 3")
+
+    assert len(docs) == 6
+    assert all(doc.id for doc in docs)
+    assert len({doc.id for doc in docs}) == len(docs)
+    assert len({doc.page_content for doc in docs}) == len(docs)
+
+
+def test_upsert_embeds_only_revised_text(embeddings):
+    counting = CountingEmbeddings(embeddings)
+    manager = IndexManager(counting)
+    assert manager.upsert("fusion00001", talk("fusion00001", "fusion reactor")) == \
+        {'added': 4, 'removed': 0, 'unchanged': 0}
+
+    revised = talk("fusion00001", "fusion reactor", parts=3) + talk("fusion00001", "tokamak", parts=1)
+    counting.embedded.clear()
+    counts = manager.upsert("fusion00001", revised)
+
+    assert counts == {'added': 1, 'removed': 1, 'unchanged': 3}
+    assert counting.embedded == ["tokamak talk part 0"]
+    assert len(manager) == 4
+
+
+def test_same_text_in_another_video_reuses_its_vector(embeddings):
+    counting = CountingEmbeddings(embeddings)
+    manager = IndexManager(counting)
+    manager.add("fusion00001", talk("fusion00001", "fusion reactor"))
+    counting.embedded.clear()
+
+    # A reupload with the same transcript
+    assert manager.add("fusion00002", talk("fusion00002", "fusion reactor")) == 4
+
+    assert counting.embedded == []
+    assert manager.video_ids() == ["fusion00001", "fusion00002"]
+
+
+def test_delete_hides_chunks_until_compaction(embeddings):
+    # Never compact in the background, so the soft-deleted state can be observed
+    manager = IndexManager(embeddings, compact_ratio=2.0)
+    manager.add("fusion00001", talk("fusion00001", "fusion reactor"))
+    manager.add("solar000001", talk("solar000001", "solar panel"))
+
+    assert manager.delete("fusion00001") == 4
+
+    assert len(manager) == 4
+    assert manager.vector_store.index.ntotal == 8
+    assert search_videos(manager, "fusion reactor talk part 0") == {"solar000001"}
+    assert len(manager.vector_store.similarity_search("fusion reactor", k=4)) == 4
+
+    manager.compact()
+
+    assert manager.vector_store.index.ntotal == 4
+    assert manager.deleted_chunk_ids == set()
+    assert len(manager.vector_store.docstore._dict) == 4
+    assert set(manager.hash_to_vector.values()) == set(manager.chunk_to_vector.values())
+    assert search_videos(manager, "fusion reactor talk part 0") == {"solar000001"}
+
+
+def test_sync_corpus_removes_videos_not_kept(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    sync_corpus(store, "corpus", embeddings, talk("fusion00001", "fusion reactor") + talk("solar000001", "solar panel"))
+
+    manager, summary = sync_corpus(
+        store, "corpus", embeddings, talk("wind0000001", "wind turbine"), keep_video_ids=["solar000001", "wind0000001"]
+    )
+
+    assert summary['removed'] == {"fusion00001": 4}
+    assert summary['video_ids'] == ["solar000001", "wind0000001"]
+    reloaded = IndexManager.load(store, "corpus", embeddings)
+    assert reloaded.video_ids() == manager.video_ids()
+    assert reloaded.vector_store.index.ntotal == 8
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+from langchain_community.vectorstores import FAISS
+
+from src.index_store import IndexStore, load_or_build_vector_store
+
+
+def vector_store(embeddings, texts):
+    return FAISS.from_texts(texts, embeddings)
+
+
+def _save_repeatedly(root, worker, rounds):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=32)
+    store = IndexStore(root)
+    for i in range(rounds):
+        store.save("video", vector_store(embeddings, [f"worker {worker} round {i} chunk {j}" for j in range(20)]),
+                   {'worker': worker})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_concurrent_saves_from_several_processes_never_expose_a_partial_entry(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    store.save("video", vector_store(embeddings, ["first"]))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_save_repeatedly, args=(str(tmp_path), worker, 10)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+
+    loads = 0
+    while any(worker.is_alive() for worker in workers):
+        hit = store.load("video", embeddings)
+        assert hit is not None
+        loads += 1
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    vectors, metadata = store.load("video", embeddings)
+    assert vectors.index.ntotal == 20 and metadata['worker'] in (0, 1, 2)
+    # Only the entry and its lock file are left behind
+    assert sorted(os.listdir(tmp_path)) == [".video.lock", "video"]
+    assert loads > 0
+
+
+def test_save_inside_the_key_lock_does_not_deadlock(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+
+    with store.lock("video"):
+        store.save("video", vector_store(embeddings, ["chunk"]))
+
+    assert store.contains("video")
+
+
+def test_least_recently_used_entries_are_evicted_over_budget(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    for key in ("a", "b", "c"):
+        store.save(key, vector_store(embeddings, [f"{key} chunk {i}" for i in range(10)]))
+    entry_size = max(size for _, _, size in store.entries())
+    # Loading refreshes an entry's access time
+    past = time.time() - 60
+    for age, key in enumerate(("a", "b", "c")):
+        os.utime(os.path.join(tmp_path, key), (past + age, past + age))
+    store.load("a", embeddings)
+
+    store.max_bytes = 2 * entry_size
+    store.evict()
+
+    assert sorted(key for key, _, _ in store.entries()) == ["a", "c"]
+
+
+def test_loaded_entry_is_searchable_and_metadata_round_trips(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    built = []
+
+    def build():
+        built.append(1)
+        return vector_store(embeddings, ["fusion reactor", "solar panel"]), {'chunks': 2}
+
+    first, meta = load_or_build_vector_store(store, "video", embeddings, build)
+    second, cached_meta = load_or_build_vector_store(store, "video", embeddings, build)
+
+    assert len(built) == 1
+    assert (meta['cached'], cached_meta['cached'], cached_meta['chunks']) == (False, True, 2)
+    for vectors in (first, second):
+        assert vectors.similarity_search("fusion reactor", k=1)[0].page_content == "fusion reactor"
+
+
+def test_unreadable_entry_is_discarded(tmp_path, embeddings):
+    store = IndexStore(str(tmp_path))
+    store.save("video", vector_store(embeddings, ["chunk"]))
+    with open(os.path.join(tmp_path, "video", "index.faiss"), "wb") as f:
+        f.write(b"not an index")
+
+    assert store.load("video", embeddings) is None
+    assert not store.contains("video")
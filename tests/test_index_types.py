@@ -0,0 +1,76 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from src.embeddings import build_faiss_index, create_vector_store, describe_index, set_search_params
+from src.index_store import make_index_key
+
+
+def random_vectors(n, dimension=32):
+    return np.random.default_rng(0).standard_normal((n, dimension)).astype(np.float32)
+
+
+@pytest.mark.parametrize("config, index_class", [
+    (None, "IndexFlat"),
+    ({'type': "hnsw", 'hnsw_m': 8}, "IndexHNSWFlat"),
+    ({'type': "sq"}, "IndexScalarQuantizer"),
+    ({'type': "ivfpq", 'ivf_nlist': 4, 'pq_m': 8, 'pq_bits': 4}, "IndexIVFPQ"),
+])
+def test_build_faiss_index_types(config, index_class):
+    vectors = random_vectors(300)
+
+    index = build_faiss_index(vectors, config)
+    index.add(vectors)
+
+    assert describe_index(index)['class'] == index_class
+    assert describe_index(index)['ntotal'] == 300
+    _, ids = index.search(vectors[:5], 1)
+    # Even quantized indexes find most of their own vectors
+    assert (ids[:, 0] == np.arange(5)).sum() >= 4
+
+
+def test_ivfpq_with_too_few_vectors_falls_back_to_flat():
+    index = build_faiss_index(random_vectors(20), {'type': "ivfpq", 'pq_m': 8})
+
+    assert describe_index(index)['class'] == "IndexFlat"
+
+
+def test_unknown_index_type_is_rejected():
+    with pytest.raises(ValueError):
+        build_faiss_index(random_vectors(10), {'type': "lsh"})
+
+
+def test_set_search_params_tunes_ivf_and_hnsw():
+    vectors = random_vectors(300)
+    ivf = build_faiss_index(vectors, {'type': "ivfpq", 'ivf_nlist': 4, 'pq_m': 8, 'pq_bits': 4, 'ivf_nprobe': 2})
+    hnsw = build_faiss_index(vectors, {'type': "hnsw", 'hnsw_m': 8})
+
+    assert describe_index(ivf)['nprobe'] == 2
+    set_search_params(ivf, nprobe=64)
+    set_search_params(faiss.IndexIDMap2(hnsw), ef_search=48)
+
+    # nprobe is capped at the number of lists
+    assert describe_index(ivf)['nprobe'] == 4
+    assert describe_index(hnsw)['ef_search'] == 48
+
+
+def test_vector_store_with_a_quantized_index_keeps_metadata(embeddings):
+    chunks = [Document(page_content=f"chunk {i}", metadata={'chunk_index': i}) for i in range(10)]
+
+    vector_store = create_vector_store(chunks, embeddings, {'type': "sq"})
+
+    assert describe_index(vector_store.index)['class'] == "IndexScalarQuantizer"
+    [doc] = vector_store.similarity_search("chunk 3", k=1)
+    assert doc.metadata == {'chunk_index': 3}
+
+
+def test_index_key_depends_only_on_build_params():
+    def key(index_config):
+        return make_index_key("video", 1000, 200, "model", index_config)
+
+    assert key(None) == key({'type': "flat", 'ivf_nprobe': 8})
+    assert key({'type': "hnsw"}) == key({'type': "hnsw", 'hnsw_m': 32, 'hnsw_ef_search': 128})
+    assert key({'type': "ivfpq", 'ivf_nprobe': 4}) == key({'type': "ivfpq", 'ivf_nprobe': 32})
+    assert key({'type': "hnsw"}) != key({'type': "hnsw", 'hnsw_m': 16})
+    assert key({'type': "hnsw"}) != key(None)
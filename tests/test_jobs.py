@@ -0,0 +1,183 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import jobs
+from src.jobs import JobQueue
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished:
+        assert time.monotonic() < deadline, f"job stuck in {job.stage}"
+        time.sleep(0.005)
+    return job
+
+
+@pytest.fixture
+def queue():
+    executor = ThreadPoolExecutor(1, thread_name_prefix="ingest")
+    prefetch_executor = ThreadPoolExecutor(1, thread_name_prefix="prefetch")
+    yield JobQueue(executor, prefetch_executor=prefetch_executor)
+    executor.shutdown(wait=True)
+    prefetch_executor.shutdown(wait=True)
+
+
+def test_promoted_prefetch_runs_on_the_ingest_pool(queue):
+    gate = threading.Event()
+    busy = queue.submit("a", "a", lambda on_stage: gate.wait(5) and {}, prefetch=True)
+    threads = []
+
+    def ingest(on_stage):
+        threads.append(threading.current_thread().name)
+        return {'video': "b"}
+
+    queued = queue.submit("b", "b", ingest, prefetch=True)
+    # A user asks for the video still queued behind another prefetch
+    joined = queue.submit("b", "b", ingest)
+
+    assert joined is queued and not joined.prefetch
+    wait_for(joined)
+    assert joined.stage == jobs.DONE and joined.result == {'video': "b"}
+    assert threads[0].startswith("ingest")
+    assert not busy.finished
+
+    gate.set()
+    wait_for(busy)
+    queue.prefetch_executor.submit(lambda: None).result()
+    # The prefetch thread reaching the promoted job later does not run it again
+    assert len(threads) == 1
+
+
+def test_join_promotes_only_in_flight_jobs(queue):
+    gate = threading.Event()
+    job = queue.submit("a", "a", lambda on_stage: gate.wait(5) and {}, prefetch=True)
+
+    assert queue.join("a", "a") is job
+    assert not job.prefetch
+    assert queue.join("missing", "missing") is None
+    gate.set()
+    wait_for(job)
+
+
+def test_job_reports_stages_and_result(queue):
+    gate = threading.Event()
+
+    def ingest(on_stage):
+        on_stage(jobs.EMBEDDING)
+        gate.wait(5)
+        return {'handle': "h"}
+
+    job = queue.submit("key", "video", ingest)
+    deadline = time.monotonic() + 5
+    while job.stage != jobs.EMBEDDING:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    assert job.to_dict()['progress'] == 0.6
+    gate.set()
+    wait_for(job)
+
+    assert job.stage == jobs.DONE and job.progress == 1.0
+    assert job.to_dict()['result'] == {'handle': "h"}
+    assert queue.get(job.job_id) is job
+
+
+def test_identical_in_flight_submissions_share_one_job(queue):
+    gate = threading.Event()
+    runs = []
+
+    def ingest(on_stage):
+        runs.append(1)
+        gate.wait(5)
+        return {}
+
+    first = queue.submit("key", "video", ingest)
+    second = queue.submit("key", "video", ingest)
+    gate.set()
+    wait_for(first)
+    third = wait_for(queue.submit("key", "video", ingest))
+
+    assert second is first
+    # Finished jobs are not joined: the next submission starts a new one
+    assert third is not first
+    assert len(runs) == 2
+
+
+def test_failed_job_records_the_error(queue):
+    def ingest(on_stage):
+        raise ValueError("no transcript")
+
+    job = wait_for(queue.submit("key", "video", ingest))
+
+    assert job.stage == jobs.ERROR
+    assert job.error == "no transcript"
+    assert not queue.is_in_flight("key")
+
+
+def test_finished_jobs_are_pruned_beyond_max_finished():
+    executor = ThreadPoolExecutor(1)
+    queue = JobQueue(executor, max_finished=2)
+    finished = [wait_for(queue.submit(f"key-{i}", "video", lambda on_stage: {})) for i in range(4)]
+    queue.submit("key-last", "video", lambda on_stage: {})
+    executor.shutdown(wait=True)
+
+    assert queue.get(finished[0].job_id) is None
+    assert queue.get(finished[-1].job_id) is not None
+
+
+def test_prefetch_is_refused_while_users_wait_or_the_queue_is_full():
+    executor = ThreadPoolExecutor(1)
+    prefetch_executor = ThreadPoolExecutor(1)
+    queue = JobQueue(executor, prefetch_executor=prefetch_executor, max_prefetch_pending=2)
+    gate = threading.Event()
+    assert queue.accepting_prefetch()
+
+    user = queue.submit("user", "user", lambda on_stage: gate.wait(5) and {})
+    assert not queue.accepting_prefetch()
+    gate.set()
+    wait_for(user)
+    assert queue.accepting_prefetch()
+
+    gate.clear()
+    prefetches = [queue.submit(key, key, lambda on_stage: gate.wait(5) and {}, prefetch=True) for key in ("a", "b")]
+    assert not queue.accepting_prefetch()
+    gate.set()
+    for job in prefetches:
+        wait_for(job)
+    assert queue.accepting_prefetch()
+    executor.shutdown(wait=True)
+    prefetch_executor.shutdown(wait=True)
+
+
+def test_queued_prefetch_is_dropped_once_user_work_starts(queue):
+    gate, user_gate = threading.Event(), threading.Event()
+    ran = []
+    running = queue.submit("a", "a", lambda on_stage: gate.wait(5) and {}, prefetch=True)
+    queued = queue.submit("b", "b", lambda on_stage: ran.append("b") or {}, prefetch=True)
+    # The user job is still running when the queued prefetch reaches the front
+    user = queue.submit("c", "c", lambda on_stage: user_gate.wait(5) and {})
+    gate.set()
+
+    wait_for(queued)
+    user_gate.set()
+    wait_for(running)
+    wait_for(user)
+    assert queued.stage == jobs.DROPPED and queued.progress == 1.0
+    assert running.stage == jobs.DONE
+    assert ran == []
+    assert not queue.is_in_flight("b")
+
+
+def test_stale_prefetch_is_dropped():
+    executor = ThreadPoolExecutor(1)
+    queue = JobQueue(executor, prefetch_max_age=0.0)
+    ran = []
+
+    job = queue.submit("a", "a", lambda on_stage: ran.append("a") or {}, prefetch=True)
+    wait_for(job)
+    executor.shutdown(wait=True)
+
+    assert job.stage == jobs.DROPPED
+    assert ran == []
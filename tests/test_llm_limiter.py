@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+from src.fakes import FakeChatModel, FakeRateLimitError
+from src.llm_gateway import CoalescedAnswerChain, InflightCoalescer, LimitedLLM, LLMLimiter
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    limiter = LLMLimiter(max_concurrency=1)
+    limiter.acquire()
+    admitted = []
+
+    def call(i):
+        # With one slot each waiter runs only after the previous one released it
+        limiter.call(lambda: admitted.append(i))
+
+    threads = []
+    for i in range(6):
+        thread = threading.Thread(target=call, args=(i,))
+        thread.start()
+        threads.append(thread)
+        # Enqueue one at a time so arrival order is known
+        wait_until(lambda: limiter.stats()['waiting'] == i + 1)
+    limiter.release()
+    for thread in threads:
+        thread.join()
+
+    assert admitted == list(range(6))
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_concurrency_cap_holds_for_async_callers():
+    llm = FakeChatModel(latency=0.05)
+    limited = LimitedLLM(llm, LLMLimiter(max_concurrency=3))
+
+    async def main():
+        return await asyncio.gather(*(limited.ainvoke(f"question {i}") for i in range(10)))
+
+    answers = asyncio.run(main())
+
+    assert len(answers) == 10
+    assert llm.calls == 10
+    assert llm.max_in_flight == 3
+
+
+def test_rate_limited_calls_back_off_and_retry():
+    llm = FakeChatModel(latency=0.05, rate_limit_concurrency=2, retry_after=0.05)
+    limiter = LLMLimiter(max_concurrency=6, max_retries=10)
+    limited = LimitedLLM(llm, limiter)
+
+    async def main():
+        return await asyncio.gather(*(limited.ainvoke(f"question {i}") for i in range(6)))
+
+    start = time.monotonic()
+    answers = asyncio.run(main())
+
+    assert len(answers) == 6
+    assert llm.calls == 6
+    assert llm.rate_limited > 0
+    assert limiter.rate_limited == llm.rate_limited
+    # Every caller paused for the provider's retry delay, and the allowed concurrency shrank
+    assert time.monotonic() - start >= 0.05
+    assert limiter.stats()['concurrency_limit'] < 6
+
+
+def test_rate_limit_error_raised_once_retries_run_out():
+    llm = FakeChatModel(latency=0.2, rate_limit_concurrency=1, retry_after=0.01)
+    limited = LimitedLLM(llm, LLMLimiter(max_concurrency=2, max_retries=0))
+    errors = []
+
+    def call():
+        try:
+            limited.invoke("question")
+        except FakeRateLimitError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 1
+    assert llm.calls == 1
+
+
+def answer_chain(llm):
+    return RunnableLambda(lambda input: input['question']) | llm | StrOutputParser()
+
+
+def test_identical_concurrent_questions_share_one_generation():
+    llm = FakeChatModel(latency=0.05)
+    chain = CoalescedAnswerChain(answer_chain(llm), InflightCoalescer(), scope="video")
+    question = {'docs': [], 'question': "What is fusion?"}
+
+    async def main():
+        return await asyncio.gather(*(chain.ainvoke(question) for _ in range(5)))
+
+    answers = asyncio.run(main())
+
+    assert llm.calls == 1
+    assert len(set(answers)) == 1 and answers[0]
+
+
+def test_identical_concurrent_sync_questions_share_one_generation():
+    llm = FakeChatModel(latency=0.1)
+    chain = CoalescedAnswerChain(answer_chain(llm), InflightCoalescer(), scope="video")
+    answers = []
+
+    def ask():
+        answers.append(chain.invoke({'docs': [], 'question': "What is fusion?"}))
+
+    threads = [threading.Thread(target=ask) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert llm.calls == 1
+    assert len(answers) == 4 and len(set(answers)) == 1
+
+
+@pytest.mark.parametrize("second", ["What is fission?", "What is fusion?"])
+def test_coalescing_is_per_question_and_only_while_in_flight(second):
+    llm = FakeChatModel()
+    chain = CoalescedAnswerChain(answer_chain(llm), InflightCoalescer(), scope="video")
+
+    asyncio.run(chain.ainvoke({'docs': [], 'question': "What is fusion?"}))
+    asyncio.run(chain.ainvoke({'docs': [], 'question': second}))
+
+    # Nothing is cached: a question asked after the first finished is generated again
+    assert llm.calls == 2
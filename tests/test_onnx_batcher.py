@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+import pytest
+
+from src.onnx_embeddings import DynamicBatcher
+
+
+class FakeModel:
+    """Embeds each text as [len(text), index of its batch], recording batch sizes."""
+
+    def __init__(self, started=None):
+        self.batches = []
+        self.started = started
+        self.release = threading.Event()
+        self.release.set()
+
+    def run_batch(self, texts):
+        self.batches.append(list(texts))
+        if self.started is not None:
+            self.started.set()
+        self.release.wait(5)
+        if "fail" in texts:
+            raise RuntimeError("bad input")
+        return np.array([[len(text), len(self.batches)] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = FakeModel(started=threading.Event())
+    batcher = DynamicBatcher(model.run_batch, max_batch_size=64, max_wait=0.005)
+    # Hold the worker on a first batch so the next requests queue up together
+    model.release.clear()
+    blocker = batcher.submit(["x"])
+    model.started.wait(5)
+    requests = [["a" * (i + 1)] * (i + 1) for i in range(4)]
+    futures = [batcher.submit(texts)[0] for texts in requests]
+    model.release.set()
+
+    results = [future.result(5) for future in futures]
+
+    assert blocker[0].result(5).shape == (1, 2)
+    assert len(model.batches) == 2
+    assert len(model.batches[1]) == 10
+    for texts, vectors in zip(requests, results):
+        assert vectors[:, 0].tolist() == [len(text) for text in texts]
+        assert set(vectors[:, 1].tolist()) == {2}
+
+
+def test_large_requests_are_split_into_batches():
+    model = FakeModel()
+    batcher = DynamicBatcher(model.run_batch, max_batch_size=4, max_wait=0.005)
+    texts = ["t" * i for i in range(1, 11)]
+
+    vectors = batcher.embed(texts)
+
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+    assert all(len(batch) <= 4 for batch in model.batches)
+    assert sum(len(batch) for batch in model.batches) == 10
+
+
+def test_a_failed_batch_fails_only_its_requests():
+    model = FakeModel()
+    batcher = DynamicBatcher(model.run_batch, max_batch_size=1, max_wait=0.005)
+
+    with pytest.raises(RuntimeError, match="bad input"):
+        batcher.embed(["fail"])
+    assert batcher.embed(["ok"])[:, 0].tolist() == [2]
+    assert batcher.embed([]).shape == (0, 0)
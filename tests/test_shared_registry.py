@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+
+import pytest
+
+from src.shared_registry import SharedIndexRegistry
+
+
+def open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_registry_calls_do_not_leak_connections(tmp_path):
+    path = str(tmp_path / "registry.sqlite")
+    SharedIndexRegistry(path)
+    before = open_files()
+
+    for i in range(20):
+        registry = SharedIndexRegistry(path)
+        registry.claim(f"handle-{i}", f"video-{i}", f"job-{i}")
+        registry.get(f"handle-{i}")
+
+    assert open_files() == before
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return SharedIndexRegistry(str(tmp_path / "registry.sqlite"))
+
+
+def _claim(path, handle, job_id):
+    SharedIndexRegistry(path).claim(handle, "video", job_id)
+
+
+def test_in_flight_and_ready_claims_are_not_taken(registry):
+    assert registry.claim("handle", "video", "job-1")['job_id'] == "job-1"
+    assert registry.claim("handle", "video", "job-2")['job_id'] == "job-1"
+
+    registry.update("handle", "embedding")
+    registry.mark_ready("handle", {'chunks': 12})
+
+    row = registry.claim("handle", "video", "job-3")
+    assert (row['job_id'], row['state'], row['result']) == ("job-1", "ready", {'chunks': 12})
+    assert registry.get_job("job-1")['handle'] == "handle"
+    assert registry.get_job("job-3") is None
+
+
+def test_failed_claim_is_taken_over(registry):
+    registry.claim("handle", "video", "job-1")
+    registry.mark_failed("handle", "no transcript")
+    assert registry.get("handle")['error'] == "no transcript"
+
+    row = registry.claim("handle", "video", "job-2")
+
+    assert (row['job_id'], row['state'], row['error']) == ("job-2", "queued", None)
+
+
+def test_stale_claim_is_taken_over(tmp_path):
+    registry = SharedIndexRegistry(str(tmp_path / "registry.sqlite"), stale_seconds=0.0)
+    registry.claim("handle", "video", "job-1")
+
+    assert registry.claim("handle", "video", "job-2")['job_id'] == "job-2"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_claim_of_an_exited_process_is_taken_over(registry):
+    worker = multiprocessing.get_context("fork").Process(target=_claim, args=(registry.path, "handle", "job-1"))
+    worker.start()
+    worker.join()
+    assert registry.get("handle")['owner_pid'] == worker.pid
+
+    # Only the owner reports progress on a claim
+    registry.update("handle", "embedding")
+    assert registry.get("handle")['state'] == "queued"
+
+    row = registry.claim("handle", "video", "job-2")
+    assert (row['job_id'], row['owner_pid']) == ("job-2", os.getpid())
+
+
+def test_latest_ready_and_forget(registry):
+    assert registry.latest_ready() is None
+    for handle in ("first", "second", "in-flight"):
+        registry.claim(handle, "video", f"job-{handle}")
+    registry.mark_ready("first", {})
+    registry.mark_ready("second", {})
+
+    assert registry.latest_ready() == "second"
+    registry.forget("second")
+    assert registry.get("second") is None
+    assert registry.latest_ready() == "first"
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# summarization builds on retrieval, which needs the Gemini client installed
+pytest.importorskip("langchain_google_genai")
+
+from src.fakes import FakeChatModel
+from src.summarization import SummaryEngine
+
+
+def corpus_store(embeddings, video_ids, chunks=4):
+    """One index holding several videos, their chunks interleaved in index order."""
+    docs = [
+        Document(page_content=f"{video_id} chunk {i}", metadata={'video_id': video_id, 'chunk_index': i, 'start': i * 30.0})
+        for i in range(chunks) for video_id in video_ids
+    ]
+    return FAISS.from_documents(docs, embeddings)
+
+
+def test_windows_never_mix_videos(embeddings):
+    engine = SummaryEngine(corpus_store(embeddings, ["video_a", "video_b"]), FakeChatModel(), window_size=3)
+
+    windows = engine._windows()
+
+    assert [window['video_id'] for window in windows] == ["video_a", "video_a", "video_b", "video_b"]
+    for window in windows:
+        assert {word for word in window['text'].split() if word.startswith("video_")} == {window['video_id']}
+    assert windows[0]['text'] == "video_a chunk 0 video_a chunk 1 video_a chunk 2"
+
+
+def test_concurrent_sync_and_async_callers_summarize_once(embeddings):
+    llm = FakeChatModel(latency=0.05)
+    engine = SummaryEngine(corpus_store(embeddings, ["video_a"], chunks=6), llm, window_size=2)
+    results = []
+
+    async def ask():
+        return await asyncio.gather(*(engine.asections() for _ in range(4)))
+
+    thread = threading.Thread(target=lambda: results.append(engine.sections()))
+    thread.start()
+    results.extend(asyncio.run(ask()))
+    thread.join()
+
+    # One map call per window, however many callers raced for the first summary
+    assert llm.calls == 3
+    assert len(results) == 5
+    assert all(sections is results[0] for sections in results)
@@ -0,0 +1,62 @@
+import pytest
+from youtube_transcript_api import TranscriptsDisabled
+
+from src.fakes import StubYouTubeAdapter
+from src.transcript_store import TranscriptStore, make_http_session
+
+
+@pytest.fixture
+def adapter():
+    return StubYouTubeAdapter(minutes=1.0, disabled=["disabled001"])
+
+
+@pytest.fixture
+def store(tmp_path, adapter):
+    return TranscriptStore(str(tmp_path), http_client=make_http_session(adapter=adapter))
+
+
+def fetch(store, video_id):
+    return store.get_or_fetch(video_id, ["en"], lambda: store.api.fetch(video_id, languages=["en"]))
+
+
+def test_cache_hit_makes_no_request(store, adapter):
+    fetched = fetch(store, "video000001")
+    requests = adapter.requests
+    assert requests > 0
+
+    cached = fetch(store, "video000001")
+
+    assert adapter.requests == requests
+    assert [(s.text, s.start, s.duration) for s in cached] == [(s.text, s.start, s.duration) for s in fetched]
+    assert cached.language_code == fetched.language_code
+    assert store.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+
+def test_expired_snippets_are_downloaded_again(tmp_path, adapter):
+    store = TranscriptStore(str(tmp_path), http_client=make_http_session(adapter=adapter), ttl_seconds=0)
+    fetch(store, "video000001")
+    requests = adapter.requests
+
+    fetch(store, "video000001")
+
+    assert adapter.requests > requests
+
+
+def test_disabled_marker_skips_network(store, adapter):
+    with pytest.raises(TranscriptsDisabled):
+        fetch(store, "disabled001")
+    requests = adapter.requests
+
+    with pytest.raises(ValueError, match="disabled"):
+        fetch(store, "disabled001")
+
+    assert adapter.requests == requests
+
+
+def test_listing_is_reused(store, adapter):
+    listing = store.list_transcripts("video000001")
+    requests = adapter.requests
+
+    assert store.list_transcripts("video000001") == listing
+    assert adapter.requests == requests
+    assert listing[0]['language_code'] == "en"